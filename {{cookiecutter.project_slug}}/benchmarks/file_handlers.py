@@ -0,0 +1,52 @@
+"""
+Compares throughput of file logging handlers.
+
+    python benchmarks/file_handlers.py [records_count]
+"""
+
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+import time
+
+from {{cookiecutter.project_slug}}.logging_utilities import ReopeningFileHandler
+
+
+def _records(count):
+    return [
+        logging.LogRecord("bench", logging.INFO, __file__, 1, "message %d", (i,), None)
+        for i in range(count)
+    ]
+
+
+def bench(handler_factory, records):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        handler = handler_factory(os.path.join(tmp_dir, "bench.log"))
+        started_at = time.perf_counter()
+        for record in records:
+            handler.handle(record)
+        handler.flush()
+        elapsed = time.perf_counter() - started_at
+        handler.close()
+
+    return len(records) / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    records = _records(count)
+
+    handlers = [
+        ("FileHandler", logging.FileHandler),
+        ("WatchedFileHandler", logging.handlers.WatchedFileHandler),
+        ("ReopeningFileHandler (inotify)", ReopeningFileHandler),
+    ]
+
+    for name, factory in handlers:
+        print("{:<36} {:>12,.0f} records/s".format(name, bench(factory, records)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares cost of enriching and formatting log record with bundled formatters
+against ``seveno_pyutil`` ones.
+
+    python benchmarks/formatters.py [records_count]
+"""
+
+import logging
+import sys
+import timeit
+
+import seveno_pyutil
+
+from {{cookiecutter.project_slug}} import logging_utilities
+
+FORMAT = (
+    "%(isotime)s %(hostname)s bench[%(process)d] "
+    "[%(log_color)s%(levelname)s%(reset)s] %(message)s"
+)
+
+
+def _record():
+    return logging.LogRecord(
+        "bench", logging.INFO, __file__, 1, "message %d\nsecond line", (42,), None
+    )
+
+
+def bench(metadata_filter, formatter, count):
+    def run():
+        record = _record()
+        metadata_filter.filter(record)
+        formatter.format(record)
+
+    return count / min(timeit.repeat(run, number=count, repeat=3))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    candidates = [
+        (
+            "seveno_pyutil",
+            seveno_pyutil.StandardMetadataFilter(),
+            seveno_pyutil.SingleLineColoredFormatter(FORMAT),
+        ),
+        (
+            "logging_utilities",
+            logging_utilities.StandardMetadataFilter(),
+            logging_utilities.SingleLineColoredFormatter(FORMAT),
+        ),
+    ]
+
+    for name, metadata_filter, formatter in candidates:
+        print(
+            "{:<24} {:>12,.0f} records/s".format(
+                name, bench(metadata_filter, formatter, count)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compares time and peak memory (max RSS) of processing big file read with plain
+``read()`` and through `MappedFile`. Each candidate runs in fresh interpreter.
+
+    python benchmarks/mapped_files.py [file_size_mb] [directory]
+
+Test file of ~100 bytes long lines is created in ``directory`` (default tmp
+directory), use file system with enough space for multi GB files.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CANDIDATES = {
+    "read() + line slices": (
+        "with open(path, 'rb') as f:\n"
+        "    data = f.read()\n"
+        "count = start = 0\n"
+        "while True:\n"
+        "    end = data.find(b'\\n', start)\n"
+        "    if end < 0:\n"
+        "        break\n"
+        "    count += data[start:end][:1] == b'9'\n"
+        "    start = end + 1\n"
+    ),
+    "read() + chunk slices": (
+        "with open(path, 'rb') as f:\n"
+        "    data = f.read()\n"
+        "count = sum(data[i : i + 1] == b'9' for i in range(0, len(data), 4096))\n"
+    ),
+    "MappedFile.lines": (
+        "with MappedFile(path) as mapped:\n"
+        "    count = sum(1 for line in mapped.lines() if line[:1] == b'9')\n"
+    ),
+    "MappedFile.chunks": (
+        "with MappedFile(path) as mapped:\n"
+        "    count = sum(chunk[:1] == b'9' for chunk in mapped.chunks(4096))\n"
+    ),
+}
+
+RUNNER = (
+    "import json, resource, sys, time\n"
+    "from {{cookiecutter.project_slug}}.mapped_files import MappedFile\n"
+    "path = sys.argv[1]\n"
+    "started_at = time.perf_counter()\n"
+    "{code}"
+    "print(json.dumps([\n"
+    "    time.perf_counter() - started_at,\n"
+    "    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,\n"
+    "]))\n"
+)
+
+
+def create_file(path, size):
+    line = b"".join(
+        b"%d " % number for number in range(30)
+    ).ljust(99, b"x") + b"\n"
+    block = line * (1024 * 1024 // len(line) + 1)
+    written = 0
+    with open(path, "wb") as f:
+        while written < size:
+            f.write(block)
+            written += len(block)
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    directory = sys.argv[2] if len(sys.argv) > 2 else tempfile.gettempdir()
+
+    path = os.path.join(directory, "mapped_files_benchmark.bin")
+    started_at = time.perf_counter()
+    create_file(path, size_mb * 1024 * 1024)
+    print(
+        "Created {:.0f} MB test file in {:.1f} s".format(
+            os.path.getsize(path) / 1024 / 1024, time.perf_counter() - started_at
+        )
+    )
+
+    try:
+        for name, code in CANDIDATES.items():
+            process = subprocess.run(
+                [sys.executable, "-c", RUNNER.format(code=code), path],
+                stdout=subprocess.PIPE,
+            )
+            if process.returncode:
+                print("{:<24} failed ({})".format(name, process.returncode))
+                continue
+            seconds, max_rss_kb = json.loads(process.stdout.decode("utf-8"))
+            print(
+                "{:<24} {:>7.2f} s  max RSS {:>8.1f} MB".format(
+                    name, seconds, max_rss_kb / 1024
+                )
+            )
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
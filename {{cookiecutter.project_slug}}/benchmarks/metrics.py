@@ -0,0 +1,52 @@
+"""
+Compares cost of updating metrics on hot path: lock-free per thread counters
+and histograms against plain lock protected counter.
+
+    python benchmarks/metrics.py [updates_count]
+"""
+
+import sys
+import threading
+import timeit
+
+from {{cookiecutter.project_slug}}.metrics import Registry
+
+
+class LockedCounter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    registry = Registry()
+    counter = registry.counter("jobs_total", "Jobs")
+    labeled = registry.counter("results_total", "Results", labels=["result"])
+    ok = labeled.labels("ok")
+    histogram = registry.histogram("latency_seconds", "Latency")
+    locked = LockedCounter()
+
+    candidates = [
+        ("locked counter", locked.inc),
+        ("Counter.inc", counter.inc),
+        ("child Counter.inc", ok.inc),
+        ("Counter.labels().inc", lambda: labeled.labels("ok").inc()),
+        ("Histogram.observe", lambda: histogram.observe(0.042)),
+    ]
+
+    for name, update in candidates:
+        seconds = min(timeit.repeat(update, number=count, repeat=3))
+        print("{:<24} {:>8.1f} ns/update".format(name, seconds / count * 1e9))
+
+    seconds = min(timeit.repeat(registry.collect, number=1000, repeat=3))
+    print("{:<24} {:>8.1f} us/collect".format("Registry.collect", seconds * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures overhead of `SamplingProfiler` on CPU bound work running in several
+threads (ie. handlers in executor threads), with profiler off and on at
+different sampling intervals. Throughput differences of few percent are
+within noise, time spent sampling is the more reliable figure.
+
+    python benchmarks/profiling.py [seconds] [threads_count]
+"""
+
+import sys
+import tempfile
+import threading
+import time
+
+from {{cookiecutter.project_slug}}.profiling import SamplingProfiler
+
+
+def _recurse(depth):
+    if depth:
+        return _recurse(depth - 1)
+    return sum(range(100))
+
+
+def measure(seconds, threads_count):
+    stopping = threading.Event()
+    counts = [0] * threads_count
+
+    def work(index):
+        while not stopping.is_set():
+            _recurse(30)
+            counts[index] += 1
+
+    threads = [
+        threading.Thread(target=work, args=(index,)) for index in range(threads_count)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stopping.set()
+    for thread in threads:
+        thread.join()
+
+    return sum(counts) / seconds
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    threads_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    baseline = measure(seconds, threads_count)
+    print("{:<24} {:>10.0f} calls/s".format("profiler off", baseline))
+
+    with tempfile.TemporaryDirectory() as output_path:
+        for interval in (0.01, 0.005, 0.001):
+            profiler = SamplingProfiler(output_path, interval=interval)
+            profiler.start()
+            throughput = measure(seconds, threads_count)
+            profiler.stop(wait=True)
+            print(
+                "{:<24} {:>10.0f} calls/s  {:>+6.1f}%  {:>5} samples, "
+                "sampling took {:.2f}% of time".format(
+                    "every {:g} ms".format(interval * 1000),
+                    throughput,
+                    (throughput / baseline - 1) * 100,
+                    profiler.samples_count,
+                    profiler.sampling_seconds / seconds * 100,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares cost of reading settings through plain proxy to config loader (how
+``SETTINGS`` used to work), through ``SETTINGS`` and through immutable settings
+snapshot.
+
+    python benchmarks/settings_access.py [reads_count]
+"""
+
+import sys
+import timeit
+
+from objproxies import CallbackProxy
+
+from {{cookiecutter.project_slug}} import settings
+from {{cookiecutter.project_slug}}.settings import ENVIRONMENTS, SETTINGS, SettingsSnapshot
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    cfg = ENVIRONMENTS["production"]()
+    cfg._logging_json = {"handlers": {}, "loggers": {}}
+    cfg.app_config = {"redis": {"client": {"host": "localhost", "port": 6379}}}
+
+    proxy = CallbackProxy(lambda: cfg)
+    snapshot = SettingsSnapshot(cfg)
+    settings._SETTINGS, settings._SNAPSHOT = cfg, snapshot
+
+    candidates = [
+        ("proxy instance_name", lambda: proxy.instance_name),
+        ("SETTINGS instance_name", lambda: SETTINGS.instance_name),
+        ("snapshot instance_name", lambda: snapshot.instance_name),
+        ("proxy tmp_dir_path", lambda: proxy.instance_tmp_dir_path),
+        ("SETTINGS tmp_dir_path", lambda: SETTINGS.instance_tmp_dir_path),
+        ("snapshot tmp_dir_path", lambda: snapshot.instance_tmp_dir_path),
+        ("proxy app_config", lambda: proxy.app_config["redis"]["client"]["host"]),
+        ("snapshot dotted key", lambda: snapshot["redis.client.host"]),
+        ("snapshot attribute", lambda: snapshot.app_config.redis.client.host),
+    ]
+
+    for name, read in candidates:
+        seconds = min(timeit.repeat(read, number=count, repeat=3))
+        print("{:<24} {:>8.1f} ns/read".format(name, seconds / count * 1e9))
+
+
+if __name__ == "__main__":
+    main()
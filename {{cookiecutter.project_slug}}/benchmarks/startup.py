@@ -0,0 +1,80 @@
+"""
+Measures wall clock time of command line startup (interpreter start, imports
+and resolving config file paths) in fresh interpreters, with and without
+``pkg_resources`` on import path, and cost of loading and validating example
+production config against app config schema.
+
+    python benchmarks/startup.py [runs_count]
+
+Run it from project root, it reads ``config/production.example.yaml``.
+"""
+
+import subprocess
+import sys
+import time
+import timeit
+
+import yaml
+
+STARTUP = (
+    "from {{cookiecutter.project_slug}}.scripts import cli\n"
+    "from {{cookiecutter.project_slug}}.settings import ENVIRONMENTS\n"
+    "cfg = ENVIRONMENTS['production']()\n"
+    "cfg.config_file_abspaths, cfg.logging_config_abspaths\n"
+)
+
+VALIDATION = (
+    "import yaml\n"
+    "app_config = yaml.safe_load(open('config/production.example.yaml'))\n"
+    "typed_app_config, app_config, errors = cfg.validate_app_config(app_config)\n"
+    "assert not errors, errors\n"
+)
+
+
+def bench(code, runs):
+    timings = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        timings.append(time.perf_counter() - started_at)
+    return min(timings), sorted(timings)[len(timings) // 2]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    candidates = [
+        ("python -c pass", "pass"),
+        ("with pkg_resources", "import pkg_resources\n" + STARTUP),
+        ("importlib.resources", STARTUP),
+        ("with config validation", STARTUP + VALIDATION),
+    ]
+
+    for name, code in candidates:
+        best, median = bench(code, runs)
+        print(
+            "{:<24} best {:>7.1f} ms  median {:>7.1f} ms".format(
+                name, best * 1000, median * 1000
+            )
+        )
+
+    # Schema is compiled on first validation, so first one is measured apart
+    from {{cookiecutter.project_slug}}.settings import APP_CONFIG_SCHEMA
+
+    with open("config/production.example.yaml") as f:
+        app_config = yaml.safe_load(f)
+    started_at = time.perf_counter()
+    APP_CONFIG_SCHEMA.validate(app_config)
+    first = time.perf_counter() - started_at
+    validation = min(
+        timeit.repeat(lambda: APP_CONFIG_SCHEMA.validate(app_config), number=1000)
+    )
+    print(
+        "{:<24} first {:>6.3f} ms  then {:>7.3f} ms".format(
+            "config validation", first * 1000, validation
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -48,6 +48,7 @@ setup(
     },
     include_package_data=True,
     zip_safe=False,
+    python_requires='>=3.7',
     # keywords=[
     #     "keyword1", "keyword2", "..."
     # ],
@@ -58,8 +59,8 @@ setup(
         'Operating System :: POSIX :: Linux',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3 :: Only',
         'Topic :: Printing',
     ],
@@ -100,7 +101,8 @@ setup(
             'pytest-spec',
             'pytest-mock',
             'factory-boy',
-            'faker'
+            'faker',
+            'fakeredis',
         ]
     },
     entry_points={
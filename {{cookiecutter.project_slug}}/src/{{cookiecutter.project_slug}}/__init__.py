@@ -1,4 +1,19 @@
+import importlib
+
 __version__ = "{{cookiecutter.version}}"
 
-from .server import Server, create_app
-from .settings import SETTINGS, ImproperlyConfiguredError
+# Public names of this package, imported on first access (PEP 562) so that
+# importing any submodule (ie. command line scripts) doesn't import whole app
+# server
+_LAZY_ATTRIBUTES = {
+    "Server": ".server",
+    "create_app": ".server",
+    "SETTINGS": ".settings",
+    "ImproperlyConfiguredError": ".settings",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,327 @@
+"""
+Persistent, content addressed cache of downloaded and derived files.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Optional
+
+from seveno_pyutil import silent_create_dirs
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+# Size of cache, kept in size file
+_SIZE = struct.Struct("<q")
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 hex digest of file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_key(source: str) -> str:
+    """
+    Cache key of file derived from ``source`` (ie. URL it was downloaded from),
+    for when file must be looked up before its contents are known.
+    """
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Size bounded cache of files, shared by all instances of app on the same host
+    and kept across restarts (unlike instance tmp directory).
+
+    Files are stored under their key, which is either SHA-256 digest of their
+    contents (default) or `source_key` of whatever they were made from:
+
+    .. code-block:: python
+
+        key = source_key(url)
+        with cache.open(key) as f:  # None on miss
+            ...
+        cache.put_file(downloaded_path, key=key)
+
+    Files are written into cache directory under temporary names and renamed
+    into place, so readers never see partially written files. When cache grows
+    over ``max_bytes``, least recently used files (by mtime, which is bumped on
+    each hit) are evicted until it shrinks to ``low_watermark`` of it.
+
+    Writers and evicting process coordinate through shared and exclusive
+    ``flock`` on lock file in cache directory. Readers don't lock, file opened
+    by `.open` stays readable even if it is evicted meanwhile.
+
+    Size of cache is kept in size file in cache directory and updated by all
+    processes that write into cache, so ``max_bytes`` limits cache as a whole,
+    no matter how many (prefork worker) processes share it. It is only an
+    estimate (ie. files removed by hand aren't counted), which is corrected on
+    each eviction.
+
+    Arguments:
+        root_path: cache directory
+        max_bytes: max size of cached files, ``0`` disables limit
+        low_watermark: fraction of ``max_bytes`` eviction shrinks cache to
+    """
+
+    def __init__(
+        self, root_path: str, max_bytes: int = 0, low_watermark: float = 0.9
+    ):
+        self.root_path = root_path
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+
+        self._objects_path = os.path.join(root_path, "objects")
+        self._tmp_path = os.path.join(root_path, "tmp")
+        self._lock_path = os.path.join(root_path, ".lock")
+        self._size_path = os.path.join(root_path, ".size")
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "evicted_bytes": 0,
+        }
+
+        silent_create_dirs(self._objects_path)
+        silent_create_dirs(self._tmp_path)
+
+    @classmethod
+    def from_config(cls, config, default_root_path: str) -> "ArtifactCache":
+        """Creates cache from typed ``cache`` section of app config."""
+        return cls(
+            config.path or default_root_path,
+            max_bytes=config.max_bytes,
+            low_watermark=config.low_watermark,
+        )
+
+    def path(self, key: str) -> str:
+        """Path of cached file, whether it exists or not."""
+        if len(key) < 3 or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError("Invalid cache key {!r}".format(key))
+        return os.path.join(self._objects_path, key[:2], key[2:])
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns:
+            path of cached file or ``None`` on miss. File can be evicted by other
+            process before it is opened, prefer `.open` when that matters.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return path
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """
+        Returns:
+            cached file opened for binary reading or ``None`` on miss
+        """
+        path = self.path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self._count("hits")
+        return f
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put_file(self, path: str, key: str = None, move: bool = False) -> str:
+        """
+        Stores copy of file at ``path``.
+
+        Arguments:
+            key: defaults to digest of file contents
+            move: move file instead of copying it, if it is on the same file
+                system as cache
+
+        Returns:
+            cache key
+        """
+        key = key or file_digest(path)
+
+        with self._writing(key) as tmp_path:
+            if move:
+                try:
+                    os.rename(path, tmp_path)
+                except OSError:
+                    shutil.copyfile(path, tmp_path)
+            else:
+                shutil.copyfile(path, tmp_path)
+
+        return key
+
+    def put_bytes(self, data: bytes, key: str = None) -> str:
+        """
+        Stores ``data``.
+
+        Arguments:
+            key: defaults to digest of ``data``
+
+        Returns:
+            cache key
+        """
+        key = key or hashlib.sha256(data).hexdigest()
+
+        with self._writing(key) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+
+        return key
+
+    def evict(self, target_bytes: int = None) -> int:
+        """
+        Removes least recently used files until cache is not bigger than
+        ``target_bytes`` (defaults to ``low_watermark`` of ``max_bytes``).
+
+        Returns:
+            freed bytes
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * self.low_watermark)
+
+        with self._file_lock(self._lock_path, fcntl.LOCK_EX):
+            entries = []
+            for directory, _, names in os.walk(self._objects_path):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            size = sum(entry[1] for entry in entries)
+            freed = evicted = 0
+            for _, file_size, path in sorted(entries):
+                if size - freed <= target_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                freed += file_size
+                evicted += 1
+
+            self._update_size(size=size - freed)
+
+        with self._lock:
+            self._counters["evictions"] += evicted
+            self._counters["evicted_bytes"] += freed
+
+        if evicted:
+            logger.debug("Evicted %d file(s) (%d bytes) from cache", evicted, freed)
+
+        return freed
+
+    def stats(self) -> dict:
+        """Hit and miss counters of this process and estimated cache size."""
+        size = self._update_size()
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return dict(
+                self._counters,
+                hit_ratio=self._counters["hits"] / lookups if lookups else 0.0,
+                size_bytes=size,
+                max_bytes=self.max_bytes,
+            )
+
+    @contextmanager
+    def _writing(self, key: str):
+        path = self.path(key)
+        tmp_path = os.path.join(
+            self._tmp_path, "{}.{}.tmp".format(key, uuid.uuid4().hex)
+        )
+
+        with self._file_lock(self._lock_path, fcntl.LOCK_SH):
+            try:
+                yield tmp_path
+                size = os.path.getsize(tmp_path)
+                silent_create_dirs(os.path.dirname(path))
+                try:
+                    replaced_size = os.path.getsize(path)
+                except FileNotFoundError:
+                    replaced_size = 0
+                os.rename(tmp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+
+        cache_size = self._update_size(delta=size - replaced_size)
+        self._count("stores")
+
+        if self.max_bytes and cache_size > self.max_bytes:
+            self.evict()
+
+    def _update_size(self, delta: int = 0, size: int = None) -> int:
+        """
+        Adds ``delta`` to cache size in size file (or replaces it with ``size``).
+
+        Returns:
+            new cache size
+        """
+        with self._file_lock(self._size_path, fcntl.LOCK_EX) as fd:
+            if size is None:
+                data = os.pread(fd, _SIZE.size, 0)
+                if len(data) == _SIZE.size:
+                    if not delta:
+                        return _SIZE.unpack(data)[0]
+                    size = max(0, _SIZE.unpack(data)[0] + delta)
+                else:
+                    # Size file was just created, scan includes ``delta`` already
+                    size = self._scan_size()
+
+            os.pwrite(fd, _SIZE.pack(size), 0)
+
+        return size
+
+    @contextmanager
+    def _file_lock(self, path: str, operation: int):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+        try:
+            fcntl.flock(fd, operation)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _scan_size(self) -> int:
+        retv = 0
+        for directory, _, names in os.walk(self._objects_path):
+            for name in names:
+                try:
+                    retv += os.path.getsize(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+        return retv
@@ -0,0 +1,386 @@
+"""
+Bounded thread pool for running blocking job handlers.
+"""
+
+import collections
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_JOB_WAIT_SECONDS = metrics.histogram(
+    "executor_job_wait_seconds",
+    "Time jobs waited in queue for free executor thread",
+    labels=["executor"],
+)
+_JOB_RUN_SECONDS = metrics.histogram(
+    "executor_job_run_seconds", "Time jobs were run by executor", labels=["executor"]
+)
+
+
+class ExecutorFullError(RuntimeError):
+    """Raised when job can't be submitted because executor queue is full."""
+
+    pass
+
+
+class _Job:
+    __slots__ = ("future", "fn", "args", "kwargs", "submitted_at", "deadline")
+
+    def __init__(self, future, fn, args, kwargs, submitted_at, deadline):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted_at = submitted_at
+        self.deadline = deadline
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class JobExecutor:
+    """
+    Fixed size pool of threads that run blocking callables (I/O bound job
+    handlers) concurrently with main thread loop.
+
+    Submitted jobs wait in bounded queue. When queue is full, `.submit` blocks
+    until there is space in it. `.submit_with` can instead raise
+    `ExecutorFullError` immediately or after timeout, providing backpressure to
+    whoever produces jobs.
+
+    Each job can have timeout. Job that doesn't finish in time gets its future
+    resolved with `concurrent.futures.TimeoutError`. Since Python threads can't
+    be killed, job itself keeps running in background and its result is
+    discarded.
+
+    Threads are started lazily, on first submitted job, so executor can safely
+    be created in process that forks workers later.
+
+    From within coroutines, wrap returned futures with `asyncio.wrap_future`:
+
+    .. code-block:: python
+
+        result = await asyncio.wrap_future(executor.submit(fetch_file, url))
+
+    Arguments:
+        pool_size: number of worker threads
+        queue_size: max number of jobs waiting for free thread
+        task_timeout: default job timeout in seconds, ``None`` or ``0`` disables it
+        name: prefix for worker thread names
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 4,
+        queue_size: int = 100,
+        task_timeout: float = None,
+        name: str = "executor",
+    ):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.task_timeout = task_timeout or None
+        self.name = name
+
+        self._jobs = collections.deque()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._jobs_added = threading.Condition(self._lock)
+        self._jobs_taken = threading.Condition(self._lock)
+        self._is_shut_down = False
+
+        self._deadlines = []
+        self._deadlines_changed = threading.Condition(self._lock)
+        self._watchdog = None
+
+        self._counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "cancelled": 0,
+            "running": 0,
+        }
+        self._started_count = 0
+        self._finished_count = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._run_time_total = 0.0
+        self._run_time_max = 0.0
+        self._wait_histogram = _JOB_WAIT_SECONDS.labels(name)
+        self._run_histogram = _JOB_RUN_SECONDS.labels(name)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "JobExecutor":
+        """Creates executor from ``executor`` section of app config."""
+        config = config or {}
+        return cls(
+            pool_size=config.get("pool_size") or 4,
+            queue_size=config.get("queue_size") or 100,
+            task_timeout=config.get("task_timeout") or None,
+        )
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        Submits ``fn(*args, **kwargs)`` for execution, waiting for free space in
+        queue if it is full. All arguments are passed to ``fn``, like in
+        `concurrent.futures.Executor.submit`.
+        """
+        return self.submit_with(fn, args, kwargs)
+
+    def submit_with(
+        self,
+        fn,
+        args: tuple = (),
+        kwargs: dict = None,
+        block: bool = True,
+        queue_timeout: float = None,
+        task_timeout: float = None,
+    ) -> Future:
+        """
+        Submits ``fn(*args, **kwargs)`` for execution.
+
+        Arguments:
+            block: if queue is full, wait for free space in it. If ``False``,
+                raise `ExecutorFullError` immediately.
+            queue_timeout: how long to wait for free space in queue before
+                raising `ExecutorFullError`. Waits forever if ``None``.
+            task_timeout: job timeout, defaults to `task_timeout` of executor,
+                ``0`` disables it
+
+        Raises:
+            ExecutorFullError: if queue is full
+            RuntimeError: if executor is (or gets) shut down
+        """
+        if self._is_shut_down:
+            raise RuntimeError("Can't submit jobs to shut down executor!")
+        self._ensure_started()
+
+        if task_timeout is None:
+            task_timeout = self.task_timeout
+        now = time.monotonic()
+        deadline = now + task_timeout if task_timeout else None
+        job = _Job(Future(), fn, args, kwargs or {}, now, deadline)
+        give_up_at = now + queue_timeout if queue_timeout is not None else None
+
+        # Shut down flag is checked and job is queued under the same lock, so
+        # job can't be queued after workers were told to exit
+        with self._lock:
+            while True:
+                if self._is_shut_down:
+                    raise RuntimeError("Can't submit jobs to shut down executor!")
+                if not self.queue_size or len(self._jobs) < self.queue_size:
+                    break
+
+                remaining = give_up_at - time.monotonic() if give_up_at else None
+                if not block or (remaining is not None and remaining <= 0):
+                    self._counters["rejected"] += 1
+                    raise ExecutorFullError(
+                        "Executor queue is full ({} jobs)!".format(self.queue_size)
+                    )
+                self._jobs_taken.wait(remaining)
+
+            self._jobs.append(job)
+            self._jobs_added.notify()
+            self._counters["submitted"] += 1
+            if job.deadline is not None:
+                heapq.heappush(self._deadlines, job)
+                self._deadlines_changed.notify()
+
+        return job.future
+
+    def stats(self) -> dict:
+        """Current queue depth, job counters and latencies (in seconds)."""
+        with self._lock:
+            return dict(
+                self._counters,
+                queue_depth=len(self._jobs),
+                pool_size=self.pool_size,
+                queue_size=self.queue_size,
+                wait_time_avg=(
+                    self._wait_time_total / self._started_count
+                    if self._started_count
+                    else 0.0
+                ),
+                wait_time_max=self._wait_time_max,
+                run_time_avg=(
+                    self._run_time_total / self._finished_count
+                    if self._finished_count
+                    else 0.0
+                ),
+                run_time_max=self._run_time_max,
+            )
+
+    def shutdown(self, wait: bool = True, timeout: float = None):
+        """
+        Stops accepting new jobs and lets threads drain the queue.
+
+        Jobs still waiting in queue when ``timeout`` expires (because running
+        jobs hang) are cancelled.
+
+        Arguments:
+            wait: wait for all queued and running jobs to finish
+            timeout: max seconds to wait for drain
+        """
+        with self._lock:
+            if self._is_shut_down:
+                return
+            self._is_shut_down = True
+            self._deadlines_changed.notify()
+            self._jobs_added.notify_all()
+            self._jobs_taken.notify_all()
+
+        if not wait:
+            return
+
+        deadline = time.monotonic() + timeout if timeout else None
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()) if deadline else None)
+
+        still_running = [thread.name for thread in self._threads if thread.is_alive()]
+        if not still_running:
+            return
+
+        with self._lock:
+            abandoned = list(self._jobs)
+            self._jobs.clear()
+            self._counters["cancelled"] += len(abandoned)
+        for job in abandoned:
+            job.future.cancel()
+
+        logger.warning(
+            "Executor didn't drain in %ss, abandoning threads: %s (cancelled %d "
+            "queued job(s))",
+            timeout,
+            ", ".join(still_running),
+            len(abandoned),
+        )
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+
+        with self._lock:
+            if self._threads:
+                return
+
+            for index in range(self.pool_size):
+                thread = threading.Thread(
+                    target=self._work,
+                    name="{}-{}".format(self.name, index),
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+            self._watchdog = threading.Thread(
+                target=self._watch_deadlines,
+                name="{}-watchdog".format(self.name),
+                daemon=True,
+            )
+            self._watchdog.start()
+
+    def _next_job(self):
+        # Returns None once executor is shut down and queue is drained
+        with self._lock:
+            while not self._jobs:
+                if self._is_shut_down:
+                    return None
+                self._jobs_added.wait()
+
+            job = self._jobs.popleft()
+            self._jobs_taken.notify()
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            try:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+            except RuntimeError:
+                # Timed out while waiting in queue
+                continue
+
+            started_at = time.monotonic()
+            wait_time = started_at - job.submitted_at
+            with self._lock:
+                self._counters["running"] += 1
+                self._started_count += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+            self._wait_histogram.observe(wait_time)
+
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except BaseException as exception:
+                resolved = self._resolve(job.future, exception=exception)
+                self._finish(started_at, "failed" if resolved else None)
+            else:
+                resolved = self._resolve(job.future, result=result)
+                self._finish(started_at, "completed" if resolved else None)
+
+    def _finish(self, started_at, counter):
+        # Job that timed out is counted (as timed out) by watchdog
+        run_time = time.monotonic() - started_at
+        with self._lock:
+            self._counters["running"] -= 1
+            if counter is not None:
+                self._counters[counter] += 1
+            self._finished_count += 1
+            self._run_time_total += run_time
+            self._run_time_max = max(self._run_time_max, run_time)
+        self._run_histogram.observe(run_time)
+
+    def _resolve(self, future, result=None, exception=None) -> bool:
+        # Future could had already been resolved by timeout watchdog
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except Exception:
+            return False
+        return True
+
+    def _watch_deadlines(self):
+        while True:
+            with self._lock:
+                timed_out = self._next_timed_out_job()
+            if timed_out is None:
+                return
+
+            # Resolved without lock, future's done callbacks can submit new jobs
+            self._resolve(
+                timed_out.future,
+                exception=TimeoutError("Job {!r} timed out!".format(timed_out.fn)),
+            )
+
+    def _next_timed_out_job(self):
+        # Waits (with lock held) until job times out, returns None on shut down
+        while not (self._is_shut_down and not self._deadlines):
+            if not self._deadlines:
+                self._deadlines_changed.wait()
+                continue
+
+            job = self._deadlines[0]
+            now = time.monotonic()
+            if job.future.done():
+                heapq.heappop(self._deadlines)
+            elif job.deadline <= now:
+                heapq.heappop(self._deadlines)
+                self._counters["timed_out"] += 1
+                return job
+            else:
+                self._deadlines_changed.wait(job.deadline - now)
+
+        return None
@@ -0,0 +1,14 @@
+"""
+Logging handlers, filters and formatters used by bundled logging config.
+"""
+
+from .filters import (RepeatFilter, SamplingFilter, StandardMetadataFilter,
+                      flush_repeat_filters, suppression_stats)
+from .formatters import SingleLineColoredFormatter, SingleLineFormatter
+from .handlers import ReopeningFileHandler, reopen_log_files, restart_log_files_watcher
+from .journald import JournaldHandler
+from .queueing import (QueueHandler, QueueListener, queue_listener,
+                       queue_listener_stats, resolve_queue_handlers_targets,
+                       restart_queue_listener, stop_queue_listener)
+from .rotating import (CompressingRotatingFileHandler, compress_file, log_compressor,
+                       restart_log_compressor)
@@ -0,0 +1,344 @@
+import logging
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def _hostname():
+    try:
+        return socket.gethostname()
+    except Exception:
+        return "-"
+
+
+#: Resolved once, on import
+HOSTNAME = _hostname()
+
+# (second, head, tail) of last formatted timestamps
+_LOCAL_SECOND = (None, "", "")
+_UTC_SECOND = (None, "", "")
+
+
+def isotime(created: float) -> str:
+    """
+    Formats POSIX timestamp as local time ISO8601 string with microseconds.
+
+    Everything except microseconds is computed once per second and cached, so
+    calling this for each log record is cheap.
+    """
+    global _LOCAL_SECOND
+    second = int(created)
+    cached_second, head, tail = _LOCAL_SECOND
+    if cached_second != second:
+        text = datetime.fromtimestamp(second, timezone.utc).astimezone().isoformat()
+        cached_second, head, tail = _LOCAL_SECOND = (second, text[:19], text[19:])
+    return "%s.%06d%s" % (head, (created - second) * 1000000, tail)
+
+
+def isotime_utc(created: float) -> str:
+    """Like `isotime`, but in UTC."""
+    global _UTC_SECOND
+    second = int(created)
+    cached_second, head, tail = _UTC_SECOND
+    if cached_second != second:
+        text = datetime.fromtimestamp(second, timezone.utc).isoformat()
+        cached_second, head, tail = _UTC_SECOND = (second, text[:19], text[19:])
+    return "%s.%06d%s" % (head, (created - second) * 1000000, tail)
+
+
+class StandardMetadataFilter(logging.Filter):
+    """
+    Adds ``hostname``, ``isotime`` and ``isotime_utc`` attributes to log records.
+
+    Drop-in replacement for `seveno_pyutil.StandardMetadataFilter` that is cheap
+    to attach to many handlers: hostname is resolved once per process and records
+    already enriched by filter on another handler are left alone, so metadata is
+    computed once per record, no matter how many handlers it reaches.
+    """
+
+    #: Resolved once, on import
+    HOSTNAME = HOSTNAME
+
+    def filter(self, record):
+        if "isotime" not in record.__dict__:
+            record.isotime = isotime(record.created)
+            record.isotime_utc = isotime_utc(record.created)
+            record.hostname = self.HOSTNAME
+
+        return super().filter(record)
+
+
+class _OncePerRecordFilter(logging.Filter):
+    """
+    Filter that decides about each record once, even if the same instance is
+    attached to many handlers (or to queue handler and handlers behind it).
+    Decision is stored on record and returned again by later passes, so they
+    don't update counters (or state of `RepeatFilter`) for the same record again.
+    """
+
+    def filter(self, record):
+        decisions = record.__dict__.get("_filter_decisions")
+        if decisions is None:
+            decisions = record._filter_decisions = {}
+
+        decision = decisions.get(id(self))
+        if decision is None:
+            decision = decisions[id(self)] = self._decide(record)
+        return decision
+
+    def _decide(self, record) -> bool:
+        return super().filter(record)
+
+
+class SamplingFilter(_OncePerRecordFilter):
+    """
+    Lets through only sample of records logged below or at ``max_level``, to
+    keep noisy hot loops from saturating I/O.
+
+    - ``every``: passes first and then every ``every``-th record logged from the
+      same call site (source file and line)
+    - ``rate``: passes at most ``rate`` records per second (with bursts of up to
+      ``burst`` records) of each message template (token bucket)
+
+    When both are given, record must pass both. Records above ``max_level`` are
+    never suppressed.
+
+    Arguments:
+        every: sample 1 in ``every`` records of each call site, ``1`` disables
+            sampling
+        rate: records per second allowed for each message template, ``0``
+            disables rate limiting
+        burst: token bucket capacity, defaults to ``max(1, rate)``
+        max_level: name or number of highest level that is sampled
+    """
+
+    #: When this many keys (call sites or templates) are tracked, counters
+    #: are reset
+    MAX_KEYS = 10000
+
+    def __init__(
+        self,
+        every: int = 1,
+        rate: float = 0,
+        burst: float = None,
+        max_level="INFO",
+        name: str = "",
+    ):
+        super().__init__(name)
+        self.every = max(1, int(every))
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.max_level = (
+            logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+        )
+
+        self.passed = 0
+        self.suppressed = 0
+        self.suppressed_by_site = {}
+        self._sites = {}  # (pathname, lineno) -> records seen
+        self._buckets = {}  # msg -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def _decide(self, record) -> bool:
+        if not super()._decide(record):
+            return False
+
+        if (self.every == 1 and not self.rate) or record.levelno > self.max_level:
+            return True
+
+        with self._lock:
+            retv = self._sample(record) and self._take_token(record)
+            if retv:
+                self.passed += 1
+            else:
+                self.suppressed += 1
+                site = "{}:{}".format(record.pathname, record.lineno)
+                self.suppressed_by_site[site] = (
+                    self.suppressed_by_site.get(site, 0) + 1
+                )
+
+        return retv
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "passed": self.passed,
+                "suppressed": self.suppressed,
+                "suppressed_by_site": dict(self.suppressed_by_site),
+            }
+
+    def _sample(self, record) -> bool:
+        if self.every == 1:
+            return True
+
+        if len(self._sites) >= self.MAX_KEYS:
+            self._sites.clear()
+
+        key = (record.pathname, record.lineno)
+        seen = self._sites.get(key, 0)
+        self._sites[key] = seen + 1
+        return seen % self.every == 0
+
+    def _take_token(self, record) -> bool:
+        if not self.rate:
+            return True
+
+        if len(self._buckets) >= self.MAX_KEYS:
+            self._buckets.clear()
+
+        key = record.msg if isinstance(record.msg, str) else id(record.msg)
+        now = time.monotonic()
+        tokens, refilled_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return True
+
+        self._buckets[key] = (tokens, now)
+        return False
+
+
+class RepeatFilter(_OncePerRecordFilter):
+    """
+    Collapses consecutive repetitions of the same message (same logger, level
+    and rendered message) into single ``Last message repeated N times`` record.
+
+    Summary record is logged through logger of repeated message, right before
+    the first different message, or ``flush_interval`` seconds after the first
+    repetition it covers, whichever comes first. So summary of burst that
+    stopped isn't held back until something else is logged. Pending summaries
+    are also flushed on shutdown (see `flush_repeat_filters`).
+
+    Arguments:
+        flush_interval: max seconds between two summaries of the same
+            repeating message
+    """
+
+    def __init__(self, flush_interval: float = 30, name: str = ""):
+        super().__init__(name)
+        self.flush_interval = flush_interval
+
+        self.suppressed = 0
+        self.summaries = 0
+        self._last_key = None
+        self._last_record = None
+        self._repeats = 0
+        self._first_repeat_at = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def _decide(self, record) -> bool:
+        if not super()._decide(record):
+            return False
+
+        if getattr(record, "_repeat_summary", False):
+            return True
+
+        key = (record.name, record.levelno, record.getMessage())
+        summary = None
+
+        with self._lock:
+            if key == self._last_key:
+                now = time.monotonic()
+                if not self._repeats:
+                    self._first_repeat_at = now
+                    self._start_timer()
+                self._repeats += 1
+                self.suppressed += 1
+                retv = False
+
+                if now - self._first_repeat_at >= self.flush_interval:
+                    summary = self._take_summary()
+
+            else:
+                summary = self._take_summary()
+                self._last_key = key
+                self._last_record = record
+                retv = True
+
+        self._emit(summary)
+        return retv
+
+    def flush(self):
+        """Logs summary of pending repetitions, if there are any."""
+        with self._lock:
+            summary = self._take_summary()
+        self._emit(summary)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "suppressed": self.suppressed,
+                "summaries": self.summaries,
+                "pending_repeats": self._repeats,
+            }
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.flush_interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _emit(self, summary):
+        if summary is not None:
+            logging.getLogger(summary.name).handle(summary)
+
+    def _take_summary(self):
+        if not self._repeats:
+            return None
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        record = self._last_record
+        summary = logging.LogRecord(
+            record.name,
+            record.levelno,
+            record.pathname,
+            record.lineno,
+            "Last message repeated %d times",
+            (self._repeats,),
+            None,
+            record.funcName,
+        )
+        summary._repeat_summary = True
+
+        self.summaries += 1
+        self._repeats = 0
+        return summary
+
+
+def suppression_stats() -> dict:
+    """
+    Counters of all `SamplingFilter` and `RepeatFilter` instances attached to
+    configured handlers, by name of the first handler each of them is attached
+    to.
+    """
+    retv = {}
+    seen = set()
+    for handler_name, handler in list(logging._handlers.items()):
+        for log_filter in handler.filters:
+            if isinstance(log_filter, (SamplingFilter, RepeatFilter)):
+                # The same instance can be attached to many handlers
+                if id(log_filter) in seen:
+                    continue
+                seen.add(id(log_filter))
+                retv.setdefault(handler_name, {})[
+                    type(log_filter).__name__
+                ] = log_filter.stats()
+    return retv
+
+
+def flush_repeat_filters():
+    """
+    Logs pending summaries of all `RepeatFilter` instances attached to
+    configured handlers.
+    """
+    seen = set()
+    for handler in list(logging._handlers.values()):
+        for log_filter in handler.filters:
+            if isinstance(log_filter, RepeatFilter) and id(log_filter) not in seen:
+                seen.add(id(log_filter))
+                log_filter.flush()
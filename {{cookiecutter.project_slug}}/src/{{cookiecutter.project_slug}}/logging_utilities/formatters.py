@@ -0,0 +1,129 @@
+import logging
+import operator
+import os
+import re
+
+from .filters import HOSTNAME, isotime, isotime_utc
+
+_FIELD = re.compile(
+    r"%\((?P<name>\w+)\)(?P<spec>[#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])"
+)
+
+
+class SingleLineFormatter(logging.Formatter):
+    """
+    Fast formatter that escapes new lines, forcing each log record to be logged
+    as single line.
+
+    Drop-in replacement for `seveno_pyutil.SingleLineFormatter`. Only
+    ``%``-style format strings are supported. Format is compiled once:
+
+    - ``hostname`` and ``process`` fields are rendered into static parts of
+      format (re-rendered if formatter is used in forked process)
+    - ``isotime`` and ``isotime_utc`` are computed from ``record.created``, with
+      everything except microseconds cached per second
+    - all other fields are read from record in one go
+
+    New lines are escaped in single pass over message and exception text.
+    """
+
+    #: Fields that never change for lifetime of process
+    STATIC_FIELDS = ("hostname", "process")
+
+    def __init__(self, fmt=None, datefmt=None, style="%", **kwargs):
+        if style != "%":
+            raise ValueError("Only %-style format strings are supported")
+
+        super().__init__(fmt, datefmt, style, **kwargs)
+        self._pid = -1
+        self._template = None
+        self._get_fields = None
+        self._uses_isotime = self._uses_isotime_utc = self._uses_asctime = False
+
+    def format(self, record):
+        if record.process != self._pid:
+            self._compile(record.process)
+
+        record.message = record.getMessage()
+        if self._uses_isotime:
+            record.isotime = isotime(record.created)
+        if self._uses_isotime_utc:
+            record.isotime_utc = isotime_utc(record.created)
+        if self._uses_asctime:
+            record.asctime = self.formatTime(record, self.datefmt)
+        self._prepare(record)
+
+        retv = self._template % self._get_fields(record)
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            retv = retv + "\n" + record.exc_text
+        if record.stack_info:
+            retv = retv + "\n" + self.formatStack(record.stack_info)
+
+        return self._finish(retv.replace("\n", "\\n"))
+
+    def _prepare(self, record):
+        pass
+
+    def _finish(self, line):
+        return line
+
+    def _compile(self, pid):
+        static = {"hostname": HOSTNAME, "process": pid or os.getpid()}
+        template = []
+        fields = []
+        position = 0
+
+        for match in _FIELD.finditer(self._fmt):
+            template.append(self._fmt[position : match.start()])
+            name, spec = match.group("name"), "%" + match.group("spec")
+            if name in self.STATIC_FIELDS:
+                template.append((spec % static[name]).replace("%", "%%"))
+            else:
+                template.append(spec)
+                fields.append(name)
+            position = match.end()
+        template.append(self._fmt[position:])
+
+        self._template = "".join(template)
+        if len(fields) > 1:
+            self._get_fields = operator.attrgetter(*fields)
+        elif fields:
+            get_field = operator.attrgetter(fields[0])
+            self._get_fields = lambda record: (get_field(record),)
+        else:
+            self._get_fields = lambda record: ()
+        self._uses_isotime = "isotime" in fields
+        self._uses_isotime_utc = "isotime_utc" in fields
+        self._uses_asctime = "asctime" in fields
+        self._pid = pid
+
+
+class SingleLineColoredFormatter(SingleLineFormatter):
+    """
+    `SingleLineFormatter` that supports ``%(log_color)s`` and ``%(reset)s``
+    fields and resets colors at the end of each line.
+
+    Drop-in replacement for `seveno_pyutil.SingleLineColoredFormatter` (using
+    ``colorlog`` default colors).
+    """
+
+    #: ANSI escape sequence of each level's color
+    LOG_COLORS = {
+        "DEBUG": "\033[37m",
+        "INFO": "\033[32m",
+        "WARNING": "\033[33m",
+        "ERROR": "\033[31m",
+        "CRITICAL": "\033[01;31m",
+    }
+
+    RESET = "\033[0m"
+
+    def _prepare(self, record):
+        record.log_color = self.LOG_COLORS.get(record.levelname, "")
+        record.reset = self.RESET
+
+    def _finish(self, line):
+        return line + self.RESET
@@ -0,0 +1,233 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import threading
+import time
+import weakref
+
+_IN_CLOEXEC = 0o2000000
+_IN_ATTRIB = 0x00000004
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+_FILE_HANDLERS = weakref.WeakSet()
+
+
+class _InotifyWatcher:
+    """
+    Single background thread per process that watches files with inotify and
+    calls callbacks when they are moved or deleted.
+
+    Thread is blocked in ``read()`` for as long as watched files are left alone,
+    so it costs nothing when idle.
+    """
+
+    _MASK = _IN_MOVE_SELF | _IN_DELETE_SELF | _IN_ATTRIB
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_rm_watch = libc.inotify_rm_watch
+
+        self._fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._watch, name="log-files-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, path: str, callback) -> int:
+        wd = self._inotify_add_watch(self._fd, os.fsencode(path), self._MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed", path)
+        with self._lock:
+            self._callbacks[wd] = callback
+        return wd
+
+    def remove(self, wd: int):
+        with self._lock:
+            if self._callbacks.pop(wd, None) is not None:
+                self._inotify_rm_watch(self._fd, wd)
+
+    def _watch(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * _INOTIFY_EVENT.size)
+            except OSError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size + name_len
+
+                with self._lock:
+                    callback = (
+                        self._callbacks.pop(wd, None)
+                        if mask & _IN_IGNORED
+                        else self._callbacks.get(wd)
+                    )
+                if callback:
+                    callback()
+
+
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+
+def _inotify_watcher():
+    global _WATCHER
+    with _WATCHER_LOCK:
+        if _WATCHER is None:
+            try:
+                _WATCHER = _InotifyWatcher()
+            except (OSError, AttributeError):
+                # No inotify (not Linux, or limits exhausted)
+                _WATCHER = False
+        return _WATCHER
+
+
+def reopen_log_files():
+    """
+    Makes all `ReopeningFileHandler` instances reopen their files before
+    handling next record.
+
+    Application server calls this on ``SIGUSR1``, so logrotate can be configured
+    with::
+
+        postrotate
+            kill -USR1 <pid>
+        endscript
+    """
+    for handler in list(_FILE_HANDLERS):
+        handler.request_reopen()
+
+
+def restart_log_files_watcher():
+    """
+    Re-creates inotify watcher thread in forked child process and re-registers
+    all `ReopeningFileHandler` watches with it.
+    """
+    global _WATCHER, _WATCHER_LOCK
+    _WATCHER_LOCK = threading.Lock()
+    _WATCHER = None
+    for handler in list(_FILE_HANDLERS):
+        handler._watch_descriptor = None
+        handler._watch()
+
+
+class ReopeningFileHandler(logging.FileHandler):
+    """
+    File handler that reopens log file after it was moved or deleted (ie. by
+    logrotate).
+
+    Unlike `logging.handlers.WatchedFileHandler`, which calls ``os.stat()`` for
+    each emitted record, this one learns about file being moved from:
+
+    - inotify watch on the file, handled by single background thread per process
+    - `reopen_log_files`, which application server calls on ``SIGUSR1``
+    - if inotify is not available, by checking file every ``poll_interval``
+      seconds (``0`` disables polling)
+
+    Arguments:
+        poll_interval: seconds between two checks of file when inotify is not
+            available
+    """
+
+    def __init__(
+        self,
+        filename,
+        mode="a",
+        encoding=None,
+        delay=False,
+        poll_interval: float = 1.0,
+    ):
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay)
+        self.poll_interval = poll_interval
+        self._reopen_needed = False
+        self._watch_descriptor = None
+        self._next_poll_at = 0
+        self._watch()
+        _FILE_HANDLERS.add(self)
+
+    @property
+    def is_polling(self) -> bool:
+        return self._watch_descriptor is None and bool(self.poll_interval)
+
+    def request_reopen(self):
+        """Makes handler reopen its file before handling next record."""
+        self._reopen_needed = True
+
+    def emit(self, record):
+        if self._reopen_needed:
+            self.reopen()
+
+        elif self._watch_descriptor is None and self.poll_interval:
+            now = time.monotonic()
+            if now >= self._next_poll_at:
+                self._next_poll_at = now + self.poll_interval
+                if self._is_moved():
+                    self.reopen()
+
+        super().emit(record)
+
+    def reopen(self):
+        self._reopen_needed = False
+
+        if self.stream is not None:
+            self.stream.flush()
+            self.stream.close()
+            self.stream = None
+
+        self.stream = self._open()
+        self._watch()
+
+    def close(self):
+        self.acquire()
+        try:
+            self._unwatch()
+            _FILE_HANDLERS.discard(self)
+        finally:
+            self.release()
+        super().close()
+
+    def _watch(self):
+        self._unwatch()
+
+        watcher = _inotify_watcher()
+        if not watcher:
+            return
+
+        if self.stream is None:
+            # delay=True and file was not created yet
+            return
+
+        try:
+            self._watch_descriptor = watcher.add(self.baseFilename, self.request_reopen)
+        except OSError:
+            self._watch_descriptor = None
+
+    def _unwatch(self):
+        if self._watch_descriptor is not None and _WATCHER:
+            _WATCHER.remove(self._watch_descriptor)
+        self._watch_descriptor = None
+
+    def _is_moved(self) -> bool:
+        if self.stream is None:
+            return False
+
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+
+        opened = os.fstat(self.stream.fileno())
+        return (on_disk.st_dev, on_disk.st_ino) != (opened.st_dev, opened.st_ino)
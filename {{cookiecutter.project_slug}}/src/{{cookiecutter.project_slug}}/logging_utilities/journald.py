@@ -0,0 +1,163 @@
+import array
+import errno
+import fcntl
+import logging
+import os
+import socket
+import struct
+import tempfile
+
+#: Native protocol socket of systemd-journald
+JOURNALD_SOCKET = "/run/systemd/journal/socket"
+
+#: Python logging level -> syslog priority
+PRIORITIES = {
+    logging.CRITICAL: 2,
+    logging.ERROR: 3,
+    logging.WARNING: 4,
+    logging.INFO: 6,
+    logging.DEBUG: 7,
+}
+_PRIORITY_THRESHOLDS = sorted(PRIORITIES.items(), reverse=True)
+
+_F_ADD_SEALS = 1033
+_F_SEALS = 1 | 2 | 4 | 8  # F_SEAL_SEAL | F_SEAL_SHRINK | F_SEAL_GROW | F_SEAL_WRITE
+
+
+def _priority(levelno: int) -> int:
+    for level, priority in _PRIORITY_THRESHOLDS:
+        if levelno >= level:
+            return priority
+    return 7
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def serialize_field(name: str, value) -> bytes:
+    """
+    Serializes single journal field as described by journald native protocol.
+    """
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8", "replace")
+    name = name.encode("ascii")
+
+    if b"\n" in value:
+        return name + b"\n" + struct.pack("<Q", len(value)) + value + b"\n"
+    return name + b"=" + value + b"\n"
+
+
+class JournaldHandler(logging.Handler):
+    """
+    Sends log records to systemd-journald using its native protocol, as
+    structured entries.
+
+    Besides ``MESSAGE`` (record formatted by handler's formatter) and
+    ``PRIORITY``, each entry carries ``SYSLOG_IDENTIFIER``, ``SYSLOG_PID``,
+    ``LOGGER``, ``THREAD_NAME``, ``CODE_FILE``, ``CODE_LINE``, ``CODE_FUNC`` and
+    ``EXCEPTION_TEXT`` (if record carries exception). Additional fields can be
+    given in ``extra`` of logging call, using upper case names:
+
+    .. code-block:: python
+
+        logger.info("Done", extra={"JOB_ID": job.id})
+
+    Entries are sent as single datagrams. Entries too large for datagram are
+    written into sealed memfd, which is passed to journald instead.
+
+    Arguments:
+        identifier: ``SYSLOG_IDENTIFIER`` of all entries
+        address: path to journald socket
+        extra_fields: static fields added to each entry
+    """
+
+    def __init__(
+        self,
+        identifier: str = None,
+        address: str = JOURNALD_SOCKET,
+        extra_fields: dict = None,
+    ):
+        super().__init__()
+        self.address = address
+        self._static = b"".join(
+            serialize_field(name, value)
+            for name, value in dict(
+                extra_fields or {}, SYSLOG_IDENTIFIER=identifier or "python"
+            ).items()
+        )
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def emit(self, record):
+        try:
+            self.send(self.serialize(record))
+        except Exception:
+            self.handleError(record)
+
+    def serialize(self, record) -> bytes:
+        fields = [
+            self._static,
+            serialize_field("MESSAGE", self.format(record)),
+            serialize_field("PRIORITY", _priority(record.levelno)),
+            serialize_field("SYSLOG_PID", record.process),
+            serialize_field("LOGGER", record.name),
+            serialize_field("THREAD_NAME", record.threadName),
+            serialize_field("CODE_FILE", record.pathname),
+            serialize_field("CODE_LINE", record.lineno),
+            serialize_field("CODE_FUNC", record.funcName),
+        ]
+
+        if record.exc_text:
+            fields.append(serialize_field("EXCEPTION_TEXT", record.exc_text))
+
+        for name, value in record.__dict__.items():
+            if name.isupper() and not name.startswith("_"):
+                fields.append(serialize_field(name, value))
+
+        return b"".join(fields)
+
+    def send(self, data: bytes):
+        try:
+            self._socket.sendto(data, self.address)
+        except OSError as exception:
+            if exception.errno not in (errno.EMSGSIZE, errno.ENOBUFS):
+                raise
+            self._send_fd(data)
+
+    def close(self):
+        self.acquire()
+        try:
+            self._socket.close()
+        finally:
+            self.release()
+        super().close()
+
+    def _send_fd(self, data: bytes):
+        fd = self._create_payload_fd(data)
+        try:
+            self._socket.sendmsg(
+                [],
+                [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", [fd]))],
+                0,
+                self.address,
+            )
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _create_payload_fd(data: bytes) -> int:
+        memfd_create = getattr(os, "memfd_create", None)
+
+        if memfd_create:
+            fd = memfd_create("journald-payload", os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+            _write_all(fd, data)
+            fcntl.fcntl(fd, getattr(fcntl, "F_ADD_SEALS", _F_ADD_SEALS), _F_SEALS)
+            return fd
+
+        # Before memfd, journald accepted unlinked temp file in /dev/shm
+        fd, path = tempfile.mkstemp(dir="/dev/shm", prefix="journald-payload-")
+        os.unlink(path)
+        _write_all(fd, data)
+        return fd
@@ -0,0 +1,213 @@
+import logging
+import logging.handlers
+import queue
+import threading
+
+from .filters import flush_repeat_filters
+
+#: What to do with log record when queue is full
+OVERFLOW_POLICIES = ("drop", "block")
+
+_LISTENER = None
+_LISTENER_LOCK = threading.Lock()
+
+
+def _handler_by_name(name):
+    getter = getattr(logging, "getHandlerByName", None)
+    if getter:
+        return getter(name)
+    return logging._handlers.get(name)
+
+
+class QueueListener:
+    """
+    Owns bounded queue of log records and background thread that passes them
+    to real handlers.
+
+    There is one listener per process, shared by all `QueueHandler` instances
+    (see `queue_listener`).
+
+    Arguments:
+        maxsize: max number of records waiting in queue
+        overflow: ``drop`` to discard records when queue is full or ``block`` to
+            make logging thread wait for free space in queue
+    """
+
+    def __init__(self, maxsize: int = 10000, overflow: str = "drop"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "Unknown overflow policy {!r}, expected one of {}".format(
+                    overflow, OVERFLOW_POLICIES
+                )
+            )
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.enqueued = 0
+        self.dropped = 0
+        self._thread = None
+        self._is_stopped = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._is_stopped = False
+        self._thread = threading.Thread(
+            target=self._monitor, name="logging-queue-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Processes all queued records and stops background thread.
+
+        Records logged after listener was stopped are passed to handlers
+        synchronously, in logging thread.
+        """
+        self._is_stopped = True
+        if self.is_running:
+            self.queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def put(self, handlers, record):
+        if self._is_stopped or self._thread is None:
+            self._dispatch(handlers, record)
+            return
+
+        try:
+            if self.overflow == "block":
+                self.queue.put((handlers, record))
+            else:
+                self.queue.put_nowait((handlers, record))
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "maxsize": self.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+        }
+
+    def _monitor(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self._dispatch(*item)
+
+    def _dispatch(self, handlers, record):
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+
+
+def queue_listener(maxsize: int = 10000, overflow: str = "drop") -> QueueListener:
+    """
+    Returns global `QueueListener`, creating and starting it on first call.
+    """
+    global _LISTENER
+    with _LISTENER_LOCK:
+        if _LISTENER is None:
+            _LISTENER = QueueListener(maxsize=maxsize, overflow=overflow)
+            _LISTENER.start()
+        return _LISTENER
+
+
+def stop_queue_listener():
+    """
+    Flushes pending `RepeatFilter` summaries and queued records and stops global
+    `QueueListener`, if there is one.
+    """
+    flush_repeat_filters()
+    if _LISTENER is not None:
+        _LISTENER.stop()
+
+
+def queue_listener_stats() -> dict:
+    """Stats of process logging queue, empty if it isn't used."""
+    listener = _LISTENER
+    return listener.stats() if listener is not None else {}
+
+
+def restart_queue_listener():
+    """
+    Replaces global `QueueListener` with new one that has the same settings.
+
+    Background threads don't survive ``fork()``, so this must be called in
+    forked child process. Records queued, but not yet processed, in parent
+    process are discarded in child (parent's listener will process them).
+    """
+    global _LISTENER, _LISTENER_LOCK
+    _LISTENER_LOCK = threading.Lock()
+    if _LISTENER is not None:
+        _LISTENER = QueueListener(
+            maxsize=_LISTENER.maxsize, overflow=_LISTENER.overflow
+        )
+        _LISTENER.start()
+
+
+def resolve_queue_handlers_targets():
+    """
+    Resolves targets of all configured `QueueHandler` instances.
+
+    Must be called right after ``dictConfig``: handlers that aren't attached to
+    any logger are, until `QueueHandler` resolves them, referenced only by
+    ``dictConfig`` internals and would be garbage collected sooner or later.
+    """
+    for handler in list(logging._handlers.values()):
+        if isinstance(handler, QueueHandler):
+            handler.targets
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler that passes records to global `QueueListener` instead of handling
+    them in logging thread.
+
+    Slow handlers (files, syslog, ...) are taken off the hot path this way: cost
+    of logging in application thread is cost of formatting message and putting
+    it in queue.
+
+    Arguments:
+        handlers: names of real handlers (from the same logging config) that
+            records are passed to by listener thread
+        maxsize: see `QueueListener`
+        overflow: see `QueueListener`
+    """
+
+    def __init__(self, handlers, maxsize: int = 10000, overflow: str = "drop"):
+        super().__init__(None)
+        self.target_names = list(handlers)
+        self._targets = None
+        queue_listener(maxsize=maxsize, overflow=overflow)
+
+    @property
+    def targets(self):
+        # Handlers are resolved lazily, because when this one is created by
+        # dictConfig, targets might not exist yet
+        if self._targets is None:
+            self._targets = [
+                handler
+                for handler in (_handler_by_name(name) for name in self.target_names)
+                if handler is not None
+            ]
+        return self._targets
+
+    def enqueue(self, record):
+        _LISTENER.put(self.targets, record)
+
+    def flush(self):
+        for handler in self.targets:
+            handler.flush()
@@ -0,0 +1,320 @@
+import ctypes
+import ctypes.util
+import fcntl
+import gzip
+import logging
+import os
+import platform
+import queue
+import re
+import shutil
+import threading
+import time
+
+from .handlers import ReopeningFileHandler
+
+logger = logging.getLogger(__name__)
+
+#: Supported compressions of rotated log segments and their file suffixes
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# Rotated segment is rendered from this time format
+_SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+# Size of log file is checked (fstat) whenever this many bytes were written
+_SIZE_CHECK_BYTES = 64 * 1024
+
+# gettid() syscall numbers, for Python < 3.8 that has no threading.get_native_id
+_SYS_GETTID = {"x86_64": 186, "aarch64": 178, "i386": 224, "i686": 224}
+
+_COMPRESSOR = None
+_COMPRESSOR_LOCK = threading.Lock()
+
+
+class _Compressor:
+    """
+    Single background thread per process that runs log compression jobs with
+    lowest possible CPU priority.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._work, name="log-compressor", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        self.jobs.put((fn, args))
+
+    def join(self):
+        """Waits until all submitted jobs are done."""
+        self.jobs.join()
+
+    def _work(self):
+        _lower_current_thread_priority()
+
+        while True:
+            fn, args = self.jobs.get()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Log compression job failed!")
+            finally:
+                self.jobs.task_done()
+
+
+def _lower_current_thread_priority():
+    # On Linux both of these apply to calling thread only
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        return
+    except (AttributeError, OSError):
+        pass
+
+    try:
+        os.setpriority(os.PRIO_PROCESS, _native_thread_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def _native_thread_id() -> int:
+    get_native_id = getattr(threading, "get_native_id", None)
+    if get_native_id is not None:
+        return get_native_id()
+
+    number = _SYS_GETTID.get(platform.machine())
+    if number is None:
+        raise OSError("Unknown gettid syscall number on {}".format(platform.machine()))
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    tid = libc.syscall(number)
+    if tid < 0:
+        raise OSError(ctypes.get_errno(), "gettid failed")
+    return tid
+
+
+def log_compressor() -> _Compressor:
+    """Returns background log compressor, starting it on first call."""
+    global _COMPRESSOR
+    with _COMPRESSOR_LOCK:
+        if _COMPRESSOR is None:
+            _COMPRESSOR = _Compressor()
+        return _COMPRESSOR
+
+
+def restart_log_compressor():
+    """
+    Forgets log compressor inherited from parent process. Must be called in
+    forked child process, new compressor thread is started on first use.
+    """
+    global _COMPRESSOR, _COMPRESSOR_LOCK
+    _COMPRESSOR_LOCK = threading.Lock()
+    _COMPRESSOR = None
+
+
+def compress_file(path: str, compression: str, level: int = None) -> str:
+    """
+    Compresses file into ``path`` + compression suffix and removes original.
+
+    Compressed file is written under temporary name and renamed when complete,
+    so there are never partially compressed segments on disk.
+
+    Returns:
+        path to compressed file
+    """
+    target = path + COMPRESSIONS[compression]
+    tmp_path = target + ".tmp"
+
+    with open(path, "rb") as src:
+        if compression == "zstd":
+            import zstandard
+
+            with open(tmp_path, "wb") as dst:
+                zstandard.ZstdCompressor(level=level or 3).copy_stream(src, dst)
+        else:
+            with gzip.open(tmp_path, "wb", compresslevel=level or 6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    os.rename(tmp_path, target)
+    os.unlink(path)
+    return target
+
+
+def _segment_order(match):
+    return match.group("time"), int(match.group("index") or 0)
+
+
+class CompressingRotatingFileHandler(ReopeningFileHandler):
+    """
+    `ReopeningFileHandler` that rotates log file by size and/or time, compresses
+    rotated segments and keeps last ``backup_count`` of them.
+
+    Rotated segments are named ``<filename>.<YYYYmmdd-HHMMSS>[.gz|.zst]``.
+    Compression and removal of old segments are done by single background thread
+    per process with lowest CPU priority (``SCHED_IDLE``), so logging thread
+    never waits for them. Segments left uncompressed (ie. app was stopped while
+    compression was in progress) are compressed when handler is created.
+
+    Rotation is safe when many processes (ie. prefork workers) log into the same
+    file: file is rotated under ``flock`` and processes that find out file was
+    rotated by someone else just reopen it.
+
+    Arguments:
+        max_bytes: rotate when file grows over this size, ``0`` disables size
+            based rotation
+        interval: rotate every ``interval`` seconds (aligned to UTC epoch, so
+            ``86400`` rotates at UTC midnight), ``0`` disables time based
+            rotation
+        backup_count: number of rotated segments to keep, ``0`` keeps all
+        compression: ``gzip``, ``zstd`` (requires ``zstandard`` package) or
+            ``None``
+        compression_level: compression level, defaults to ``6`` for gzip and
+            ``3`` for zstd
+    """
+
+    def __init__(
+        self,
+        filename,
+        mode="a",
+        encoding=None,
+        delay=False,
+        poll_interval: float = 1.0,
+        max_bytes: int = 0,
+        interval: float = 0,
+        backup_count: int = 10,
+        compression: str = "gzip",
+        compression_level: int = None,
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                "Unknown compression {!r}, expected one of {}".format(
+                    compression, tuple(COMPRESSIONS)
+                )
+            )
+        if compression == "zstd":
+            import zstandard  # noqa: F401 # fail early if it is not installed
+
+        super().__init__(
+            filename,
+            mode=mode,
+            encoding=encoding,
+            delay=delay,
+            poll_interval=poll_interval,
+        )
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.compression = compression
+        self.compression_level = compression_level
+
+        self._check_bytes = min(_SIZE_CHECK_BYTES, max(1, max_bytes // 16))
+        self._unchecked_bytes = 0
+        self._rotate_at = self._next_rotation_at(time.time())
+        self._segment_pattern = re.compile(
+            re.escape(os.path.basename(self.baseFilename))
+            + r"\.(?P<time>\d{8}-\d{6})(-(?P<index>\d+))?(\.gz|\.zst)?$"
+        )
+
+        if compression:
+            for segment in self.segments():
+                if not segment.endswith((".gz", ".zst")):
+                    log_compressor().submit(self._compress_and_prune, segment)
+
+    def format(self, record):
+        retv = super().format(record)
+        self._unchecked_bytes += len(retv) + 1
+        return retv
+
+    def emit(self, record):
+        if self.stream is not None and (
+            (self.max_bytes and self._unchecked_bytes >= self._check_bytes)
+            or (self.interval and record.created >= self._rotate_at)
+        ):
+            self.rotate_if_due(record.created)
+
+        super().emit(record)
+
+    def rotate_if_due(self, now: float = None):
+        """
+        Rotates log file if it is due for rotation and wasn't already rotated by
+        another process.
+        """
+        now = time.time() if now is None else now
+        self._unchecked_bytes = 0
+
+        is_time_due = bool(self.interval) and now >= self._rotate_at
+        if is_time_due:
+            self._rotate_at = self._next_rotation_at(now)
+
+        if self.stream is None:
+            return
+
+        segment = None
+        self.stream.flush()
+        fd = self.stream.fileno()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if self._is_moved():
+                # Another process had already rotated it
+                pass
+
+            else:
+                size = os.fstat(fd).st_size
+                is_size_due = bool(self.max_bytes) and size >= self.max_bytes
+                if size and (is_time_due or is_size_due):
+                    self._unwatch()
+                    segment = self._segment_path(now)
+                    os.rename(self.baseFilename, segment)
+
+                else:
+                    return
+
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+        self.reopen()
+
+        if segment:
+            log_compressor().submit(self._compress_and_prune, segment)
+
+    def segments(self):
+        """Paths to all rotated segments, oldest first."""
+        directory = os.path.dirname(self.baseFilename)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+
+        matches = filter(None, (self._segment_pattern.match(name) for name in names))
+        return [
+            os.path.join(directory, match.string)
+            for match in sorted(matches, key=_segment_order)
+        ]
+
+    def _compress_and_prune(self, segment: str):
+        if self.compression and os.path.exists(segment):
+            compress_file(segment, self.compression, self.compression_level)
+
+        if self.backup_count:
+            for old_segment in self.segments()[: -self.backup_count]:
+                try:
+                    os.unlink(old_segment)
+                except FileNotFoundError:
+                    pass
+
+    def _segment_path(self, now: float) -> str:
+        retv = "{}.{}".format(
+            self.baseFilename, time.strftime(_SEGMENT_TIME_FORMAT, time.localtime(now))
+        )
+        candidate, index = retv, 0
+        while any(
+            os.path.exists(candidate + suffix) for suffix in COMPRESSIONS.values()
+        ):
+            index += 1
+            candidate = "{}-{}".format(retv, index)
+        return candidate
+
+    def _next_rotation_at(self, now: float) -> float:
+        if not self.interval:
+            return float("inf")
+        return (now // self.interval + 1) * self.interval
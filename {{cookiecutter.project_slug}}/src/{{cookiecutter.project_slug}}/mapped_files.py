@@ -0,0 +1,197 @@
+"""
+Zero-copy reading of (big) files through memory maps.
+"""
+
+import logging
+import mmap
+import os
+import threading
+import weakref
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# All open mapped files, so they can be closed before their directory is removed
+_OPEN_FILES = weakref.WeakSet()
+_OPEN_FILES_LOCK = threading.Lock()
+
+# How much of already read file is dropped from process memory at once when
+# reading sequentially
+_DROP_BEHIND_BYTES = 64 * 1024 * 1024
+
+
+def _madvise(mapping, option_name: str, start: int = 0, length: int = 0):
+    # mmap.madvise and MADV_* constants are available since Python 3.8
+    option = getattr(mmap, option_name, None)
+    if option is None or mapping is None or not hasattr(mapping, "madvise"):
+        return
+
+    # Start must be page aligned
+    aligned_start = start - start % mmap.PAGESIZE
+    if length:
+        length += start - aligned_start
+    try:
+        mapping.madvise(option, aligned_start, length)
+    except (OSError, ValueError):
+        pass
+
+
+class MappedFile:
+    """
+    Read-only memory map of file that hands out `memoryview` slices of it
+    instead of copying its contents into `bytes`, so peak memory doesn't grow
+    with file size: pages are loaded by kernel when accessed and can be dropped
+    from memory at any time, since they are backed by file itself.
+
+    When reading sequentially (`.chunks`, `.records`, `.lines`), pages that were
+    already read are periodically dropped from process (``MADV_DONTNEED``), so
+    even its RSS stays flat. They stay in page cache and are transparently read
+    again if old views are accessed.
+
+    .. code-block:: python
+
+        with MappedFile(path) as mapped:
+            header = mapped.view(0, 16)
+            for line in mapped.lines():
+                handle(line)  # memoryview, bytes(line) when copy is needed
+
+    Views must be released (`memoryview.release` or just dropped) before file is
+    closed, otherwise `.close` can't unmap it and leaves that to garbage
+    collector.
+
+    Arguments:
+        path: file to map
+        sequential: hint kernel that file will be read sequentially, so it reads
+            ahead aggressively (``MADV_SEQUENTIAL``)
+    """
+
+    def __init__(self, path: str, sequential: bool = True):
+        self.path = os.path.abspath(path)
+        self.sequential = sequential
+
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # Empty files can't be mapped
+            self._mapping = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+            )
+
+        self._view = memoryview(self._mapping if self._mapping is not None else b"")
+        # Offset up to which pages were dropped, never drops if not sequential
+        self._dropped = 0 if sequential else self.size
+        if self._mapping is not None and sequential:
+            _madvise(self._mapping, "MADV_SEQUENTIAL")
+
+        with _OPEN_FILES_LOCK:
+            _OPEN_FILES.add(self)
+
+    @property
+    def closed(self) -> bool:
+        return self._view is None
+
+    def view(self, start: int = 0, stop: int = None) -> memoryview:
+        """`memoryview` of bytes between ``start`` and ``stop`` offsets."""
+        return self._view[start:stop]
+
+    def chunks(self, size: int = 1024 * 1024) -> Iterator[memoryview]:
+        """
+        Yields consecutive views of up to ``size`` bytes, asking kernel to load
+        next chunk while current one is processed (``MADV_WILLNEED``).
+        """
+        for start in range(0, self.size, size):
+            if start - self._dropped >= _DROP_BEHIND_BYTES:
+                self._drop_behind(start)
+            _madvise(self._mapping, "MADV_WILLNEED", start + size, size)
+            yield self._view[start : start + size]
+
+    def records(self, record_size: int) -> Iterator[memoryview]:
+        """Yields views of fixed size records, last one can be shorter."""
+        view = self._view
+        for start in range(0, self.size, record_size):
+            if start - self._dropped >= _DROP_BEHIND_BYTES:
+                self._drop_behind(start)
+            yield view[start : start + record_size]
+
+    def lines(self, separator: bytes = b"\n", keepends: bool = False):
+        """
+        Yields views of lines (or other ``separator`` delimited records).
+
+        Arguments:
+            keepends: include separator at the end of each line
+        """
+        if self._mapping is None:
+            return
+
+        find, view, size = self._mapping.find, self._view, self.size
+        separator_size = len(separator)
+        tail = separator_size if keepends else 0
+        start = 0
+        while start < size:
+            if start - self._dropped >= _DROP_BEHIND_BYTES:
+                self._drop_behind(start)
+            end = find(separator, start)
+            if end < 0:
+                yield view[start:]
+                return
+            yield view[start : end + tail]
+            start = end + separator_size
+
+    def _drop_behind(self, offset: int):
+        offset -= offset % mmap.PAGESIZE
+        _madvise(self._mapping, "MADV_DONTNEED", self._dropped, offset - self._dropped)
+        self._dropped = offset
+
+    def close(self):
+        """
+        Unmaps file. If there are still views of it around, unmapping is left to
+        garbage collector.
+        """
+        if self._view is None:
+            return
+
+        try:
+            self._view.release()
+        except BufferError:
+            pass
+        self._view = None
+        with _OPEN_FILES_LOCK:
+            _OPEN_FILES.discard(self)
+
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                logger.warning(
+                    "Views of %s are still in use, leaving it mapped", self.path
+                )
+            self._mapping = None
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<{} {} ({} bytes)>".format(type(self).__name__, self.path, self.size)
+
+
+def close_all(directory: str = None) -> int:
+    """
+    Closes all open `MappedFile`, or only those in ``directory``, ie. before
+    directory is removed.
+
+    Returns:
+        number of closed files
+    """
+    prefix = os.path.join(os.path.abspath(directory), "") if directory else ""
+    with _OPEN_FILES_LOCK:
+        files = [mapped for mapped in _OPEN_FILES if mapped.path.startswith(prefix)]
+
+    for mapped in files:
+        mapped.close()
+
+    return len(files)
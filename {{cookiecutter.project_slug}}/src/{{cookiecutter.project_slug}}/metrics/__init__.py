@@ -0,0 +1,67 @@
+"""
+Process metrics (counters, gauges and histograms) and their Prometheus exporter.
+
+Metrics are declared once, at module level, and updated from hot paths without
+taking locks:
+
+.. code-block:: python
+
+    from {{cookiecutter.project_slug}} import metrics
+
+    JOBS = metrics.counter("jobs_total", "Processed jobs", labels=["result"])
+    JOB_SECONDS = metrics.histogram("job_seconds", "Job processing time")
+
+    def handle(job):
+        with JOB_SECONDS.time():
+            ...
+        JOBS.labels("ok").inc()
+
+When ``metrics.listen`` is configured, application server serves them in
+Prometheus text format. Prefork workers publish their metrics into shared
+memory and supervisor serves them merged.
+"""
+
+from typing import List, Sequence
+
+from .exporter import MetricsServer, parse_listen
+from .exposition import CONTENT_TYPE, merge_families, render_text, sanitize_name
+from .registry import (DEFAULT_BUCKETS, MERGE_POLICIES, Counter, CounterChild, Family,
+                       Gauge, GaugeChild, Histogram, HistogramChild, Registry)
+from .shared import SharedMetrics
+
+#: Metrics of current process
+REGISTRY = Registry()
+
+
+def counter(name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+    """Shortcut for `Registry.counter` of `REGISTRY`."""
+    return REGISTRY.counter(name, doc, labels=labels)
+
+
+def gauge(
+    name: str, doc: str, labels: Sequence[str] = (), merge: str = "sum"
+) -> Gauge:
+    """Shortcut for `Registry.gauge` of `REGISTRY`."""
+    return REGISTRY.gauge(name, doc, labels=labels, merge=merge)
+
+
+def histogram(
+    name: str,
+    doc: str,
+    labels: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    """Shortcut for `Registry.histogram` of `REGISTRY`."""
+    return REGISTRY.histogram(name, doc, labels=labels, buckets=buckets)
+
+
+def collect(shared: SharedMetrics = None) -> List[Family]:
+    """
+    Metrics of current process, merged with metrics published by prefork
+    workers into ``shared``.
+    """
+    families = REGISTRY.collect()
+    if shared is not None:
+        families += shared.collect()
+    # Collectors can return families of the same metric too
+    return merge_families(families)
@@ -0,0 +1,195 @@
+import logging
+import os
+import signal
+import socketserver
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler
+from typing import Callable
+
+from .exposition import CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+_UNIX_PREFIX = "unix:"
+
+# Running servers, their rendering is paused while process forks
+_RUNNING = weakref.WeakSet()
+_PAUSED = []
+
+
+def _pause_rendering():
+    _PAUSED[:] = list(_RUNNING)
+    for server in _PAUSED:
+        server._render_lock.acquire()
+
+
+def _resume_rendering():
+    for server in _PAUSED:
+        server._render_lock.release()
+    _PAUSED.clear()
+
+
+# Rendering calls collectors that take locks of other objects (ie. executor).
+# If process forked while they are held, child would deadlock on them.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_pause_rendering,
+        after_in_parent=_resume_rendering,
+        after_in_child=_resume_rendering,
+    )
+
+
+def _all_signals():
+    # signal.valid_signals is available since Python 3.8
+    if hasattr(signal, "valid_signals"):
+        return signal.valid_signals()
+    return range(1, signal.NSIG)
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Set on subclass created by `MetricsServer`
+    metrics_server = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        try:
+            body = self.metrics_server.render().encode("utf-8")
+        except Exception:
+            logger.exception("Rendering metrics failed!")
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address or "unix")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_listen(listen: str):
+    """
+    Parses ``metrics.listen`` config value.
+
+    Returns:
+        path of unix socket or ``(host, port)`` tuple
+
+    Raises:
+        ValueError: if it is neither ``unix:PATH`` nor ``[HOST]:PORT``
+    """
+    if listen.startswith(_UNIX_PREFIX):
+        path = listen[len(_UNIX_PREFIX) :]
+        if not path:
+            raise ValueError("Missing unix socket path in {!r}".format(listen))
+        return path
+
+    host, separator, port = listen.rpartition(":")
+    if not separator or not port.isdigit():
+        raise ValueError(
+            "Expected 'unix:PATH' or '[HOST]:PORT', got {!r}".format(listen)
+        )
+    return (host.strip("[]") or "127.0.0.1", int(port))
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server that serves metrics in Prometheus text format from
+    background thread.
+
+    Server thread has all signals blocked, so that signals are still delivered
+    to main thread (and `.Supervisor` can keep waiting for them with
+    `signal.sigwaitinfo`).
+
+    Arguments:
+        listen: ``HOST:PORT`` (``:PORT`` listens on localhost) or ``unix:PATH``
+        render: returns response body, called on each request
+    """
+
+    def __init__(self, listen: str, render: Callable[[], str]):
+        self.listen = listen
+        self.address = parse_listen(listen)
+        self._render = render
+        self._render_lock = threading.Lock()
+        self._handler = type("Handler", (_Handler,), {"metrics_server": self})
+        self._server = None
+        self._thread = None
+        self._pid = None
+
+    @property
+    def is_unix(self) -> bool:
+        return isinstance(self.address, str)
+
+    @property
+    def server_address(self):
+        """Address server is bound to (with actual port if port ``0`` was given)."""
+        return self._server.server_address if self._server else None
+
+    def render(self) -> str:
+        with self._render_lock:
+            return self._render()
+
+    def start(self):
+        if self.is_unix:
+            # Left behind by crashed instance
+            try:
+                os.unlink(self.address)
+            except FileNotFoundError:
+                pass
+            self._server = _UnixServer(self.address, self._handler)
+        else:
+            self._server = _TCPServer(self.address, self._handler)
+        self._pid = os.getpid()
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        # New thread inherits signal mask of thread that started it
+        old_mask = signal.pthread_sigmask(signal.SIG_BLOCK, _all_signals())
+        try:
+            self._thread.start()
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, old_mask)
+        _RUNNING.add(self)
+
+        logger.info("Serving metrics on %s", self.listen)
+
+    def stop(self):
+        """
+        Stops server. In forked child process, it only closes inherited socket.
+        """
+        if self._server is None:
+            return
+        _RUNNING.discard(self)
+
+        if self._thread is not None and self._thread.is_alive():
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+        if self.is_unix and self._pid == os.getpid():
+            try:
+                os.unlink(self.address)
+            except FileNotFoundError:
+                pass
+
+        self._server = None
+        self._thread = None
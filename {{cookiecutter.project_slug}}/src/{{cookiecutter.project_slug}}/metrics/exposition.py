@@ -0,0 +1,127 @@
+import math
+import re
+from typing import Iterable, List
+
+from .registry import Family
+
+#: Content type of Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_INVALID_NAME_CHARACTERS = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def sanitize_name(name: str) -> str:
+    """Replaces characters not allowed in metric names with underscores."""
+    return _INVALID_NAME_CHARACTERS.sub("_", name)
+
+
+def merge_families(families: Iterable[Family]) -> List[Family]:
+    """
+    Merges families of the same metric (ie. collected in different prefork
+    workers) into one, according to their ``merge`` policy. Histograms and
+    counters are always summed.
+    """
+    merged = {}
+    samples = {}
+    for family in families:
+        if family.name not in merged:
+            merged[family.name] = family
+            samples[family.name] = {}
+        by_labels = samples[family.name]
+
+        merge = "sum" if family.type != "gauge" else family.merge
+        for label_values, value in family.samples:
+            label_values = tuple(label_values)
+            previous = by_labels.get(label_values)
+            if previous is None:
+                by_labels[label_values] = value
+            elif family.type == "histogram":
+                counts, total = value
+                previous_counts, previous_total = previous
+                by_labels[label_values] = (
+                    tuple(a + b for a, b in zip(previous_counts, counts)),
+                    previous_total + total,
+                )
+            elif merge == "max":
+                by_labels[label_values] = max(previous, value)
+            elif merge == "min":
+                by_labels[label_values] = min(previous, value)
+            else:
+                by_labels[label_values] = previous + value
+
+    return [
+        family._replace(samples=tuple(samples[name].items()))
+        for name, family in merged.items()
+    ]
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_text(families: Iterable[Family], namespace: str = "") -> str:
+    """
+    Renders families in Prometheus text exposition format.
+
+    Arguments:
+        namespace: prefix of all metric names
+    """
+    prefix = sanitize_name(namespace) + "_" if namespace else ""
+    lines = []
+
+    for family in sorted(families, key=lambda family: family.name):
+        name = prefix + sanitize_name(family.name)
+        lines.append("# HELP {} {}".format(name, family.doc.replace("\n", " ")))
+        lines.append("# TYPE {} {}".format(name, family.type))
+
+        for label_values, value in family.samples:
+            if family.type != "histogram":
+                lines.append(
+                    "{}{} {}".format(
+                        name,
+                        _format_labels(family.label_names, label_values),
+                        _format_value(value),
+                    )
+                )
+                continue
+
+            counts, total = value
+            cumulative = 0
+            bounds = tuple(family.buckets) + (math.inf,)
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        name,
+                        _format_labels(
+                            family.label_names,
+                            label_values,
+                            'le="{}"'.format(_format_value(float(bound))),
+                        ),
+                        cumulative,
+                    )
+                )
+            labels = _format_labels(family.label_names, label_values)
+            lines.append("{}_sum{} {}".format(name, labels, _format_value(total)))
+            lines.append("{}_count{} {}".format(name, labels, cumulative))
+
+    return "\n".join(lines) + "\n"
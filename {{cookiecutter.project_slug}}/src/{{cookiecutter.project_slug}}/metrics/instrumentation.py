@@ -0,0 +1,227 @@
+"""
+Collectors that expose stats application server components already count
+(logging, Redis connection pool, scratch space, artifact cache, tmp dir and
+executor) as metrics, without adding any work to their hot paths.
+"""
+
+import os
+from typing import List
+
+from .. import logging_utilities, settings
+from .registry import Family
+
+_EXECUTOR_JOB_STATES = (
+    "submitted",
+    "rejected",
+    "completed",
+    "failed",
+    "timed_out",
+    "cancelled",
+)
+
+
+def _family(name, type, doc, samples, label_names=(), merge="sum") -> Family:
+    return Family(name, type, doc, tuple(label_names), merge, None, tuple(samples))
+
+
+def _value(name, type, doc, value, merge="sum") -> Family:
+    return _family(name, type, doc, [((), value)], merge=merge)
+
+
+def logging_families() -> List[Family]:
+    """Log records suppressed by filters and state of logging queue."""
+    suppressed = []
+    for handler_name, filters in logging_utilities.suppression_stats().items():
+        for filter_name, stats in filters.items():
+            suppressed.append(((handler_name, filter_name), stats["suppressed"]))
+
+    retv = [
+        _family(
+            "log_records_suppressed_total",
+            "counter",
+            "Log records suppressed by sampling and repeat filters",
+            suppressed,
+            label_names=("handler", "filter"),
+        )
+    ]
+
+    stats = logging_utilities.queue_listener_stats()
+    if stats:
+        retv += [
+            _value(
+                "log_queue_records_total",
+                "counter",
+                "Log records passed to logging queue",
+                stats["enqueued"],
+            ),
+            _value(
+                "log_queue_dropped_total",
+                "counter",
+                "Log records dropped because logging queue was full",
+                stats["dropped"],
+            ),
+            _value(
+                "log_queue_depth",
+                "gauge",
+                "Log records waiting in logging queue",
+                stats["queue_depth"],
+            ),
+        ]
+    return retv
+
+
+def resource_families() -> List[Family]:
+    """
+    Usage of global resources created in current process (see
+    `.settings.resource_stats`) and free space in instance tmp directory.
+    """
+    stats = settings.resource_stats()
+    retv = []
+
+    redis = stats.get("redis")
+    if redis:
+        retv += [
+            _value(
+                "redis_pool_connections",
+                "gauge",
+                "Open Redis connections",
+                redis["connections"],
+            ),
+            _value(
+                "redis_pool_idle_connections",
+                "gauge",
+                "Idle Redis connections",
+                redis["idle_connections"],
+            ),
+            _value(
+                "redis_pool_waits_total",
+                "counter",
+                "Times thread had to wait for free Redis connection",
+                redis["wait_count"],
+            ),
+            _value(
+                "redis_pool_wait_seconds_max",
+                "gauge",
+                "Longest wait for free Redis connection",
+                redis["wait_time_max"],
+                merge="max",
+            ),
+        ]
+
+    scratch = stats.get("scratch")
+    if scratch:
+        retv += [
+            _family(
+                "scratch_bytes",
+                "gauge",
+                "Bytes used (or reserved) by scratch jobs",
+                [
+                    (("disk",), scratch["disk_bytes"]),
+                    (("memory",), scratch["memory_bytes"]),
+                ],
+                label_names=("storage",),
+            ),
+            _value(
+                "scratch_active_jobs",
+                "gauge",
+                "Scratch jobs that are not finished yet",
+                scratch["active_jobs"],
+            ),
+            _value(
+                "scratch_jobs_total",
+                "counter",
+                "Created scratch jobs",
+                scratch["jobs"],
+            ),
+            _value(
+                "scratch_rejected_total",
+                "counter",
+                "Scratch space reservations rejected because quota was exhausted",
+                scratch["rejected"],
+            ),
+            _value(
+                "scratch_evicted_bytes_total",
+                "counter",
+                "Bytes of finished scratch jobs evicted to make room for new ones",
+                scratch["evicted_bytes"],
+            ),
+        ]
+
+    cache = stats.get("cache")
+    if cache:
+        retv += [
+            _family(
+                "artifact_cache_lookups_total",
+                "counter",
+                "Artifact cache lookups",
+                [(("hit",), cache["hits"]), (("miss",), cache["misses"])],
+                label_names=("result",),
+            ),
+            _value(
+                "artifact_cache_stores_total",
+                "counter",
+                "Artifacts stored in cache",
+                cache["stores"],
+            ),
+            _value(
+                "artifact_cache_evicted_bytes_total",
+                "counter",
+                "Bytes of artifacts evicted from cache",
+                cache["evicted_bytes"],
+            ),
+            # Cache (and its size) is shared by all processes, summing would multiply it
+            _value(
+                "artifact_cache_size_bytes",
+                "gauge",
+                "Estimated size of artifact cache",
+                cache["size_bytes"],
+                merge="max",
+            ),
+        ]
+
+    tmp_dir_path = settings.snapshot().instance_tmp_dir_path
+    try:
+        stat = os.statvfs(tmp_dir_path)
+    except OSError:
+        pass
+    else:
+        retv.append(
+            _value(
+                "tmp_dir_free_bytes",
+                "gauge",
+                "Free space on file system of instance tmp directory",
+                stat.f_bavail * stat.f_frsize,
+                merge="max",
+            )
+        )
+
+    return retv
+
+
+def executor_families(executor) -> List[Family]:
+    """Job counters and queue depth of `.JobExecutor`."""
+    stats = executor.stats()
+    labels = (executor.name,)
+    return [
+        _family(
+            "executor_jobs_total",
+            "counter",
+            "Jobs submitted to executor, by what happened to them",
+            [(labels + (state,), stats[state]) for state in _EXECUTOR_JOB_STATES],
+            label_names=("executor", "state"),
+        ),
+        _family(
+            "executor_jobs_running",
+            "gauge",
+            "Jobs being run by executor threads",
+            [(labels, stats["running"])],
+            label_names=("executor",),
+        ),
+        _family(
+            "executor_queue_depth",
+            "gauge",
+            "Jobs waiting for free executor thread",
+            [(labels, stats["queue_depth"])],
+            label_names=("executor",),
+        ),
+    ]
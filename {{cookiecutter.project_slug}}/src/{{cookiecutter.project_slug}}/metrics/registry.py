@@ -0,0 +1,409 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+#: Collected metric with all of its samples. ``samples`` is tuple of
+#: ``(label_values, value)`` pairs. For histograms, ``value`` is
+#: ``(bucket_counts, sum)`` and ``buckets`` are upper bounds of buckets (last
+#: bucket, for values bigger than all bounds, has no bound). ``merge`` says how
+#: samples of the same metric from different processes are merged: ``sum``,
+#: ``max`` or ``min``.
+Family = namedtuple(
+    "Family", ["name", "type", "doc", "label_names", "merge", "buckets", "samples"]
+)
+
+#: Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+MERGE_POLICIES = ("sum", "max", "min")
+
+
+class _ThreadCells:
+    """
+    Per thread storage of fixed number of numbers. Each thread only ever writes
+    into its own cell, so writing doesn't need locks. Cells of finished threads
+    are kept, so their values are not lost.
+    """
+
+    __slots__ = ("size", "local", "cells", "lock")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.local = threading.local()
+        self.cells = []
+        self.lock = threading.Lock()
+
+    def new_cell(self) -> list:
+        cell = [0] * self.size
+        with self.lock:
+            self.cells.append(cell)
+        self.local.cell = cell
+        return cell
+
+    def totals(self) -> list:
+        with self.lock:
+            cells = list(self.cells)
+        return [sum(values) for values in zip(*cells)] if cells else [0] * self.size
+
+    def reset(self):
+        # Lock is replaced too, it could had been held by another thread when
+        # process was forked
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cells = []
+
+
+class CounterChild:
+    """Single counter of `Counter` (one combination of label values)."""
+
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+
+    def inc(self, amount: float = 1):
+        try:
+            cell = self._cells.local.cell
+        except AttributeError:
+            cell = self._cells.new_cell()
+        cell[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+    def _reset(self):
+        self._cells.reset()
+
+
+class GaugeChild:
+    """
+    Single gauge of `Gauge`.
+
+    `.inc` and `.dec` are aggregated per thread like counters. `.set` should not
+    be mixed with them from other threads.
+    """
+
+    __slots__ = ("_cells", "_value", "_function")
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+        self._value = 0
+        self._function = None
+
+    def set(self, value: float):
+        self._value = value - self._cells.totals()[0]
+
+    def set_function(self, function: Callable[[], float]):
+        """Gauge value will be computed by calling ``function`` on collection."""
+        self._function = function
+
+    def inc(self, amount: float = 1):
+        try:
+            cell = self._cells.local.cell
+        except AttributeError:
+            cell = self._cells.new_cell()
+        cell[0] += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._value + self._cells.totals()[0]
+
+    def _reset(self):
+        self._cells.reset()
+        self._value = 0
+
+
+class HistogramChild:
+    """Single histogram of `Histogram`."""
+
+    __slots__ = ("_cells", "_buckets")
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        # Bucket counts, including the one for values bigger than all bounds,
+        # and sum of observed values
+        self._cells = _ThreadCells(len(buckets) + 2)
+
+    def observe(self, value: float):
+        try:
+            cell = self._cells.local.cell
+        except AttributeError:
+            cell = self._cells.new_cell()
+        cell[bisect_left(self._buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self):
+        """Observes duration of ``with`` block, in seconds."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at)
+
+    @property
+    def value(self) -> tuple:
+        """``(bucket_counts, sum)``"""
+        totals = self._cells.totals()
+        return tuple(totals[:-1]), totals[-1]
+
+    def _reset(self):
+        self._cells.reset()
+
+
+class _Metric:
+    TYPE = None
+    CHILD_CLASS = None
+
+    def __init__(
+        self, name: str, doc: str, labels: Sequence[str] = (), merge: str = "sum"
+    ):
+        if merge not in MERGE_POLICIES:
+            raise ValueError(
+                "Unknown merge policy {!r}, expected one of {}".format(
+                    merge, MERGE_POLICIES
+                )
+            )
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.merge = merge
+        self._children = {}
+        # Children by label values exactly as they were given, so that lookup
+        # on hot path doesn't have to convert them to strings
+        self._lookup = {}
+        self._lock = threading.Lock()
+        #: Child for metric without labels
+        self._child = None if self.label_names else self.labels()
+
+    def labels(self, *values):
+        """Child metric for given label values (in order of label names)."""
+        try:
+            return self._lookup[values]
+        except (KeyError, TypeError):
+            pass
+
+        if len(values) != len(self.label_names):
+            raise ValueError(
+                "Metric {} has labels {}, got values {}".format(
+                    self.name, self.label_names, values
+                )
+            )
+        label_values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(label_values)
+            if child is None:
+                child = self._children[label_values] = self._new_child()
+            try:
+                self._lookup[values] = child
+            except TypeError:
+                # Unhashable values
+                pass
+        return child
+
+    def collect(self) -> Family:
+        with self._lock:
+            children = list(self._children.items())
+        return Family(
+            self.name,
+            self.TYPE,
+            self.doc,
+            self.label_names,
+            self.merge,
+            self._buckets(),
+            tuple((values, child.value) for values, child in children),
+        )
+
+    def reset(self):
+        """Zeroes all values, ie. in newly forked process."""
+        self._lock = threading.Lock()
+        for child in list(self._children.values()):
+            child._reset()
+
+    def _new_child(self):
+        return self.CHILD_CLASS()
+
+    def _buckets(self):
+        return None
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value. Increments are aggregated per thread, so
+    they take no locks.
+
+    .. code-block:: python
+
+        JOBS = metrics.counter("jobs_total", "Processed jobs", labels=["result"])
+        JOBS.labels("ok").inc()
+    """
+
+    TYPE = "counter"
+    CHILD_CLASS = CounterChild
+
+    def inc(self, amount: float = 1):
+        self._child.inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (see `GaugeChild`)."""
+
+    TYPE = "gauge"
+    CHILD_CLASS = GaugeChild
+
+    def set(self, value: float):
+        self._child.set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._child.set_function(function)
+
+    def inc(self, amount: float = 1):
+        self._child.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._child.dec(amount)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in fixed buckets. Each thread counts
+    observations in its own array of bucket counters, so observing takes no
+    locks.
+
+    Arguments:
+        buckets: sorted upper bounds of buckets
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labels)
+
+    def observe(self, value: float):
+        self._child.observe(value)
+
+    def time(self):
+        return self._child.time()
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def _buckets(self):
+        return self.buckets
+
+
+class Registry:
+    """
+    Collection of metrics of one process.
+
+    Besides metrics created through it, it collects metrics from registered
+    collectors: callables returning iterables of `Family`, called on each
+    collection. They are the cheapest way to expose values that are already
+    counted elsewhere (ie. stats of `.JobExecutor`).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+        """Returns counter ``name``, creating it if it doesn't exist."""
+        return self._get_or_create(Counter, name, doc, labels=labels)
+
+    def gauge(
+        self, name: str, doc: str, labels: Sequence[str] = (), merge: str = "sum"
+    ) -> Gauge:
+        """
+        Returns gauge ``name``, creating it if it doesn't exist.
+
+        Arguments:
+            merge: how values from prefork workers are merged, see `Family`
+        """
+        return self._get_or_create(Gauge, name, doc, labels=labels, merge=merge)
+
+    def histogram(
+        self,
+        name: str,
+        doc: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Returns histogram ``name``, creating it if it doesn't exist."""
+        return self._get_or_create(Histogram, name, doc, labels=labels, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Registers collector. Can be used as decorator."""
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def collect(self) -> List[Family]:
+        """Current values of all metrics."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        retv = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            try:
+                retv.extend(collector())
+            except Exception:
+                logger.exception("Metrics collector %r failed!", collector)
+        return retv
+
+    def reset(self):
+        """
+        Zeroes values of all metrics. Called in prefork workers right after
+        fork, so they don't report values inherited from supervisor. Must not
+        be called concurrently with other methods.
+        """
+        self._lock = threading.Lock()
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def _get_or_create(self, cls, name, doc, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, doc, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    "Metric {} is already registered as {}".format(name, metric.TYPE)
+                )
+            return metric
@@ -0,0 +1,126 @@
+import logging
+import marshal
+import mmap
+import struct
+import time
+from typing import List
+
+from .exposition import merge_families
+from .registry import Family
+
+logger = logging.getLogger(__name__)
+
+# Sequence number (odd while slot is being written) and data length
+_HEADER = struct.Struct("<QI")
+_READ_ATTEMPTS = 10
+# Seconds to wait for worker to finish writing its slot before next attempt
+_READ_RETRY_DELAY = 0.0005
+
+
+class SharedMetrics:
+    """
+    Anonymous shared memory through which prefork workers publish their metrics
+    to supervisor.
+
+    It must be created in supervisor before workers are forked. Each worker owns
+    one fixed size slot and periodically overwrites it with its collected
+    metrics (`.publish`). Supervisor reads all slots when metrics are scraped
+    (`.collect`). Slots are guarded by sequence numbers (seqlock), so worker
+    never waits for supervisor. If slot can't be read consistently (ie. worker
+    was killed while writing it), its last consistent contents are used, so
+    counters never appear to go back to zero.
+
+    When worker exits, supervisor should `.retire` its slot, so that its
+    counters and histograms are kept and don't go backwards once respawned
+    worker starts publishing from zero.
+
+    Arguments:
+        slots_count: number of workers
+        slot_size: bytes available to each worker
+    """
+
+    def __init__(self, slots_count: int, slot_size: int = 1024 * 1024):
+        self.slots_count = slots_count
+        self.slot_size = slot_size
+        self._buffer = mmap.mmap(-1, slots_count * slot_size)
+        self._too_big_logged = False
+        self._retired = []
+        # Last consistently read families of each slot, read by supervisor
+        self._last_read = {}
+
+    def publish(self, slot: int, families: List[Family]) -> bool:
+        """
+        Writes ``families`` into ``slot``.
+
+        Returns:
+            ``False`` if they didn't fit into slot
+        """
+        data = marshal.dumps([tuple(family) for family in families])
+        if _HEADER.size + len(data) > self.slot_size:
+            if not self._too_big_logged:
+                logger.warning(
+                    "Metrics of worker %d don't fit into %d bytes of shared "
+                    "memory (%d bytes), increase metrics.slot_size",
+                    slot,
+                    self.slot_size,
+                    len(data),
+                )
+                self._too_big_logged = True
+            return False
+
+        offset = slot * self.slot_size
+        sequence, _ = _HEADER.unpack_from(self._buffer, offset)
+        _HEADER.pack_into(self._buffer, offset, sequence + 1, len(data))
+        start = offset + _HEADER.size
+        self._buffer[start : start + len(data)] = data
+        _HEADER.pack_into(self._buffer, offset, sequence + 2, len(data))
+        return True
+
+    def read(self, slot: int) -> List[Family]:
+        """
+        Families last published into ``slot``. If slot is being written for
+        too long, families read from it last time.
+        """
+        offset = slot * self.slot_size
+        for attempt in range(_READ_ATTEMPTS):
+            if attempt:
+                time.sleep(_READ_RETRY_DELAY)
+
+            sequence, length = _HEADER.unpack_from(self._buffer, offset)
+            if sequence == 0:
+                self._last_read.pop(slot, None)
+                return []
+            if sequence % 2:
+                continue
+
+            start = offset + _HEADER.size
+            data = self._buffer[start : start + length]
+            if _HEADER.unpack_from(self._buffer, offset)[0] == sequence:
+                families = [Family(*family) for family in marshal.loads(data)]
+                self._last_read[slot] = families
+                return families
+
+        return self._last_read.get(slot, [])
+
+    def collect(self) -> List[Family]:
+        """Families published by all workers, including retired ones."""
+        retv = list(self._retired)
+        for slot in range(self.slots_count):
+            retv.extend(self.read(slot))
+        return retv
+
+    def retire(self, slot: int):
+        """
+        Keeps counters and histograms last published into ``slot`` (by worker
+        that exited) and clears it.
+        """
+        self._retired = merge_families(
+            self._retired
+            + [family for family in self.read(slot) if family.type != "gauge"]
+        )
+        self.clear(slot)
+
+    def clear(self, slot: int):
+        """Forgets metrics of ``slot``."""
+        _HEADER.pack_into(self._buffer, slot * self.slot_size, 0, 0)
+        self._last_read.pop(slot, None)
@@ -0,0 +1,117 @@
+"""
+Copy-on-write friendly preloading of application before worker processes are
+forked.
+"""
+
+import gc
+import importlib
+import logging
+import pkgutil
+import random
+
+from . import logging_utilities, metrics
+from .settings import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+#: Subpackages that are not part of application server runtime and are never
+#: preloaded.
+_SKIPPED_SUBPACKAGES = ("scripts",)
+
+_AFTER_FORK_HOOKS = []
+
+
+def after_fork(callback):
+    """
+    Registers ``callback`` to be called inside of each worker process right after
+    it was forked. Can be used as decorator.
+
+    Use it to re-create resources that must not be shared between processes
+    (sockets, connection pools, locks, ...).
+    """
+    _AFTER_FORK_HOOKS.append(callback)
+    return callback
+
+
+def run_after_fork_hooks():
+    """Calls all registered `.after_fork` hooks, in order of registration."""
+    for callback in _AFTER_FORK_HOOKS:
+        callback()
+
+
+def preload(warm_up=None):
+    """
+    Prepares supervisor process for forking.
+
+    1. imports all application modules
+    2. resolves `.SETTINGS` and logging config
+    3. calls ``warm_up`` callable, if one is given
+    4. collects garbage and moves all surviving objects into permanent
+       generation (`gc.freeze`)
+
+    Objects in permanent generation are ignored by garbage collector, so
+    collections in forked workers don't touch memory pages they share with
+    supervisor and those pages stay shared for as long as workers don't modify
+    objects in them.
+    """
+    _import_application_modules()
+
+    if SETTINGS:
+        SETTINGS.logging_json
+        SETTINGS.instance_name
+        SETTINGS.instance_tmp_dir_path
+
+    if warm_up:
+        warm_up()
+
+    gc.collect()
+    gc.freeze()
+
+    logger.debug("Preloaded %d objects before forking", gc.get_freeze_count())
+
+
+def _import_application_modules():
+    package = importlib.import_module(__package__)
+
+    for module_info in pkgutil.walk_packages(
+        package.__path__, prefix=__package__ + ".", onerror=lambda name: None
+    ):
+        relative_name = module_info.name[len(__package__) + 1 :]
+        if relative_name.split(".")[0] in _SKIPPED_SUBPACKAGES:
+            continue
+
+        try:
+            importlib.import_module(module_info.name)
+        except ImportError as exception:
+            # Module depends on something optional that is not installed
+            logger.debug("Not preloading %s: %s", module_info.name, exception)
+
+
+@after_fork
+def _reinit_logging_locks():
+    for handler_ref in list(logging._handlerList):
+        handler = handler_ref()
+        if handler is not None:
+            handler.createLock()
+
+
+@after_fork
+def _restart_logging_queue():
+    logging_utilities.restart_queue_listener()
+
+
+@after_fork
+def _restart_log_files_watcher():
+    logging_utilities.restart_log_files_watcher()
+    logging_utilities.restart_log_compressor()
+
+
+@after_fork
+def _reset_metrics():
+    # Supervisor's values would be reported by each worker again
+    metrics.REGISTRY.reset()
+
+
+@after_fork
+def _reseed_random():
+    random.seed()
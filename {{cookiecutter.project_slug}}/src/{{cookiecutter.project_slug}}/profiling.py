@@ -0,0 +1,240 @@
+"""
+On-demand diagnostics of running application server: statistical sampling
+profiler and thread stacks dump.
+"""
+
+import collections
+import faulthandler
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _format_code(code) -> str:
+    return "{} ({}:{})".format(
+        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+    )
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that periodically samples stacks of all threads of
+    process (`sys._current_frames`) from background thread.
+
+    It doesn't hook into function calls like `cProfile` does, so profiled code
+    runs at full speed. Its cost is one stack walk of each thread per
+    ``interval``, done while holding GIL, which is usually well below 1% of
+    CPU time at default 10 ms interval (it is logged when profile is written).
+    That makes it safe to turn on in production, under live traffic. When
+    threads compete for GIL, samples are taken less often than ``interval``.
+
+    When stopped (or after ``max_duration``), it writes counted stacks in
+    collapsed stack format (``thread;outer (file:line);inner (file:line) count``
+    per line) into ``output_path``, ready for ``flamegraph.pl`` or
+    https://speedscope.app.
+
+    .. code-block:: python
+
+        profiler = SamplingProfiler("/tmp")
+        profiler.start()
+        ...
+        profiler.stop(wait=True)
+        print(profiler.output_file_path)
+
+    Arguments:
+        output_path: directory profiles are written into
+        interval: seconds between two samples
+        max_duration: seconds after which profiler stops by itself, ``0``
+            disables it
+        max_depth: innermost frames kept from each stack
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        interval: float = 0.01,
+        max_duration: float = 600,
+        max_depth: int = 100,
+    ):
+        self.output_path = output_path
+        self.interval = interval
+        self.max_duration = max_duration
+        self.max_depth = max_depth
+
+        #: Path of last written profile
+        self.output_file_path = None
+        #: Number of samples taken by last run
+        self.samples_count = 0
+        #: Seconds spent taking samples in last run
+        self.sampling_seconds = 0.0
+        self._stacks = collections.Counter()
+        self._thread_names = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, output_path: str) -> "SamplingProfiler":
+        """
+        Creates profiler from ``profiler`` section of typed app config.
+
+        Arguments:
+            output_path: used if ``profiler.output_path`` is not configured
+        """
+        return cls(
+            config.output_path or output_path,
+            interval=config.interval,
+            max_duration=config.max_duration,
+            max_depth=config.max_depth,
+        )
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+
+        self._stacks = collections.Counter()
+        self._thread_names = {}
+        self.samples_count = 0
+        self.sampling_seconds = 0.0
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        logger.info("Started sampling profiler (every %.1f ms)", self.interval * 1000)
+
+    def stop(self, wait: bool = False):
+        """
+        Stops sampling. Profile is written by profiler thread.
+
+        Arguments:
+            wait: wait for profile to be written
+        """
+        self._stopping.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def toggle(self) -> bool:
+        """
+        Starts profiler if it is stopped and stops it otherwise.
+
+        Returns:
+            if profiler was started
+        """
+        if self.is_running:
+            self.stop()
+            return False
+        self.start()
+        return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        started_at = time.monotonic()
+        deadline = started_at + self.max_duration if self.max_duration else None
+        while not self._stopping.wait(self.interval):
+            sample_started_at = time.perf_counter()
+            self._sample(own_id)
+            self.sampling_seconds += time.perf_counter() - sample_started_at
+            self.samples_count += 1
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+        duration = time.monotonic() - started_at
+        try:
+            self.output_file_path = self._write()
+        except OSError:
+            logger.exception("Writing profile into %s failed!", self.output_path)
+            return
+
+        logger.info(
+            "Sampling profiler wrote %d samples taken over %.1f s into %s "
+            "(sampling took %.2f%% of that time)",
+            self.samples_count,
+            duration,
+            self.output_file_path,
+            self.sampling_seconds / duration * 100 if duration else 0.0,
+        )
+
+    def _sample(self, own_id: int):
+        max_depth = self.max_depth
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+
+            # Code objects (not strings) are counted, formatting is done once,
+            # when profile is written
+            stack = []
+            while frame is not None and len(stack) < max_depth:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            self._stacks[(thread_id, tuple(stack))] += 1
+
+            if thread_id not in self._thread_names:
+                for thread in threading.enumerate():
+                    self._thread_names[thread.ident] = thread.name
+                # Threads not started by threading module have no name
+                self._thread_names.setdefault(thread_id, "thread-{}".format(thread_id))
+
+    def _write(self) -> str:
+        path = os.path.join(
+            self.output_path,
+            "profile.{}.{}.collapsed".format(
+                os.getpid(), time.strftime("%Y%m%d-%H%M%S")
+            ),
+        )
+        os.makedirs(self.output_path, exist_ok=True)
+
+        formatted = {}
+        with open(path, "w") as f:
+            for (thread_id, stack), count in self._stacks.most_common():
+                frames = [self._thread_names[thread_id]]
+                for code in reversed(stack):
+                    name = formatted.get(code)
+                    if name is None:
+                        name = formatted[code] = _format_code(code)
+                    frames.append(name)
+                f.write("{} {}\n".format(";".join(frames), count))
+
+        return path
+
+
+class StackDumper:
+    """
+    Dumps stacks of all threads into file when ``signum`` arrives, using
+    `faulthandler`. Dump is written by C signal handler, so it works even when
+    all Python threads are stuck (ie. deadlocked or in long running C call).
+
+    Arguments:
+        signum: signal that triggers dump
+        path: file dumps are appended to
+    """
+
+    def __init__(self, signum: int, path: str):
+        self.signum = signum
+        self.path = path
+        self._file = None
+
+    def install(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a")
+        faulthandler.register(self.signum, file=self._file, all_threads=True)
+
+    def uninstall(self):
+        if self._file is None:
+            return
+        faulthandler.unregister(self.signum)
+        self._file.close()
+        self._file = None
+
+
+def stack_dump_path(output_path: str) -> str:
+    """Path of `StackDumper` file of current process in ``output_path``."""
+    return os.path.join(output_path, "stacks.{}.txt".format(os.getpid()))
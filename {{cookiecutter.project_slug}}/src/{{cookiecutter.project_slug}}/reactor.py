@@ -0,0 +1,136 @@
+"""
+Event driven main loop of application server.
+"""
+
+import asyncio
+import logging
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+
+class Reactor:
+    """
+    Thin wrapper around `asyncio` event loop that drives application server.
+
+    Loop sleeps in ``epoll_wait`` for as long as there is nothing to do, so idle
+    server causes no wakeups at all. New work (coroutines, callbacks from other
+    threads, readable file descriptors, signals) is dispatched as soon as loop
+    is woken up by kernel.
+
+    If `uvloop` is installed, it is used instead of default `asyncio` loop
+    implementation.
+
+    Signals are delivered through `asyncio.AbstractEventLoop.add_signal_handler`
+    which uses `signal.set_wakeup_fd` under the hood. This means signal handlers
+    run inside of loop, as regular callbacks, and never interrupt code running
+    in it.
+    """
+
+    def __init__(self):
+        self.loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        self._tasks = set()
+        self._signals = set()
+
+    @property
+    def is_running(self) -> bool:
+        return self.loop.is_running()
+
+    def spawn(self, coro) -> asyncio.Task:
+        """
+        Schedules coroutine to be run by loop.
+
+        Spawned tasks are tracked and cancelled when reactor is closed.
+        """
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def call_soon(self, callback, *args) -> asyncio.Handle:
+        """
+        Schedules ``callback(*args)`` to be called on next loop iteration.
+
+        Safe to be called from any thread.
+        """
+        return self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay: float, callback, *args) -> asyncio.TimerHandle:
+        """Schedules ``callback(*args)`` to be called after ``delay`` seconds."""
+        return self.loop.call_later(delay, callback, *args)
+
+    def add_reader(self, fd, callback, *args):
+        """Starts watching ``fd`` and calls ``callback(*args)`` when readable."""
+        self.loop.add_reader(fd, callback, *args)
+
+    def remove_reader(self, fd) -> bool:
+        return self.loop.remove_reader(fd)
+
+    def add_writer(self, fd, callback, *args):
+        """Starts watching ``fd`` and calls ``callback(*args)`` when writable."""
+        self.loop.add_writer(fd, callback, *args)
+
+    def remove_writer(self, fd) -> bool:
+        return self.loop.remove_writer(fd)
+
+    def add_signal_handler(self, signum: int, callback, *args):
+        """Calls ``callback(*args)`` from within loop when ``signum`` arrives."""
+        self.loop.add_signal_handler(signum, callback, *args)
+        self._signals.add(signum)
+
+    def remove_signal_handler(self, signum: int) -> bool:
+        self._signals.discard(signum)
+        return self.loop.remove_signal_handler(signum)
+
+    def run_forever(self):
+        """Runs loop until `.stop` is called."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run_until_complete(self, future):
+        asyncio.set_event_loop(self.loop)
+        return self.loop.run_until_complete(future)
+
+    def stop(self):
+        """
+        Stops loop after it finishes current iteration.
+
+        Safe to be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def cancel_tasks(self):
+        """Cancels all spawned tasks and waits for them to finish."""
+        tasks = [task for task in self._tasks if not task.done()]
+        if not tasks:
+            return
+
+        for task in tasks:
+            task.cancel()
+
+        self.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+    def close(self):
+        """Cancels pending tasks, removes signal handlers and closes loop."""
+        if self.loop.is_closed():
+            return
+
+        self.cancel_tasks()
+
+        for signum in list(self._signals):
+            self.remove_signal_handler(signum)
+
+        self.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+
+    def _on_task_done(self, task):
+        self._tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Unhandled exception in reactor task %r", task, exc_info=task.exception()
+            )
@@ -0,0 +1,48 @@
+"""
+Access to resources bundled with package (default config files).
+
+Resources are read through `importlib.resources`, so they are available even
+when package is imported from zipapp or wheel, without extracting them.
+"""
+
+import os
+from typing import Optional
+
+#: Directory of bundled resources. When package is imported from zip archive,
+#: this is not real directory, but paths in it are still accepted by
+#: `read_resource`.
+RESOURCES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def resource_path(name: str) -> str:
+    """Path of bundled resource."""
+    return os.path.join(RESOURCES_DIR, name)
+
+
+def bundled_resource_name(path: str) -> Optional[str]:
+    """
+    Returns:
+        name of bundled resource if ``path`` was returned by `resource_path`,
+        otherwise ``None``
+    """
+    directory, name = os.path.split(path)
+    return name if directory == RESOURCES_DIR and name else None
+
+
+def read_resource(name: str) -> bytes:
+    """
+    Reads bundled resource.
+
+    Arguments:
+        name: resource name or path returned by `resource_path`
+    """
+    # Imported here, because regular startup reads config files from disk and
+    # doesn't need it
+    import importlib.resources
+
+    name = bundled_resource_name(name) or name
+
+    files = getattr(importlib.resources, "files", None)
+    if files is not None:
+        return files(__name__).joinpath(name).read_bytes()
+    return importlib.resources.read_binary(__name__, name)
@@ -0,0 +1,485 @@
+"""
+Managed scratch space for files that jobs download and produce.
+"""
+
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from seveno_pyutil import silent_create_dirs
+
+logger = logging.getLogger(__name__)
+
+#: Name of file that running instance holds lock on, in its tmp directory
+LOCK_FILE_NAME = ".lock"
+
+
+class ScratchQuotaError(RuntimeError):
+    """Raised when space can't be reserved, even after evicting finished jobs."""
+
+    pass
+
+
+def _free_bytes(path: str) -> int:
+    stat = os.statvfs(path)
+    return stat.f_bavail * stat.f_frsize
+
+
+def _dir_size(path: str) -> int:
+    retv = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    retv += _dir_size(entry.path)
+                else:
+                    retv += entry.stat(follow_symlinks=False).st_size
+    except FileNotFoundError:
+        pass
+    return retv
+
+
+def lock_dir(path: str) -> Optional[int]:
+    """
+    Creates ``path`` and locks `LOCK_FILE_NAME` in it, marking directory as
+    being used by running process. Lock is held until returned file descriptor
+    is closed by this process and all processes forked from it.
+
+    Returns:
+        locked file descriptor or ``None`` if directory is already locked
+    """
+    silent_create_dirs(path)
+    fd = os.open(
+        os.path.join(path, LOCK_FILE_NAME),
+        os.O_RDWR | os.O_CREAT | os.O_CLOEXEC,
+        0o600,
+    )
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def remove_abandoned_dirs(
+    instances_dir: str, current_name: str, stale_after: float, locks_dir: str = None
+) -> List[str]:
+    """
+    Removes subdirectories of ``instances_dir`` left behind by app instances that
+    are no longer running (ie. crashed).
+
+    Instance is considered running for as long as it holds lock (see `lock_dir`)
+    in its directory in ``locks_dir``. Directories that were never locked are
+    removed once they are older than ``stale_after`` seconds.
+
+    Arguments:
+        instances_dir: directory with one subdirectory per app instance
+        current_name: name of current instance's subdirectory, never removed
+        stale_after: seconds
+        locks_dir: directory with locked instance directories, defaults to
+            ``instances_dir``
+
+    Returns:
+        removed paths
+    """
+    locks_dir = locks_dir or instances_dir
+    now = time.time()
+    removed = []
+
+    try:
+        names = os.listdir(instances_dir)
+    except FileNotFoundError:
+        return removed
+
+    for name in names:
+        path = os.path.join(instances_dir, name)
+        if name == current_name or not os.path.isdir(path):
+            continue
+
+        try:
+            fd = os.open(
+                os.path.join(locks_dir, name, LOCK_FILE_NAME),
+                os.O_RDWR | os.O_CLOEXEC,
+            )
+        except FileNotFoundError:
+            fd = None
+
+        try:
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+            else:
+                try:
+                    if now - os.stat(path).st_mtime < stale_after:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    if removed:
+        logger.info("Removed abandoned tmp directories: %s", ", ".join(removed))
+
+    return removed
+
+
+class ScratchJob:
+    """
+    Scratch directories of single job, created by `ScratchSpace.job`.
+
+    Files should be created through `.file_path`, which reserves space for
+    them. When job finishes, its files are kept until space is needed for other
+    jobs. Starting job with the same ID again gets them back:
+
+    .. code-block:: python
+
+        with scratch.job(url_digest) as job:
+            path = job.file_path("source.bin", size=content_length)
+            if not os.path.exists(path):
+                download(url, path)
+            process(path)
+
+    Leaving ``with`` block because of exception discards job's files.
+    """
+
+    def __init__(self, space: "ScratchSpace", job_id: str):
+        self.space = space
+        self.id = job_id
+        #: Directory on disk
+        self.path = os.path.join(space.root_path, "jobs", job_id)
+        #: Directory in tmpfs, ``None`` if space has no tmpfs
+        self.memory_path = (
+            os.path.join(space.tmpfs_root_path, "jobs", job_id)
+            if space.tmpfs_root_path
+            else None
+        )
+        self.disk_bytes = 0
+        self.memory_bytes = 0
+        self.is_finished = False
+        silent_create_dirs(self.path)
+
+    def file_path(self, name: str, size: int = None) -> str:
+        """
+        Path for file ``name``.
+
+        Arguments:
+            size: expected file size. If given and file doesn't exist yet, space
+                for it is reserved and small files are placed in tmpfs (if space
+                has it).
+
+        Raises:
+            ScratchQuotaError: if there is not enough space
+        """
+        disk_file_path = os.path.join(self.path, name)
+        memory_file_path = (
+            os.path.join(self.memory_path, name) if self.memory_path else None
+        )
+
+        # File from previous run of the same job
+        if os.path.exists(disk_file_path):
+            return disk_file_path
+        if memory_file_path and os.path.exists(memory_file_path):
+            return memory_file_path
+
+        if size is not None and self.space.reserve(self, size, prefer_memory=True):
+            silent_create_dirs(self.memory_path)
+            return memory_file_path
+
+        return disk_file_path
+
+    def reserve(self, nbytes: int):
+        """
+        Reserves ``nbytes`` of disk space for this job.
+
+        Raises:
+            ScratchQuotaError: if there is not enough space
+        """
+        self.space.reserve(self, nbytes)
+
+    def finish(self):
+        """Keeps job's files, to be reused or evicted later."""
+        self.space.finish(self)
+
+    def discard(self):
+        """Removes job's files."""
+        self.space.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.discard()
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, self.id)
+
+
+class ScratchSpace:
+    """
+    Scratch space of app instance, with per job subdirectories (see
+    `ScratchJob`) and byte quota.
+
+    Space is reserved before files are written. If reservation would exceed
+    ``quota_bytes`` or leave less than ``min_free_bytes`` on file system
+    (checked with ``statvfs``), files of finished jobs are evicted, least
+    recently used first. If that is not enough, `ScratchQuotaError` is raised.
+    When job finishes, its reservation is replaced with actual size of its
+    files.
+
+    Files not bigger than ``tmpfs_max_file_size`` are placed in
+    ``tmpfs_root_path`` (ie. in ``/dev/shm``), which has its own quota, as long
+    as there is space for them there. If there isn't, they go to disk, and
+    finished jobs are evicted to make room in tmpfs only if disk is full too.
+    Only jobs that have files in storage that needs room are evicted.
+
+    Safe to be used from `.JobExecutor` threads.
+
+    Arguments:
+        root_path: directory on disk
+        quota_bytes: max bytes used on disk, ``0`` disables limit
+        min_free_bytes: min free bytes to leave on disk file system
+        tmpfs_root_path: directory in tmpfs, ``None`` disables tmpfs
+        tmpfs_quota_bytes: max bytes used in tmpfs
+        tmpfs_max_file_size: max size of file placed in tmpfs
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        quota_bytes: int = 0,
+        min_free_bytes: int = 0,
+        tmpfs_root_path: str = None,
+        tmpfs_quota_bytes: int = 64 * 1024 * 1024,
+        tmpfs_max_file_size: int = 1024 * 1024,
+    ):
+        self.root_path = root_path
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.tmpfs_root_path = tmpfs_root_path or None
+        self.tmpfs_quota_bytes = tmpfs_quota_bytes
+        self.tmpfs_max_file_size = tmpfs_max_file_size
+
+        self._lock = threading.Lock()
+        self._active = {}
+        # Finished jobs, least recently used first
+        self._finished = OrderedDict()
+        self._disk_bytes = 0
+        self._memory_bytes = 0
+        self._counters = {
+            "jobs": 0,
+            "reused": 0,
+            "evicted": 0,
+            "evicted_bytes": 0,
+            "rejected": 0,
+        }
+
+        silent_create_dirs(root_path)
+
+    @classmethod
+    def from_config(
+        cls, config, root_path: str, tmpfs_root_path: str = None
+    ) -> "ScratchSpace":
+        """
+        Creates scratch space from typed ``scratch`` section of app config.
+        """
+        return cls(
+            root_path,
+            quota_bytes=config.quota_bytes,
+            min_free_bytes=config.min_free_bytes,
+            tmpfs_root_path=tmpfs_root_path,
+            tmpfs_quota_bytes=config.tmpfs_quota_bytes,
+            tmpfs_max_file_size=config.tmpfs_max_file_size,
+        )
+
+    def job(self, job_id: str = None) -> ScratchJob:
+        """
+        Starts job, or restarts finished one with the same ID, keeping its
+        files.
+
+        Arguments:
+            job_id: defaults to random one, must be valid file name
+        """
+        job_id = job_id or uuid.uuid4().hex
+        if os.sep in job_id or job_id in (".", ".."):
+            raise ValueError("Invalid job ID {!r}".format(job_id))
+
+        with self._lock:
+            if job_id in self._active:
+                raise ValueError("Job {!r} is already running!".format(job_id))
+
+            job = self._finished.pop(job_id, None)
+            if job is not None:
+                job.is_finished = False
+                self._counters["reused"] += 1
+            else:
+                job = ScratchJob(self, job_id)
+                self._counters["jobs"] += 1
+
+            self._active[job_id] = job
+            return job
+
+    def reserve(self, job: ScratchJob, nbytes: int, prefer_memory: bool = False):
+        """
+        Reserves ``nbytes`` for ``job``, evicting finished jobs if needed.
+
+        Arguments:
+            prefer_memory: reserve in tmpfs if file is small enough and tmpfs
+                has space for it
+
+        Returns:
+            ``True`` if space was reserved in tmpfs
+
+        Raises:
+            ScratchQuotaError: if there is not enough space on disk
+        """
+        with self._lock:
+            use_memory = (
+                prefer_memory
+                and self.tmpfs_root_path
+                and nbytes <= self.tmpfs_max_file_size
+            )
+            # Nothing is evicted just to get file into tmpfs, disk is used
+            # first if it has room
+            if use_memory and (
+                self._fits(nbytes, in_memory=True)
+                or (
+                    not self._fits(nbytes, in_memory=False)
+                    and self._make_room(nbytes, in_memory=True)
+                )
+            ):
+                self._memory_bytes += nbytes
+                job.memory_bytes += nbytes
+                return True
+
+            if not self._make_room(nbytes, in_memory=False):
+                self._counters["rejected"] += 1
+                raise ScratchQuotaError(
+                    "Can't reserve {} bytes in {} (used {} of {} bytes)!".format(
+                        nbytes, self.root_path, self._disk_bytes, self.quota_bytes
+                    )
+                )
+
+            self._disk_bytes += nbytes
+            job.disk_bytes += nbytes
+            return False
+
+    def finish(self, job: ScratchJob):
+        """Marks ``job`` finished, replacing its reservations with actual sizes."""
+        disk_bytes = _dir_size(job.path)
+        memory_bytes = _dir_size(job.memory_path) if job.memory_path else 0
+
+        with self._lock:
+            if self._active.pop(job.id, None) is None:
+                return
+            self._disk_bytes += disk_bytes - job.disk_bytes
+            self._memory_bytes += memory_bytes - job.memory_bytes
+            job.disk_bytes, job.memory_bytes = disk_bytes, memory_bytes
+            job.is_finished = True
+            self._finished[job.id] = job
+
+    def discard(self, job: ScratchJob):
+        """Removes ``job`` and its files."""
+        with self._lock:
+            if (
+                self._active.pop(job.id, None) is None
+                and self._finished.pop(job.id, None) is None
+            ):
+                return
+            self._forget(job)
+        self._remove_files(job)
+
+    def evict(self, nbytes: int = None) -> int:
+        """
+        Removes files of finished jobs, least recently used first.
+
+        Arguments:
+            nbytes: stop after at least this many bytes were freed, evict all if
+                ``None``
+
+        Returns:
+            freed bytes
+        """
+        with self._lock:
+            freed = 0
+            while self._finished and (nbytes is None or freed < nbytes):
+                freed += self._evict_one()
+            return freed
+
+    def stats(self) -> dict:
+        """Space usage, job counts and eviction counters."""
+        with self._lock:
+            return dict(
+                self._counters,
+                active_jobs=len(self._active),
+                finished_jobs=len(self._finished),
+                disk_bytes=self._disk_bytes,
+                memory_bytes=self._memory_bytes,
+                quota_bytes=self.quota_bytes,
+                tmpfs_quota_bytes=self.tmpfs_quota_bytes if self.tmpfs_root_path else 0,
+            )
+
+    def _make_room(self, nbytes: int, in_memory: bool) -> bool:
+        while not self._fits(nbytes, in_memory):
+            if not self._evict_one(in_memory):
+                return False
+        return True
+
+    def _fits(self, nbytes: int, in_memory: bool) -> bool:
+        if in_memory:
+            if self._memory_bytes + nbytes > self.tmpfs_quota_bytes:
+                return False
+            silent_create_dirs(self.tmpfs_root_path)
+            return _free_bytes(self.tmpfs_root_path) >= nbytes
+
+        if self.quota_bytes and self._disk_bytes + nbytes > self.quota_bytes:
+            return False
+        if self.min_free_bytes:
+            return _free_bytes(self.root_path) - nbytes >= self.min_free_bytes
+        return True
+
+    def _evict_one(self, in_memory: bool = None) -> int:
+        # Evicts least recently used finished job with files in tmpfs (if
+        # in_memory), on disk (if not in_memory) or anywhere (if None). Returns
+        # freed bytes, 0 if there is no such job.
+        for job in self._finished.values():
+            if in_memory is None:
+                break
+            if job.memory_bytes if in_memory else job.disk_bytes:
+                break
+        else:
+            return 0
+
+        del self._finished[job.id]
+        freed = job.disk_bytes + job.memory_bytes
+        self._forget(job)
+        self._remove_files(job)
+        self._counters["evicted"] += 1
+        self._counters["evicted_bytes"] += freed
+        return freed
+
+    def _forget(self, job: ScratchJob):
+        self._disk_bytes -= job.disk_bytes
+        self._memory_bytes -= job.memory_bytes
+        job.disk_bytes = job.memory_bytes = 0
+
+    def _remove_files(self, job: ScratchJob):
+        shutil.rmtree(job.path, ignore_errors=True)
+        if job.memory_path:
+            shutil.rmtree(job.memory_path, ignore_errors=True)
@@ -1,3 +1 @@
 from .main import cli
-from .runserver import runserver
-from .shell import shell
@@ -1,3 +1,4 @@
+import importlib
 import textwrap
 from collections import namedtuple
 
@@ -6,11 +7,61 @@ from click_help_colors import HelpColorsGroup
 
 from ..settings import ENVIRONMENTS
 
+#: Subcommands of `cli`: command name -> ``module:attribute`` import path
+#: (relative to this package). Modules are imported only when command is used,
+#: so ie. ``runserver`` never pays for importing ``IPython``. New subcommand is
+#: added by adding it here (or by calling `LazyGroup.register`).
+COMMANDS = {
+    'runserver': '.runserver:runserver',
+    'shell': '.shell:shell',
+}
+
 
 def args_from_dict(**kwargs):
     return namedtuple('CmdArguments', (kwargs or {}).keys())(**(kwargs or {}))
 
 
+class LazyGroup(HelpColorsGroup):
+    """
+    `HelpColorsGroup` that imports its subcommands by name, on first use.
+
+    Arguments:
+        lazy_commands: command name -> ``module:attribute`` import path, relative
+            import paths are resolved relative to this package
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def register(self, name, import_path):
+        """Registers lazily imported subcommand."""
+        self.lazy_commands[name] = import_path
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            module_name, attribute = self.lazy_commands[name].split(':')
+            command = getattr(
+                importlib.import_module(module_name, __package__), attribute
+            )
+
+            for color_attribute in (
+                'help_headers_color', 'help_options_color',
+                'help_options_custom_colors'
+            ):
+                if getattr(command, color_attribute, None) is None:
+                    setattr(
+                        command, color_attribute, getattr(self, color_attribute)
+                    )
+
+            self.add_command(command, name)
+
+        return super().get_command(ctx, name)
+
+
 _MAIN_HELP_TEXT = """
     {{cookiecutter.project_slug}} service.
 
@@ -68,7 +119,7 @@ _MAIN_HELP_TEXT = """
 
 
 @click.group(
-    cls=HelpColorsGroup,
+    cls=LazyGroup, lazy_commands=COMMANDS,
     help_headers_color='yellow', help_options_color='green',
     context_settings=dict(max_content_width=120),
     help=_MAIN_HELP_TEXT
@@ -97,6 +148,13 @@ _MAIN_HELP_TEXT = """
         Optional suffix that will be appended to running app's process name.
     """).replace('\n', ' ').strip())
 )
+@click.option(
+    '-w', '--workers', type=click.IntRange(min=0), default=0, show_default=True,
+    help=(textwrap.dedent("""
+        Number of worker processes application server will fork and supervise.
+        0 runs application server in single process.
+    """).replace('\n', ' ').strip())
+)
 @click.option(
     '--dry-run/--no-dry-run', default=False,
     show_default=True,
@@ -1,16 +1,16 @@
 import click
-import IPython
 from click_help_colors import HelpColorsCommand
 
-from ..server import create_app
-from ..settings import SETTINGS
-from .main import cli
 
-
-@cli.command(cls=HelpColorsCommand)
+@click.command(cls=HelpColorsCommand)
 @click.pass_context
 def shell(ctx):
     """Starts application shell."""
+    # Imported here, so that listing commands in --help doesn't import IPython
+    import IPython
+
+    from ..server import create_app
+    from ..settings import SETTINGS
 
     IPython.start_ipython(argv=[], user_ns={
         "app": create_app(ctx.obj),
@@ -1,3 +1,4 @@
+import functools
 import logging
 import signal
 import sys
@@ -6,11 +7,27 @@ from typing import NamedTuple
 
 import prctl
 
-from . import __version__, settings
+from . import __version__, logging_utilities, metrics, preload, profiling, settings
+from .executor import ExecutorFullError, JobExecutor
+from .metrics import instrumentation
+from .reactor import Reactor
 from .settings import SETTINGS
+from .workers import Supervisor
 
 logger = logging.getLogger(__name__)
 
+_SERVER_INFO = metrics.gauge(
+    "server_info", "Application server version", labels=["version"], merge="max"
+)
+_START_TIME = metrics.gauge(
+    "server_start_time_seconds",
+    "Start time of application server since Unix epoch",
+    merge="min",
+)
+_CONFIG_RELOADS = metrics.counter(
+    "config_reloads_total", "Config reloads by result", labels=["result"]
+)
+
 
 class Server:
     """
@@ -18,6 +35,31 @@ class Server:
     thread, handles signals and makes sure everything starts up and shuts down
     cleanly.
 
+    Main thread runs `.Reactor` event loop. Subclasses register their work with
+    it from `.before_startup`, ie:
+
+    .. code-block:: python
+
+        def before_startup(self):
+            self.reactor.spawn(self.consume_jobs())
+            self.reactor.add_reader(self.some_socket, self.on_some_socket_readable)
+
+    Blocking work (ie. I/O bound job handlers) can be run concurrently in
+    `.executor` thread pool, configured by ``executor`` section of app config.
+
+    When started with ``--workers N``, main process becomes `.Supervisor` that
+    forks ``N`` worker processes and each of them runs its own main thread loop.
+    Before forking, supervisor preloads application (see `.preload.preload`) so
+    that workers share as much memory with it as possible.
+
+    If ``metrics.listen`` is configured, `.metrics` are served in Prometheus text
+    format. Prefork workers publish theirs to supervisor, which serves them all.
+
+    Running server can be diagnosed without restart: SIGUSR2 starts and stops
+    `.profiling.SamplingProfiler` and SIGPWR dumps stacks of all threads (see
+    ``profiler`` section of app config for where they are written). Supervisor
+    relays both signals to its workers.
+
     Arguments:
         environment: name of runtime environment (ie. 'test', 'development',
             'production')
@@ -26,23 +68,122 @@ class Server:
     def __init__(self, environment: str, cmdline_args: NamedTuple = None):
         settings.init_module(environment, cmdline_args)
         prctl.set_proctitle(SETTINGS.instance_name)
+        self.reactor = Reactor()
+        #: Thread pool for blocking jobs, see `.JobExecutor`
+        self.executor = JobExecutor.from_config(SETTINGS.app_config.get("executor"))
+        self._shutdown_signame = None
+        self._metrics_server = None
+        self._shared_metrics = None
+        #: Sampling profiler started by `.toggle_profiler`
+        self.profiler = None
+        self._stack_dumper = None
+
+        metrics.REGISTRY.register_collector(instrumentation.logging_families)
+        metrics.REGISTRY.register_collector(instrumentation.resource_families)
+        metrics.REGISTRY.register_collector(
+            functools.partial(instrumentation.executor_families, self.executor)
+        )
+
+    def before_fork(self):
+        """
+        Executed in supervisor process before worker processes are forked.
+
+        Override it to load and warm up data that all workers will use. Anything
+        loaded here is shared between workers (copy-on-write).
+        """
+        pass
 
     def before_startup(self):
         """Executed before main thread loop is started."""
         pass
 
     def startup(self):
-        """Starts main thread loop."""
+        """
+        Starts main thread loop or, if configured to use worker processes, starts
+        workers supervisor.
+        """
+        if SETTINGS.workers_count:
+            self._supervise()
+        else:
+            self._run()
+
+    def startup_worker(self, worker_index: int):
+        """Starts main thread loop inside of forked worker process."""
+        preload.run_after_fork_hooks()
+        settings.init_worker(worker_index)
+        # Only closes socket inherited from supervisor
+        self.stop_metrics_server()
+        prctl.set_proctitle(
+            "{}-worker-{}".format(SETTINGS.instance_name, worker_index)
+        )
+        self.reactor = Reactor()
+        self._run()
+
+    def _supervise(self):
+        logger.debug(
+            "Starting up '%s' (v%s) application server supervisor with %d "
+            "worker(s)...",
+            SETTINGS.instance_name,
+            __version__,
+            SETTINGS.workers_count,
+        )
+
+        # Supervisor doesn't run loop, and workers must not inherit it
+        self.reactor.close()
+        preload.preload(warm_up=self.before_fork)
+
+        config = SETTINGS.typed_app_config.metrics
+        if config.listen:
+            self._shared_metrics = metrics.SharedMetrics(
+                SETTINGS.workers_count, config.slot_size
+            )
+        self._set_server_metrics()
+        self.start_metrics_server()
+
+        signame = Supervisor(
+            self, SETTINGS.workers_count, shared_metrics=self._shared_metrics
+        ).run()
+
+        self.stop_metrics_server()
+        settings.cleanup_module()
+
+        logger.info(
+            "Application server supervisor '%s' (v%s) was shut down (%s).",
+            SETTINGS.instance_name,
+            __version__,
+            signame,
+        )
+        logging_utilities.stop_queue_listener()
+
+        sys.exit(0)
+
+    def _run(self):
         logger.debug(
             "Starting up '%s' (v%s) application server...",
             SETTINGS.instance_name,
             __version__,
         )
 
-        for signame in ('SIGINT', 'SIGTERM', 'SIGHUP', 'SIGQUIT'):
-            signal.signal(
-                getattr(signal, signame), lambda signum, frame: self.shutdown(signame)
+        for signame in ('SIGINT', 'SIGTERM', 'SIGQUIT'):
+            self.reactor.add_signal_handler(
+                getattr(signal, signame), self.shutdown, signame
             )
+        self.reactor.add_signal_handler(signal.SIGHUP, self.reload_config)
+        self.reactor.add_signal_handler(
+            signal.SIGUSR1, logging_utilities.reopen_log_files
+        )
+        self.reactor.add_signal_handler(Supervisor.PROFILE_SIGNAL, self.toggle_profiler)
+        self.install_stack_dumper()
+
+        # Single worker is enough to clean up after crashed instances
+        if not SETTINGS.worker_index:
+            self.remove_abandoned_tmp_dirs()
+
+        self._set_server_metrics()
+        if self._shared_metrics is not None:
+            self.publish_metrics()
+        else:
+            self.start_metrics_server()
 
         self.before_startup()
 
@@ -52,20 +193,157 @@ class Server:
             __version__,
         )
 
-        while True:
-            time.sleep(0.1)
+        self.reactor.run_forever()
+
+        # Loop was stopped by `.shutdown`, now we can finish it outside of loop
+        self.shutdown(self._shutdown_signame)
+
+    def reload_config(self):
+        """
+        Reloads changed config files (on SIGHUP). Override to react to reload in
+        ways `.settings.on_reload` subscribers can't.
+        """
+        changed_keys = settings.reload_module()
+        _CONFIG_RELOADS.labels("rejected" if changed_keys is None else "ok").inc()
+
+    def start_metrics_server(self):
+        """
+        Starts serving metrics on ``metrics.listen``, if it is configured. In
+        supervisor, it serves metrics of all workers.
+        """
+        config = SETTINGS.typed_app_config.metrics
+        if not config.listen:
+            return
+
+        namespace = config.namespace or SETTINGS.APPLICATION_NAME
+        shared = self._shared_metrics
+        server = metrics.MetricsServer(
+            config.listen,
+            lambda: metrics.render_text(metrics.collect(shared), namespace),
+        )
+        try:
+            server.start()
+        except OSError:
+            logger.exception("Can't serve metrics on %s!", config.listen)
+        else:
+            self._metrics_server = server
+
+    def stop_metrics_server(self):
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
+
+    def publish_metrics(self):
+        """
+        Publishes metrics of prefork worker to supervisor and schedules next
+        publication after ``metrics.publish_interval`` seconds.
+        """
+        self._shared_metrics.publish(SETTINGS.worker_index, metrics.collect())
+        self.reactor.call_later(
+            settings.snapshot().typed_app_config.metrics.publish_interval,
+            self.publish_metrics,
+        )
+
+    @property
+    def diagnostics_path(self) -> str:
+        """
+        Directory profiles and stack dumps are written into, ``profiler.output_path``
+        or instance tmp directory (which is removed on shutdown).
+        """
+        return (
+            SETTINGS.typed_app_config.profiler.output_path
+            or SETTINGS.instance_tmp_dir_path
+        )
+
+    def toggle_profiler(self):
+        """
+        Starts sampling profiler or stops it and writes collected profile (on
+        SIGUSR2).
+        """
+        if self.profiler is None or not self.profiler.is_running:
+            # Recreated each time, so it follows reloaded config
+            self.profiler = profiling.SamplingProfiler.from_config(
+                SETTINGS.typed_app_config.profiler, self.diagnostics_path
+            )
+        self.profiler.toggle()
+
+    def install_stack_dumper(self):
+        """
+        Makes process dump stacks of all threads on SIGPWR (see
+        `.profiling.StackDumper`).
+        """
+        path = profiling.stack_dump_path(self.diagnostics_path)
+        self._stack_dumper = profiling.StackDumper(Supervisor.DUMP_STACKS_SIGNAL, path)
+        try:
+            self._stack_dumper.install()
+        except OSError:
+            logger.exception("Can't dump thread stacks into %s!", path)
+            self._stack_dumper = None
+
+    def _set_server_metrics(self):
+        # Called in each process, after its metrics were reset
+        _SERVER_INFO.labels(__version__).set(1)
+        _START_TIME.set(time.time())
+
+    def remove_abandoned_tmp_dirs(self):
+        """
+        Removes tmp directories of crashed app instances in `.executor` (see
+        `.settings.remove_abandoned_tmp_dirs`) and schedules next removal after
+        ``scratch.cleanup_interval`` seconds.
+        """
+        try:
+            self.executor.submit_with(settings.remove_abandoned_tmp_dirs, block=False)
+        except ExecutorFullError:
+            pass
+
+        interval = settings.snapshot().typed_app_config.scratch.cleanup_interval
+        if interval:
+            self.reactor.call_later(interval, self.remove_abandoned_tmp_dirs)
 
     def before_shutdown(self):
         """Executed before main thread loop is terminated."""
+        self.executor.shutdown(
+            wait=True,
+            timeout=(SETTINGS.app_config.get("executor") or {}).get("shutdown_timeout"),
+        )
+        settings.close_redis(self.reactor)
+
+        if self.profiler is not None:
+            self.profiler.stop(wait=True)
+        if self._stack_dumper is not None:
+            self._stack_dumper.uninstall()
+
+        if self._shared_metrics is not None:
+            # Last words, so that supervisor keeps worker's final counts
+            self._shared_metrics.publish(SETTINGS.worker_index, metrics.collect())
+        self.stop_metrics_server()
+
         settings.cleanup_module()
+        logger.debug(
+            "Suppressed log records: %s", logging_utilities.suppression_stats()
+        )
+        logging_utilities.stop_queue_listener()
 
     def shutdown(self, signame):
         """Terminates main thread loop."""
+        if self.reactor.is_running:
+            # Called from within loop (ie. from signal handler). Stop the loop and
+            # let `.startup` call us again once loop had unwound.
+            self._shutdown_signame = signame
+            self.reactor.stop()
+            return
+
         logger.debug(
-            "Initiating shut down of '%s' application server...", SETTINGS.instance_name
+            "Initiating shut down of '%s' application server (%s)...",
+            SETTINGS.instance_name,
+            signame,
         )
 
+        # Tasks are cancelled before and loop is closed after `before_shutdown`, so
+        # it can still run coroutines that clean up async resources
+        self.reactor.cancel_tasks()
         self.before_shutdown()
+        self.reactor.close()
 
         logger.info(
             "Application server '%s' (v%s) was shut down. So Long, and Thanks for "
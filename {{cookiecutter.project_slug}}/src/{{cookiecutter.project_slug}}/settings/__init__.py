@@ -2,12 +2,21 @@
 App settings module providing access to global config singleton object.
 """
 
+import logging
+import os
+from typing import Callable, List, Optional
+
 from objproxies import CallbackProxy
-from seveno_pyutil import silent_remove
+from seveno_pyutil import silent_create_dirs, silent_remove
 
+from .. import artifact_cache, mapped_files, scratch
 from .development_config_loader import DevelopmentConfigLoader
-from .external_config_loader import ExternalConfigLoader, ImproperlyConfiguredError
+from .external_config_loader import (ExternalConfigLoader, ImproperlyConfiguredError,
+                                     diff_config)
 from .production_config_loader import ProductionConfigLoader
+from .redis_manager import RedisManager
+from .schema import APP_CONFIG_SCHEMA, Field, Section
+from .snapshot import ConfigSection, SettingsSnapshot
 from .test_config_loader import TestConfigLoader
 
 #: Available app runtime environment types.
@@ -20,6 +29,26 @@ ENVIRONMENTS = {
 # Global config object instance
 _SETTINGS = None
 
+# Immutable snapshot of _SETTINGS, replaced whenever _SETTINGS change
+_SNAPSHOT = None
+
+# Global Redis connection pool manager instance
+_REDIS_MANAGER = None
+
+# Scratch space of current process, see `.scratch_space`
+_SCRATCH_SPACE = None
+
+# Global artifact cache instance, see `.artifact_cache`
+_ARTIFACT_CACHE = None
+
+# File descriptor of lock marking instance tmp dir as being used
+_INSTANCE_LOCK = None
+
+# Callbacks registered by `.on_reload`
+_RELOAD_SUBSCRIBERS = []
+
+logger = logging.getLogger(__name__)
+
 
 def init_module(environment, cmdline_args=None):
     """
@@ -29,23 +58,278 @@ def init_module(environment, cmdline_args=None):
     Note:
         Should be called once on app start.
     """
-    global _SETTINGS
+    global _SETTINGS, _SNAPSHOT, _INSTANCE_LOCK
     _SETTINGS = ENVIRONMENTS[environment](cmdline_args=cmdline_args)
     _SETTINGS.load_and_validate()
+    _SNAPSHOT = SettingsSnapshot(_SETTINGS)
+
+    if _INSTANCE_LOCK is not None:
+        os.close(_INSTANCE_LOCK)
+    _INSTANCE_LOCK = scratch.lock_dir(_SETTINGS.instance_tmp_dir_path)
+
+
+def init_worker(worker_index):
+    """
+    Re-initializes settings module inside of forked worker process.
+
+    Each worker gets its own subdirectory of supervisor's
+    ``instance_tmp_dir_path``.
+    """
+    global _SNAPSHOT, _SCRATCH_SPACE, _ARTIFACT_CACHE
+    _SETTINGS.worker_index = worker_index
+    _SNAPSHOT = SettingsSnapshot(_SETTINGS)
+    silent_create_dirs(_SNAPSHOT.instance_tmp_dir_path)
+    # Inherited ones belong to supervisor
+    _SCRATCH_SPACE = None
+    _ARTIFACT_CACHE = None
+
+
+def snapshot() -> SettingsSnapshot:
+    """
+    Returns current immutable `.SettingsSnapshot` of global settings, which is
+    much cheaper to read values from than `.SETTINGS`.
+    """
+    return _SNAPSHOT
+
+
+def on_reload(callback: Callable[[List[str]], None]):
+    """
+    Registers ``callback`` to be called after app config was successfully
+    reloaded by `.reload_module`, with list of dotted keys that had changed.
+
+    Can be used as decorator:
+
+    .. code-block:: python
+
+        @settings.on_reload
+        def _refresh_limits(changed_keys):
+            if any(key.startswith("limits.") for key in changed_keys):
+                ...
+    """
+    _RELOAD_SUBSCRIBERS.append(callback)
+    return callback
+
+
+def reload_module() -> Optional[List[str]]:
+    """
+    Reloads external config files that had changed since last load (usually on
+    SIGHUP) and notifies `.on_reload` subscribers.
+
+    If new config is invalid, it is rejected and old config stays active.
+
+    Returns:
+        dotted keys of app config that had changed or ``None`` if new config was
+        rejected
+    """
+    global _SNAPSHOT
+    try:
+        changed_keys = _SETTINGS.reload()
+    except ImproperlyConfiguredError as exception:
+        logger.error("Rejected invalid config, keeping the old one: %s", exception)
+        return None
+    except Exception:
+        # Reload is triggered by SIGHUP in supervisor, it must never take
+        # running server down
+        logger.exception("Reloading config failed, keeping the old one!")
+        return None
+
+    _SNAPSHOT = SettingsSnapshot(_SETTINGS)
+
+    logger.info(
+        "Reloaded config, changed keys: %s", ", ".join(changed_keys) or "none"
+    )
+
+    for callback in list(_RELOAD_SUBSCRIBERS):
+        try:
+            callback(changed_keys)
+        except Exception:
+            logger.exception("Config reload subscriber %r failed!", callback)
+
+    return changed_keys
+
+
+def redis_manager() -> RedisManager:
+    """
+    Returns global `.RedisManager`, creating it on first call from ``redis.client``
+    section of app config.
+    """
+    global _REDIS_MANAGER
+    if _REDIS_MANAGER is None:
+        _REDIS_MANAGER = RedisManager(
+            (_SETTINGS.app_config.get("redis") or {}).get("client")
+        )
+    return _REDIS_MANAGER
+
+
+def close_redis(reactor=None):
+    """
+    Closes global Redis connection pools, if they had been created.
+
+    Async pool is bound to event loop, so it is only closed if ``reactor`` that
+    runs that loop is given.
+    """
+    if _REDIS_MANAGER is not None:
+        _REDIS_MANAGER.close()
+
+        if reactor is not None and _REDIS_MANAGER.has_async_pool:
+            reactor.run_until_complete(_REDIS_MANAGER.aclose())
+
+
+def scratch_space() -> scratch.ScratchSpace:
+    """
+    Returns `.ScratchSpace` of current process, creating it on first call from
+    ``scratch`` section of app config. It lives in ``scratch`` subdirectory of
+    instance tmp directory and, if ``scratch.tmpfs_path`` is configured, in
+    matching directory in tmpfs.
+    """
+    global _SCRATCH_SPACE
+    if _SCRATCH_SPACE is None:
+        config = _SETTINGS.typed_app_config.scratch
+        _SCRATCH_SPACE = scratch.ScratchSpace.from_config(
+            config,
+            os.path.join(_SETTINGS.instance_tmp_dir_path, "scratch"),
+            _SETTINGS.instance_dir_path(config.tmpfs_path)
+            if config.tmpfs_path
+            else None,
+        )
+    return _SCRATCH_SPACE
+
+
+def cache() -> artifact_cache.ArtifactCache:
+    """
+    Returns global `.ArtifactCache`, creating it on first call from ``cache``
+    section of app config. Unless ``cache.path`` is configured, it lives in
+    ``XDG_DATA_HOME``, so it survives restarts and is shared by all instances of
+    app run by the same user.
+    """
+    global _ARTIFACT_CACHE
+    if _ARTIFACT_CACHE is None:
+        _ARTIFACT_CACHE = artifact_cache.ArtifactCache.from_config(
+            _SETTINGS.typed_app_config.cache,
+            os.path.join(_SETTINGS.XDG_DATA_HOME, "artifacts"),
+        )
+    return _ARTIFACT_CACHE
+
+
+def resource_stats() -> dict:
+    """
+    Stats of global resources (``redis``, ``scratch`` and ``cache``), for those
+    of them that were already created in current process.
+    """
+    retv = {}
+    if _REDIS_MANAGER is not None:
+        retv["redis"] = _REDIS_MANAGER.stats()
+    if _SCRATCH_SPACE is not None:
+        retv["scratch"] = _SCRATCH_SPACE.stats()
+    if _ARTIFACT_CACHE is not None:
+        retv["cache"] = _ARTIFACT_CACHE.stats()
+    return retv
+
+
+def remove_abandoned_tmp_dirs() -> List[str]:
+    """
+    Removes tmp directories (and tmpfs scratch directories) left behind by
+    crashed instances of this app (see `.scratch.remove_abandoned_dirs`).
+
+    Returns:
+        removed paths
+    """
+    config = _SETTINGS.typed_app_config.scratch
+    instances_dir = os.path.join(_SETTINGS.tmp_dir_base_path, _SETTINGS.instance_name)
+    current_name = _SETTINGS.APPLICATION_INSTANCE_UUID.hex
+
+    removed = scratch.remove_abandoned_dirs(
+        instances_dir, current_name, config.stale_after
+    )
+    if config.tmpfs_path:
+        removed += scratch.remove_abandoned_dirs(
+            os.path.join(config.tmpfs_path, _SETTINGS.instance_name),
+            current_name,
+            config.stale_after,
+            locks_dir=instances_dir,
+        )
+    return removed
 
 
 def cleanup_module():
+    global _SCRATCH_SPACE, _INSTANCE_LOCK
+    _SCRATCH_SPACE = None
+
     try:
-        silent_remove(_SETTINGS.instance_tmp_dir_path)
+        tmpfs_path = _SETTINGS.typed_app_config.scratch.tmpfs_path
+        paths = [_SETTINGS.instance_tmp_dir_path]
+        if tmpfs_path:
+            paths.append(_SETTINGS.instance_dir_path(tmpfs_path))
+
+        for path in paths:
+            mapped_files.close_all(path)
+            silent_remove(path)
     except Exception:
         # Whatever, this is usually only called on app shutdown, and logging
         # here is just spam
         pass
 
+    if _INSTANCE_LOCK is not None:
+        os.close(_INSTANCE_LOCK)
+        _INSTANCE_LOCK = None
+
+
+# Attributes SETTINGS reads from _SNAPSHOT instead of computing them again
+_SNAPSHOT_ATTRIBUTES = frozenset(
+    (
+        "instance_name",
+        "instance_tmp_dir_path",
+        "filelog_abspath",
+        "is_dry_run",
+        "workers_count",
+        "worker_index",
+        "typed_app_config",
+    )
+)
+
+
+class _SettingsProxy(CallbackProxy):
+    """
+    Proxy to _SETTINGS that reads values precomputed by `.SettingsSnapshot`
+    from current snapshot and everything else from _SETTINGS. Assigning
+    attributes through it takes new snapshot.
+    """
+
+    __slots__ = ()
+
+    def __getattribute__(self, attr):
+        if attr in _SNAPSHOT_ATTRIBUTES and _SNAPSHOT is not None:
+            return getattr(_SNAPSHOT, attr)
+        return CallbackProxy.__getattribute__(self, attr)
+
+    def __setattr__(self, attr, value):
+        CallbackProxy.__setattr__(self, attr, value)
+        _take_snapshot()
+
+    def __delattr__(self, attr):
+        CallbackProxy.__delattr__(self, attr)
+        _take_snapshot()
 
-# We must use CallbackProxy so that ``from {{cookiecutter.project_slug}}.settings import
+
+def _take_snapshot():
+    global _SNAPSHOT
+    if _SETTINGS is not None:
+        _SNAPSHOT = SettingsSnapshot(_SETTINGS)
+
+
+# We must use proxy so that ``from {{cookiecutter.project_slug}}.settings import
 # SETTINGS`` still returns _SETTINGS object even when _SETTINGS were
 # initialized after import had happened
 
-#: Global app settings. Available after calling `.init_module`.
-SETTINGS = CallbackProxy(lambda: _SETTINGS)
+#: Global app settings. Available after calling `.init_module`. Values that
+#: loader computes on each access (ie. ``instance_tmp_dir_path``) are read from
+#: `.snapshot`, so they are cheap to read through ``SETTINGS`` too.
+SETTINGS = _SettingsProxy(lambda: _SETTINGS)
+
+#: Global `redis.Redis` client. Connection pool is created on first use and each
+#: prefork worker process gets its own pool.
+REDIS = CallbackProxy(lambda: redis_manager().client)
+
+#: Global `redis.asyncio.Redis` client, for use from coroutines running in
+#: application server loop. Like `.REDIS`, it connects on first use.
+REDIS_ASYNC = CallbackProxy(lambda: redis_manager().async_client)
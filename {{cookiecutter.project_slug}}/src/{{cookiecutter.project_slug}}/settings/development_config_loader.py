@@ -1,8 +1,8 @@
 import os
 
-from pkg_resources import Requirement, resource_filename
 from seveno_pyutil import is_blank
 
+from .. import resources
 from .external_config_loader import ExternalConfigLoader, ImproperlyConfiguredError
 
 
@@ -82,12 +82,7 @@ class DevelopmentConfigLoader(ExternalConfigLoader):
         if self._IS_RUNNING_FROM_SOURCE:
             return [os.path.join(self._REPO_ROOT, "config", "logging_config.json")]
         else:
-            return [
-                resource_filename(
-                    Requirement.parse("{{cookiecutter.project_slug}}"),
-                    "{{cookiecutter.project_slug}}/resources/logging_config.json",
-                )
-            ]
+            return [resources.resource_path("logging_config.json")]
 
     @property
     def config_file_abspaths(self):
@@ -104,9 +99,4 @@ class DevelopmentConfigLoader(ExternalConfigLoader):
         if self._IS_RUNNING_FROM_SOURCE:
             return [os.path.join(self._REPO_ROOT, "config", "development.yaml")]
         else:
-            return [
-                resource_filename(
-                    Requirement.parse("{{cookiecutter.project_slug}}"),
-                    "{{cookiecutter.project_slug}}/resources/development.yaml",
-                )
-            ]
+            return [resources.resource_path("development.yaml")]
@@ -1,16 +1,22 @@
+import hashlib
 import logging
 import os
 import tempfile
+import time
 import uuid
 from abc import ABC, abstractmethod
 from collections import namedtuple
 from logging.config import dictConfig
-from typing import List, NamedTuple
+from typing import Dict, List, NamedTuple
 
 import yaml
-from pkg_resources import Requirement, resource_filename
 from seveno_pyutil import current_user_home, silent_create_dirs
 
+from .. import __version__, resources
+from ..logging_utilities.journald import JOURNALD_SOCKET
+from ..logging_utilities.queueing import resolve_queue_handlers_targets
+from .schema import APP_CONFIG_SCHEMA
+
 try:
     import simplejson as json
 except ImportError:
@@ -24,6 +30,85 @@ class ImproperlyConfiguredError(RuntimeError):
     pass
 
 
+#: Fingerprint and parsed contents of config file
+_ConfigFile = namedtuple("_ConfigFile", ["mtime_ns", "size", "digest", "data"])
+
+_MISSING = object()
+
+#: libyaml based loader if PyYAML was built with it, it is much faster than pure
+#: Python one
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _read_config_file(path: str, parse, previous: _ConfigFile = None) -> _ConfigFile:
+    """
+    Reads and parses config file, unless it is the same as ``previous`` one.
+
+    File is considered the same if its mtime and size didn't change or if they
+    did, but its contents hash is still the same.
+
+    Returns:
+        ``None`` if file doesn't exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        stat = None
+
+    if stat is None:
+        if not resources.bundled_resource_name(path):
+            return None
+
+        # Bundled resource of package imported from zipapp or wheel
+        raw = resources.read_resource(path)
+        mtime_ns, size = None, len(raw)
+
+    else:
+        mtime_ns, size = stat.st_mtime_ns, stat.st_size
+        if previous is not None and (previous.mtime_ns, previous.size) == (
+            mtime_ns,
+            size,
+        ):
+            return previous
+
+        with open(path, "rb") as f:
+            raw = f.read()
+
+    digest = hashlib.sha256(raw).digest()
+
+    if previous is not None and previous.digest == digest:
+        return previous._replace(mtime_ns=mtime_ns, size=size)
+
+    return _ConfigFile(mtime_ns, size, digest, parse(raw))
+
+
+def _parse_yaml_config(raw: bytes) -> dict:
+    data = yaml.load(raw, Loader=_YAML_LOADER) or {}
+    if not isinstance(data, dict):
+        raise ImproperlyConfiguredError("Config file must contain YAML mapping!")
+    return data
+
+
+def diff_config(old: dict, new: dict, prefix: str = "") -> List[str]:
+    """
+    Compares two config dicts.
+
+    Returns:
+        sorted list of dotted keys that were added, removed or changed
+    """
+    retv = []
+    for key in sorted(set(old) | set(new), key=str):
+        dotted_key = prefix + str(key)
+        old_value, new_value = old.get(key, _MISSING), new.get(key, _MISSING)
+
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            retv.extend(diff_config(old_value, new_value, dotted_key + "."))
+        elif old_value != new_value:
+            retv.append(dotted_key)
+
+    return retv
+
+
 class ExternalConfigLoader(ABC):
     """
     External config file loader.
@@ -95,11 +180,30 @@ class ExternalConfigLoader(ABC):
     #: logging_config.json look like.
     _FORCE_DISABLE_SYSLOG = False
 
+    #: Whether to store resolved config into snapshot file in `XDG_DATA_HOME`
+    #: and reuse it on next startup if none of config files had changed
+    #: (see `.load_and_validate`).
+    _USE_CONFIG_SNAPSHOT = True
+
+    #: Schema app config is validated against (see `.settings.schema`)
+    APP_CONFIG_SCHEMA = APP_CONFIG_SCHEMA
+
+    #: Top level app config keys that are used only on startup (ie. to create
+    #: instance tmp directory). `.reload` keeps their old values.
+    RESTART_ONLY_KEYS = ("tmp_dir_path",)
+
     def __init__(self, cmdline_args: NamedTuple = None):
         self._errors = None
         self.cmdline_args = cmdline_args or namedtuple("CmdArguments", [])()
         self._logging_json = None
+        self._logging_fanout = None
+        self._config_files = {}  # path -> _ConfigFile
+        self._logging_config_files = {}  # path -> _ConfigFile
         self.app_config = {}  #: `dict` for contents of external config file(s)
+        #: ``app_config`` as typed section objects (see `.settings.schema`)
+        self.typed_app_config = None
+        #: Index of prefork worker process, `None` in supervisor or single process
+        self.worker_index = None
 
     def __getitem__(self, item):
         return self.app_config[item]
@@ -125,18 +229,49 @@ class ExternalConfigLoader(ABC):
         return getattr(self.cmdline_args, "dry_run", False)
 
     @property
-    def instance_tmp_dir_path(self) -> str:
+    def workers_count(self) -> int:
+        """
+        State of ``--workers`` command line argument. ``0`` means app server runs
+        in single process without worker processes supervisor.
+        """
+        return getattr(self.cmdline_args, "workers", None) or 0
+
+    @property
+    def tmp_dir_base_path(self) -> str:
         """
-        Default base tmp directory. Either it is the one taken from external
-        config or we query OS for it.
+        Base tmp directory shared by all app instances. Either it is the one
+        taken from external config or we query OS for it.
         """
-        base_path = (self.app_config or {}).get("tmp_dir_path") or self.DEFAULT_TEMP_DIR
         return os.path.abspath(
+            (self.app_config or {}).get("tmp_dir_path") or self.DEFAULT_TEMP_DIR
+        )
+
+    @property
+    def instance_tmp_dir_path(self) -> str:
+        """
+        Tmp directory of this app instance, in `tmp_dir_base_path`.
+
+        In prefork worker processes this is worker's own subdirectory of
+        supervisor's tmp directory.
+        """
+        return self.instance_dir_path(self.tmp_dir_base_path)
+
+    def instance_dir_path(self, base_path: str) -> str:
+        """
+        Directory of this app instance (and worker process) in ``base_path``:
+        ``<base_path>/<instance_name>/<APPLICATION_INSTANCE_UUID>[/worker-<N>]``
+        """
+        retv = os.path.abspath(
             os.path.join(
                 base_path, self.instance_name, self.APPLICATION_INSTANCE_UUID.hex
             )
         )
 
+        if self.worker_index is not None:
+            retv = os.path.join(retv, "worker-{}".format(self.worker_index))
+
+        return retv
+
     @property
     @abstractmethod
     def filelog_abspath(self) -> str:
@@ -175,6 +310,8 @@ class ExternalConfigLoader(ABC):
                     if "file" not in handler_name
                 }
 
+            self._select_journald(self._logging_json)
+
             for handler_name, handler_config in self._logging_json["handlers"].items():
                 if "file" in handler_name:
                     handler_config["filename"] = self.filelog_abspath
@@ -182,6 +319,9 @@ class ExternalConfigLoader(ABC):
                 if "syslog" in handler_name:
                     handler_config["."] = {"ident": self.instance_name}
 
+                if "journald" in handler_name:
+                    handler_config["identifier"] = self.instance_name
+
             for formatter in self._logging_json["formatters"].values():
                 formatter["format"] = formatter["format"].format(
                     service_name=self.instance_name
@@ -204,10 +344,141 @@ class ExternalConfigLoader(ABC):
                         handler_name
                         for handler_name in logger_cfg["handlers"]
                         if "syslog" not in handler_name
+                        and "journald" not in handler_name
                     ]
 
+            self._logging_fanout = self._compile_handlers_topology(
+                self._logging_json
+            )
+            self._route_through_queue(self._logging_json)
+
         return self._logging_json
 
+    @property
+    def logging_fanout(self) -> Dict[str, List[str]]:
+        """
+        Names of handlers each configured logger effectively emits records to
+        (its own and ones reached through propagation).
+        """
+        self.logging_json
+        return self._logging_fanout
+
+    @staticmethod
+    def _compile_handlers_topology(logging_json: dict) -> Dict[str, List[str]]:
+        """
+        Removes handlers from logger if one of its ancestors (to which logger
+        propagates records) already has them, so that each record is handled by
+        each handler once.
+
+        Returns:
+            effective handlers fan-out of each logger (``root`` for root logger)
+        """
+        loggers = dict(logging_json.get("loggers", {}))
+        if "root" in logging_json:
+            loggers[""] = logging_json["root"]
+
+        def ancestors(name):
+            parts = name.split(".")[:-1]
+            while parts:
+                ancestor = ".".join(parts)
+                if ancestor in loggers:
+                    yield loggers[ancestor]
+                parts.pop()
+            if name and "" in loggers:
+                yield loggers[""]
+
+        fanout = {}
+        for name, logger_cfg in loggers.items():
+            inherited = []
+            if logger_cfg.get("propagate", True):
+                for ancestor_cfg in ancestors(name):
+                    inherited.extend(ancestor_cfg.get("handlers") or [])
+                    if not ancestor_cfg.get("propagate", True):
+                        break
+
+            own = [
+                handler_name
+                for handler_name in logger_cfg.get("handlers") or []
+                if handler_name not in inherited
+            ]
+            if "handlers" in logger_cfg:
+                logger_cfg["handlers"] = own
+
+            fanout[name or "root"] = list(dict.fromkeys(own + inherited))
+
+        return fanout
+
+    @staticmethod
+    def _select_journald(logging_json: dict):
+        """
+        If ``journald`` section of logging config is enabled, loggers that log
+        into ``syslog`` handler are switched to ``journald`` handler
+        (`.JournaldHandler`) and ``syslog`` handler is removed.
+
+        When ``enabled`` is ``auto``, it is enabled if journald socket exists.
+        """
+        journald_config = dict(logging_json.pop("journald", None) or {})
+        enabled = journald_config.get("enabled", False)
+        journald_handler = logging_json["handlers"].get("journald")
+
+        if enabled == "auto":
+            enabled = journald_handler is not None and os.path.exists(
+                journald_handler.get("address", JOURNALD_SOCKET)
+            )
+
+        if not enabled:
+            return
+
+        if journald_handler is None:
+            raise ImproperlyConfiguredError(
+                {"logging_json": "Enabled journald, but there is no journald handler!"}
+            )
+
+        for logger_cfg in list(logging_json.get("loggers", {}).values()) + (
+            [logging_json["root"]] if "root" in logging_json else []
+        ):
+            if "handlers" in logger_cfg:
+                logger_cfg["handlers"] = [
+                    "journald" if handler_name == "syslog" else handler_name
+                    for handler_name in logger_cfg["handlers"]
+                ]
+
+        logging_json["handlers"].pop("syslog", None)
+
+    @staticmethod
+    def _route_through_queue(logging_json: dict):
+        """
+        If ``queue`` section of logging config is enabled, rewrites config so that
+        loggers log into `.QueueHandler` and real handlers are called from
+        background thread.
+
+        Loggers that use the same set of handlers share one queue handler.
+        Filters listed in ``queue.filters`` (ie. `.SamplingFilter`) are attached
+        to queue handlers, so records they suppress are never enqueued.
+        """
+        queue_config = dict(logging_json.pop("queue", None) or {})
+        if not queue_config.pop("enabled", False):
+            return
+
+        queue_handlers = {}
+        for logger_cfg in list(logging_json.get("loggers", {}).values()) + (
+            [logging_json["root"]] if "root" in logging_json else []
+        ):
+            handler_names = logger_cfg.get("handlers") or []
+            if not handler_names:
+                continue
+
+            queue_handler_name = "queue_" + "_".join(handler_names)
+            queue_handler_config = {
+                "()": "{{cookiecutter.project_slug}}.logging_utilities.QueueHandler",
+                "handlers": list(handler_names),
+            }
+            queue_handler_config.update(queue_config)
+            queue_handlers[queue_handler_name] = queue_handler_config
+            logger_cfg["handlers"] = [queue_handler_name]
+
+        logging_json["handlers"].update(queue_handlers)
+
     def _load_logging_config(self):
         if not self._logging_json:
             self._logging_json = {}
@@ -220,32 +491,38 @@ class ExternalConfigLoader(ABC):
                     pass
 
         if not self._logging_json:
-            with open(
-                resource_filename(
-                    Requirement.parse("{{cookiecutter.project_slug}}"),
-                    "{{cookiecutter.project_slug}}/resources/logging_config.json",
-                ),
-                "r",
-            ) as f:
-                self._logging_json = json.load(f)
+            self._logging_json = json.loads(
+                resources.read_resource("logging_config.json")
+            )
 
     def load_and_validate(self):
-        """Loads and validates external app config."""
-        self.app_config = {}
-        errors = {}
-
-        for conf_file_path in self.config_file_abspaths:
-            try:
-                with open(conf_file_path, "r") as f:
-                    config_data = yaml.load(f)
-
-            except yaml.YAMLError:
-                raise
+        """
+        Loads and validates external app config.
 
-            except Exception:
-                config_data = {}
+        Resolved app config and logging config are stored into snapshot file in
+        `XDG_DATA_HOME`, keyed by paths, mtimes and sizes of all config files.
+        If none of them had changed, next startup loads that snapshot instead of
+        parsing and resolving config files again.
+        """
+        snapshot_key = snapshot = None
+        if self._USE_CONFIG_SNAPSHOT:
+            snapshot_key = self._config_snapshot_key()
+            snapshot = self._read_config_snapshot(snapshot_key)
+
+        if snapshot:
+            self.app_config = snapshot["app_config"]
+            self._config_files = snapshot["config_files"]
+            self._logging_config_files = snapshot["logging_config_files"]
+            self._logging_json = snapshot["logging_json"]
+            self._logging_fanout = snapshot["logging_fanout"]
+        else:
+            self.app_config, self._config_files = self._load_app_config()
 
-            self.app_config.update(config_data)
+        started_at = time.perf_counter()
+        self.typed_app_config, self.app_config, errors = self.validate_app_config(
+            self.app_config
+        )
+        validation_ms = (time.perf_counter() - started_at) * 1000
 
         if self._is_filelog_enabled:
             try:
@@ -259,6 +536,12 @@ class ExternalConfigLoader(ABC):
 
         if not errors:
             dictConfig(self.logging_json)
+            resolve_queue_handlers_targets()
+
+            if not snapshot:
+                self._logging_config_files = self._load_logging_config_files()
+                if snapshot_key:
+                    self._write_config_snapshot(snapshot_key)
 
         if errors:
             raise ImproperlyConfiguredError(errors)
@@ -266,6 +549,7 @@ class ExternalConfigLoader(ABC):
         silent_create_dirs(self.instance_tmp_dir_path)
 
         logger = logging.getLogger(__name__)
+        logger.debug("Validated app config in %.3f ms", validation_ms)
         logger.debug(
             "Initialized and resolved config for %s: %s",
             self.instance_name,
@@ -275,6 +559,268 @@ class ExternalConfigLoader(ABC):
             logger.debug("Logging to: %s", self.filelog_abspath)
         else:
             logger.debug("Was not configured to log to file, check syslog instead...")
+        logger.debug(
+            "Logging handlers fan-out: %s",
+            "; ".join(
+                "{} -> {}".format(name, ", ".join(handlers) or "-")
+                for name, handlers in self.logging_fanout.items()
+            ),
+        )
+
+    @property
+    def config_snapshot_abspath(self) -> str:
+        """Path to resolved config snapshot (see `.load_and_validate`)."""
+        return os.path.join(
+            self.XDG_DATA_HOME,
+            "{}.{}.config-snapshot.json".format(
+                self.instance_name, type(self).__name__
+            ),
+        )
+
+    def _config_snapshot_key(self) -> str:
+        """
+        Hash of everything resolved config depends on: config files' paths,
+        mtimes and sizes, command line arguments, app version and environment
+        variables that resolve default directories.
+        """
+        files = []
+        for path in (
+            self.config_file_abspaths
+            + self.logging_config_abspaths
+            + [resources.resource_path("logging_config.json")]
+        ):
+            try:
+                stat = os.stat(path)
+                files.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                files.append((path, None, None))
+
+        return hashlib.sha256(
+            repr(
+                (
+                    type(self).__qualname__,
+                    __version__,
+                    repr(self.cmdline_args),
+                    os.path.exists(JOURNALD_SOCKET),
+                    files,
+                    [
+                        os.environ.get(name)
+                        for name in ("TMPDIR", "XDG_CONFIG_HOME", "XDG_DATA_HOME")
+                    ],
+                    self.DEFAULT_TEMP_DIR,
+                    self.XDG_CONFIG_HOME,
+                    self.XDG_DATA_HOME,
+                )
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def _read_config_snapshot(self, key: str) -> dict:
+        # Snapshot is JSON, not pickle: XDG_DATA_HOME is writable by user and
+        # loading snapshot must not be able to run code.
+        try:
+            with open(self.config_snapshot_abspath, "r") as f:
+                snapshot = json.load(f)
+
+            if not isinstance(snapshot, dict) or snapshot.get("key") != key:
+                return None
+
+            for name in ("config_files", "logging_config_files"):
+                files = snapshot[name]
+                snapshot[name] = {
+                    path: _ConfigFile(mtime_ns, size, bytes.fromhex(digest), data)
+                    for path, (mtime_ns, size, digest, data) in files.items()
+                }
+
+        except Exception:
+            # Missing, unreadable or written by incompatible version
+            return None
+
+        return snapshot
+
+    def _write_config_snapshot(self, key: str):
+        snapshot = {
+            "key": key,
+            "app_config": self.app_config,
+            "logging_json": self.logging_json,
+            "logging_fanout": self.logging_fanout,
+        }
+        for name in ("config_files", "logging_config_files"):
+            snapshot[name] = {
+                path: [
+                    config_file.mtime_ns,
+                    config_file.size,
+                    config_file.digest.hex(),
+                    config_file.data,
+                ]
+                for path, config_file in getattr(self, "_" + name).items()
+            }
+
+        tmp_path = "{}.{}.tmp".format(self.config_snapshot_abspath, os.getpid())
+        try:
+            data = json.dumps(snapshot)
+            # YAML has types JSON doesn't (ie. non string keys, tuples), config
+            # that uses them can't be restored from snapshot
+            if json.loads(data) != snapshot:
+                return
+
+            silent_create_dirs(self.XDG_DATA_HOME)
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.rename(tmp_path, self.config_snapshot_abspath)
+
+        except Exception:
+            # Snapshot is just an optimization, ie. read only home directory
+            # shouldn't prevent app from starting
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def validate_app_config(self, app_config: dict):
+        """
+        Validates loaded app config against `APP_CONFIG_SCHEMA`, coercing values
+        to declared types. Defaults of missing values are filled in only in
+        typed app config.
+
+        Returns:
+            tuple ``(typed_app_config, normalized_app_config, errors)``, where
+            ``errors`` is `dict` mapping dotted config key to error message
+        """
+        return self.APP_CONFIG_SCHEMA.validate(app_config)
+
+    def reload(self) -> List[str]:
+        """
+        Re-loads app config from config files that changed since they were last
+        loaded and applies logging levels from logging config, if it had changed.
+
+        Logging handlers are not rebuilt: only ``level`` of loggers and handlers
+        are applied. Other changes in logging config require restart. So do
+        changes of `RESTART_ONLY_KEYS`, they are logged and old values are kept.
+
+        New config is first loaded and validated and only then applied, so if it
+        is invalid, old config stays active.
+
+        Returns:
+            dotted keys of app config that had changed
+
+        Raises:
+            ImproperlyConfiguredError: if new config is invalid
+        """
+        try:
+            app_config, config_files = self._load_app_config(self._config_files)
+        except (yaml.YAMLError, OSError, UnicodeDecodeError) as exception:
+            # ie. file was replaced by directory or made unreadable
+            raise ImproperlyConfiguredError({"app_config": str(exception)})
+
+        self._keep_restart_only_keys(app_config)
+        typed_app_config, app_config, errors = self.validate_app_config(app_config)
+        if errors:
+            raise ImproperlyConfiguredError(errors)
+
+        logging_config_files = self._load_logging_config_files(
+            self._logging_config_files
+        )
+        levels = None
+        if logging_config_files != self._logging_config_files:
+            levels = self._logging_levels(logging_config_files)
+
+        # Everything is loaded and valid, now we can apply it
+        changed = diff_config(self.app_config, app_config)
+        self.app_config = app_config
+        self.typed_app_config = typed_app_config
+        self._config_files = config_files
+        self._logging_config_files = logging_config_files
+
+        if levels:
+            for apply_level, level in levels:
+                apply_level(level)
+
+        return changed
+
+    def _keep_restart_only_keys(self, app_config: dict):
+        old_app_config = self.app_config or {}
+        for key in self.RESTART_ONLY_KEYS:
+            if app_config.get(key) == old_app_config.get(key):
+                continue
+
+            logging.getLogger(__name__).warning(
+                "Changing %s from %r to %r requires restart, keeping the old value",
+                key,
+                old_app_config.get(key),
+                app_config.get(key),
+            )
+            if key in old_app_config:
+                app_config[key] = old_app_config[key]
+            else:
+                app_config.pop(key, None)
+
+    def _load_app_config(self, previous_files: dict = None):
+        app_config = {}
+        config_files = {}
+
+        for conf_file_path in self.config_file_abspaths:
+            config_file = _read_config_file(
+                conf_file_path,
+                _parse_yaml_config,
+                (previous_files or {}).get(conf_file_path),
+            )
+            if config_file is None:
+                continue
+
+            config_files[conf_file_path] = config_file
+            app_config.update(config_file.data)
+
+        return app_config, config_files
+
+    def _load_logging_config_files(self, previous_files: dict = None) -> dict:
+        retv = {}
+
+        for json_path in self.logging_config_abspaths:
+            try:
+                config_file = _read_config_file(
+                    json_path, json.loads, (previous_files or {}).get(json_path)
+                )
+            except (ValueError, OSError) as exception:
+                raise ImproperlyConfiguredError({json_path: str(exception)})
+
+            if config_file is not None:
+                retv[json_path] = config_file
+
+        return retv
+
+    @staticmethod
+    def _logging_levels(logging_config_files: dict) -> list:
+        """
+        Collects ``level`` of all loggers and handlers from logging config files
+        and validates them.
+
+        Returns:
+            list of ``(setLevel, level)`` pairs
+        """
+        logging_json = {}
+        for config_file in logging_config_files.values():
+            logging_json.update(config_file.data or {})
+
+        retv = []
+        for name, logger_cfg in logging_json.get("loggers", {}).items():
+            if "level" in logger_cfg:
+                retv.append((logging.getLogger(name).setLevel, logger_cfg["level"]))
+
+        if "level" in logging_json.get("root", {}):
+            retv.append((logging.getLogger().setLevel, logging_json["root"]["level"]))
+
+        for name, handler_cfg in logging_json.get("handlers", {}).items():
+            handler = logging._handlers.get(name)
+            if handler is not None and "level" in handler_cfg:
+                retv.append((handler.setLevel, handler_cfg["level"]))
+
+        for _, level in retv:
+            try:
+                logging._checkLevel(level)
+            except (ValueError, TypeError) as exception:
+                raise ImproperlyConfiguredError({"logging_json": str(exception)})
+
+        return retv
 
     @property
     def _is_filelog_enabled(self) -> bool:
@@ -301,6 +847,7 @@ class ExternalConfigLoader(ABC):
                     ("DEFAULT_TEMP_DIR", self.DEFAULT_TEMP_DIR),
                     ("instance_name", self.instance_name),
                     ("is_dry_run", self.is_dry_run),
+                    ("workers_count", self.workers_count),
                     ("instance_tmp_dir_path", self.instance_tmp_dir_path),
                     ("config_file_abspaths", self.config_file_abspaths),
                     ("filelog_abspath", self.filelog_abspath),
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+
+class _InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    `redis.BlockingConnectionPool` that measures how long clients wait for free
+    connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def get_connection(self, *args, **kwargs):
+        started_at = time.monotonic()
+        try:
+            return super().get_connection(*args, **kwargs)
+        finally:
+            wait_time = time.monotonic() - started_at
+            with self._stats_lock:
+                self.wait_count += 1
+                self.wait_time_total += wait_time
+                self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+class RedisManager:
+    """
+    Creates and owns Redis connection pools configured from ``redis.client``
+    section of app config.
+
+    Pool is created lazily, on first access to `.client`. Pool is also bound to
+    process that created it: if it is accessed from forked worker process, new
+    pool is created for that worker and connections inherited from parent
+    process are never touched.
+
+    For use from coroutines running in application server loop, there is
+    `.async_client` (`redis.asyncio.Redis`) with its own pool of the same size.
+    It lets many concurrent operations share few sockets without blocking the
+    loop:
+
+    .. code-block:: python
+
+        async def handle(self, keys):
+            async with REDIS_ASYNC.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(key)
+                values = await pipe.execute()
+
+    Redis parser is chosen by ``redis-py``: if ``hiredis`` is installed, fast
+    native parser is used.
+
+    Supported config keys (besides any other `redis.Connection` argument):
+
+    - ``host``, ``port``, ``db``, ``password``
+    - ``max_connections`` - max number of connections in pool (default 50)
+    - ``pool_timeout`` - max seconds to wait for free connection (default 5)
+    - ``socket_keepalive`` - enables TCP keepalive (default ``True``)
+    - ``health_check_interval`` - seconds after which idle connection is
+      checked with ``PING`` before it is used (default 30)
+
+    Arguments:
+        config: ``redis.client`` section of app config
+    """
+
+    DEFAULTS = {
+        "host": "127.0.0.1",
+        "port": 6379,
+        "db": 0,
+        "max_connections": 50,
+        "pool_timeout": 5,
+        "socket_keepalive": True,
+        "health_check_interval": 30,
+    }
+
+    def __init__(self, config: dict = None):
+        self.config = dict(self.DEFAULTS, **(config or {}))
+        self._pid = None
+        self._pool = None
+        self._client = None
+        self._lock = threading.Lock()
+        self._async_pid = None
+        self._async_loop = None
+        self._async_pool = None
+        self._async_client = None
+
+    @property
+    def pool(self) -> redis.ConnectionPool:
+        """Connection pool of current process."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._create_pool()
+        return self._pool
+
+    @property
+    def client(self) -> redis.Redis:
+        """Redis client using connection pool of current process."""
+        if self._pid != os.getpid():
+            self.pool
+        return self._client
+
+    @property
+    def async_client(self) -> redis.asyncio.Redis:
+        """
+        `redis.asyncio.Redis` client bound to currently running event loop.
+
+        Must be accessed from coroutine or callback running inside of loop.
+        """
+        loop = asyncio.get_event_loop()
+        if self._async_pid != os.getpid() or self._async_loop is not loop:
+            self._create_async_pool(loop)
+        return self._async_client
+
+    async def aclose(self):
+        """
+        Disconnects all connections in async pool of current process.
+
+        Disconnecting is shielded from cancellation, so connections are closed
+        cleanly even if task awaiting this is cancelled during shutdown.
+        """
+        pool = self._async_pool if self._async_pid == os.getpid() else None
+        self._async_pid = self._async_loop = None
+        self._async_pool = self._async_client = None
+
+        if pool is not None:
+            await asyncio.shield(pool.disconnect())
+
+    @property
+    def has_async_pool(self) -> bool:
+        """``True`` if current process had created async connection pool."""
+        return self._async_pool is not None and self._async_pid == os.getpid()
+
+    def stats(self) -> dict:
+        """Connection pool usage and wait-for-connection times (in seconds)."""
+        pool = self._pool if self._pid == os.getpid() else None
+        if pool is None:
+            return {}
+
+        return {
+            "max_connections": pool.max_connections,
+            "connections": len(pool._connections),
+            "idle_connections": sum(
+                1 for connection in list(pool.pool.queue) if connection is not None
+            ),
+            "wait_count": pool.wait_count,
+            "wait_time_avg": (
+                pool.wait_time_total / pool.wait_count if pool.wait_count else 0.0
+            ),
+            "wait_time_max": pool.wait_time_max,
+        }
+
+    def close(self):
+        """Disconnects all connections in pool of current process."""
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.disconnect()
+        self._pool = None
+        self._client = None
+        self._pid = None
+
+    def _create_pool(self):
+        config = dict(self.config)
+        max_connections = config.pop("max_connections")
+        pool_timeout = config.pop("pool_timeout")
+
+        # Connections inherited from parent process belong to it, we just forget
+        # about them
+        self._pool = _InstrumentedConnectionPool(
+            max_connections=max_connections, timeout=pool_timeout, **config
+        )
+        self._client = redis.Redis(connection_pool=self._pool)
+        self._pid = os.getpid()
+
+        logger.debug(
+            "Created Redis connection pool for %s:%s/%s (pid: %d)",
+            config.get("host"),
+            config.get("port"),
+            config.get("db"),
+            self._pid,
+        )
+
+    def _create_async_pool(self, loop):
+        config = dict(self.config)
+        max_connections = config.pop("max_connections")
+        pool_timeout = config.pop("pool_timeout")
+
+        self._async_pool = redis.asyncio.BlockingConnectionPool(
+            max_connections=max_connections, timeout=pool_timeout, **config
+        )
+        self._async_client = redis.asyncio.Redis(connection_pool=self._async_pool)
+        self._async_pid = os.getpid()
+        self._async_loop = loop
+
+        logger.debug(
+            "Created async Redis connection pool for %s:%s/%s (pid: %d)",
+            config.get("host"),
+            config.get("port"),
+            config.get("db"),
+            self._async_pid,
+        )
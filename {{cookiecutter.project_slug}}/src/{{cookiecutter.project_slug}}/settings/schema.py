@@ -0,0 +1,314 @@
+"""
+Declarative schema of app config.
+
+Schema is tree of `Section` (YAML mapping) and `Field` (single value)
+declarations. It is compiled once, on first use, into chain of closures that
+validate whole config in single pass: values are coerced to declared types
+and all errors are collected, so they can be reported together.
+
+Each validated section is also returned as typed, immutable object
+(`collections.namedtuple` generated from `Section` declaration) in which
+missing values are filled in with defaults:
+
+.. code-block:: python
+
+    typed, normalized, errors = APP_CONFIG_SCHEMA.validate(app_config)
+    typed.redis.client.port  # int, even if it was quoted in YAML
+"""
+
+from collections import namedtuple
+from typing import Dict
+
+#: Default of `Field` that must always be present in config
+REQUIRED = object()
+
+_MISSING = object()
+
+_TRUE_STRINGS = frozenset(["true", "yes", "on", "1"])
+_FALSE_STRINGS = frozenset(["false", "no", "off", "0"])
+
+
+def _coerce_int(value) -> int:
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise TypeError(value)
+
+
+def _coerce_float(value) -> float:
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return float(value.strip())
+    raise TypeError(value)
+
+
+def _coerce_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_STRINGS:
+            return True
+        if lowered in _FALSE_STRINGS:
+            return False
+    raise ValueError(value)
+
+
+def _coerce_str(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(value)
+
+
+#: Supported `Field` types and functions that coerce values to them
+COERCIONS = {
+    int: _coerce_int,
+    float: _coerce_float,
+    bool: _coerce_bool,
+    str: _coerce_str,
+}
+
+
+class Field:
+    """
+    Declares single config value.
+
+    Arguments:
+        type: one of `COERCIONS` keys
+        default: value used when key is missing, `REQUIRED` if it must be given
+        min_value: smallest allowed value (inclusive)
+        max_value: largest allowed value (inclusive)
+        choices: allowed values
+        nullable: if ``null`` is allowed
+    """
+
+    def __init__(
+        self,
+        type,
+        default=REQUIRED,
+        min_value=None,
+        max_value=None,
+        choices=None,
+        nullable: bool = False,
+    ):
+        if type not in COERCIONS:
+            raise ValueError("Unsupported field type {!r}".format(type))
+        self.type = type
+        self.default = default
+        self.min_value = min_value
+        self.max_value = max_value
+        self.choices = frozenset(choices) if choices is not None else None
+        self.nullable = nullable
+
+    def compile(self):
+        """
+        Returns:
+            ``validate(value, dotted_key, errors) -> (typed, normalized)``
+        """
+        coerce = COERCIONS[self.type]
+        type_name = self.type.__name__
+        default, nullable = self.default, self.nullable
+        min_value, max_value, choices = self.min_value, self.max_value, self.choices
+
+        def validate(value, dotted_key, errors):
+            if value is _MISSING:
+                if default is REQUIRED:
+                    errors[dotted_key] = "Is required"
+                return default, default
+
+            if value is None and nullable:
+                return None, None
+
+            try:
+                value = coerce(value)
+            except (TypeError, ValueError):
+                errors[dotted_key] = "Expected {}, got {!r}".format(type_name, value)
+                return None, value
+
+            if min_value is not None and value < min_value:
+                errors[dotted_key] = "Must be >= {}, got {!r}".format(min_value, value)
+            elif max_value is not None and value > max_value:
+                errors[dotted_key] = "Must be <= {}, got {!r}".format(max_value, value)
+            elif choices is not None and value not in choices:
+                errors[dotted_key] = "Must be one of {}, got {!r}".format(
+                    sorted(choices), value
+                )
+
+            return value, value
+
+        return validate
+
+
+class Section:
+    """
+    Declares config section (YAML mapping).
+
+    Arguments:
+        name: name of generated typed section class
+        fields: key -> `Field` or nested `Section`
+        strict: if ``True``, keys not declared in ``fields`` are errors. Otherwise
+            they are kept in normalized config as they are, but are not part of
+            typed section object.
+    """
+
+    def __init__(self, name: str, fields: Dict[str, object], strict: bool = True):
+        self.name = name
+        self.fields = dict(fields)
+        self.strict = strict
+        self.typed_class = namedtuple(name, list(self.fields))
+        self._compiled = None
+
+    def compile(self):
+        """
+        Returns:
+            ``validate(value, dotted_key, errors) -> (typed, normalized)``
+        """
+        compiled_fields = [
+            (key, field.compile()) for key, field in self.fields.items()
+        ]
+        declared = frozenset(self.fields)
+        typed_class, strict = self.typed_class, self.strict
+
+        def validate(value, dotted_key, errors):
+            if value is _MISSING or value is None:
+                value = {}
+            elif not isinstance(value, dict):
+                errors[dotted_key or "app_config"] = (
+                    "Expected mapping, got {!r}".format(value)
+                )
+                value = {}
+
+            prefix = dotted_key + "." if dotted_key else ""
+            typed_values = []
+            normalized = dict(value)
+            for key, validate_field in compiled_fields:
+                raw = value.get(key, _MISSING)
+                typed_value, normalized_value = validate_field(
+                    raw, prefix + key, errors
+                )
+                typed_values.append(typed_value)
+                if raw is not _MISSING:
+                    normalized[key] = normalized_value
+
+            if strict:
+                for key in value:
+                    if key not in declared:
+                        errors[prefix + str(key)] = "Unknown key"
+
+            return typed_class(*typed_values), normalized
+
+        return validate
+
+    def validate(self, data: dict):
+        """
+        Validates ``data`` in single pass, compiling schema on first call.
+
+        Returns:
+            tuple ``(typed, normalized, errors)``: typed section object (with
+            defaults filled in), copy of ``data`` with coerced values (without
+            defaults) and `dict` mapping dotted keys to error messages
+        """
+        if self._compiled is None:
+            self._compiled = self.compile()
+
+        errors = {}
+        typed, normalized = self._compiled(data, "", errors)
+        return typed, normalized, errors
+
+
+#: Schema of app config sections used by app itself. Unknown top level
+#: sections are allowed, so app can add its own without declaring them here.
+APP_CONFIG_SCHEMA = Section(
+    "AppConfig",
+    {
+        "tmp_dir_path": Field(str, default=""),
+        "redis": Section(
+            "RedisConfig",
+            {
+                "client": Section(
+                    "RedisClientConfig",
+                    {
+                        "host": Field(str, default="127.0.0.1"),
+                        "port": Field(int, default=6379, min_value=1, max_value=65535),
+                        "db": Field(int, default=0, min_value=0),
+                        "max_connections": Field(int, default=50, min_value=1),
+                        "pool_timeout": Field(float, default=5, min_value=0),
+                        "socket_keepalive": Field(bool, default=True),
+                        "health_check_interval": Field(float, default=30, min_value=0),
+                    },
+                    # Any other redis.Connection argument is allowed
+                    strict=False,
+                ),
+                "streams": Section(
+                    "RedisStreamsConfig",
+                    {
+                        "batch_size": Field(int, default=100, min_value=1),
+                        "block_ms": Field(int, default=5000, min_value=0),
+                        "claim_min_idle_ms": Field(int, default=60000, min_value=0),
+                        "claim_interval": Field(float, default=30, min_value=0),
+                    },
+                ),
+            },
+        ),
+        "executor": Section(
+            "ExecutorConfig",
+            {
+                "pool_size": Field(int, default=4, min_value=1),
+                "queue_size": Field(int, default=100, min_value=1),
+                "task_timeout": Field(float, default=0, min_value=0),
+                "shutdown_timeout": Field(float, default=30, min_value=0),
+            },
+        ),
+        "scratch": Section(
+            "ScratchConfig",
+            {
+                "quota_bytes": Field(int, default=0, min_value=0),
+                "min_free_bytes": Field(int, default=0, min_value=0),
+                "tmpfs_path": Field(str, default=""),
+                "tmpfs_quota_bytes": Field(int, default=64 * 1024 * 1024, min_value=0),
+                "tmpfs_max_file_size": Field(int, default=1024 * 1024, min_value=0),
+                "stale_after": Field(float, default=3600, min_value=0),
+                "cleanup_interval": Field(float, default=3600, min_value=0),
+            },
+        ),
+        "cache": Section(
+            "CacheConfig",
+            {
+                "path": Field(str, default=""),
+                "max_bytes": Field(int, default=1024 * 1024 * 1024, min_value=0),
+                "low_watermark": Field(float, default=0.9, min_value=0, max_value=1),
+            },
+        ),
+        "metrics": Section(
+            "MetricsConfig",
+            {
+                "listen": Field(str, default=""),
+                "namespace": Field(str, default=""),
+                "publish_interval": Field(float, default=1, min_value=0.01),
+                "slot_size": Field(int, default=1024 * 1024, min_value=4096),
+            },
+        ),
+        "profiler": Section(
+            "ProfilerConfig",
+            {
+                "output_path": Field(str, default=""),
+                "interval": Field(float, default=0.01, min_value=0.001),
+                "max_duration": Field(float, default=600, min_value=0),
+                "max_depth": Field(int, default=100, min_value=1),
+            },
+        ),
+    },
+    strict=False,
+)
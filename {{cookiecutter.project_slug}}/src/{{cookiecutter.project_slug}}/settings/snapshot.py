@@ -0,0 +1,150 @@
+"""
+Immutable, precomputed view of loaded settings for reading them on hot paths.
+"""
+
+from collections.abc import Mapping
+
+_get_attribute = object.__getattribute__
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return ConfigSection(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _index(section: "ConfigSection", prefix: str, index: dict):
+    for key, value in section.items():
+        dotted_key = prefix + str(key)
+        index[dotted_key] = value
+        if isinstance(value, ConfigSection):
+            _index(value, dotted_key + ".", index)
+
+
+class ConfigSection(Mapping):
+    """
+    Read-only section of app config (YAML mapping) that, besides being
+    `Mapping`, gives attribute style access to its keys:
+
+    .. code-block:: python
+
+        settings.snapshot().app_config.redis.client.host
+
+    Nested mappings are `ConfigSection` too and lists are converted to tuples.
+    Keys that clash with names of `Mapping` methods (ie. ``items``) are only
+    accessible as items.
+    """
+
+    __slots__ = ("_values", "__dict__")
+
+    def __init__(self, values: dict):
+        values = {key: _freeze(value) for key, value in values.items()}
+        object.__setattr__(self, "_values", values)
+
+        # Keys are stored as plain instance attributes, so attribute access is
+        # regular (C level) lookup, without any Python code being called
+        for key, value in values.items():
+            if isinstance(key, str) and key not in _RESERVED_NAMES:
+                object.__setattr__(self, key, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read-only".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is read-only".format(type(self).__name__))
+
+    def __getitem__(self, key):
+        return _get_attribute(self, "_values")[key]
+
+    def __iter__(self):
+        return iter(_get_attribute(self, "_values"))
+
+    def __len__(self):
+        return len(_get_attribute(self, "_values"))
+
+    def __repr__(self):
+        return "{}({!r})".format(
+            type(self).__name__, _get_attribute(self, "_values")
+        )
+
+
+_RESERVED_NAMES = frozenset(dir(ConfigSection))
+
+
+class SettingsSnapshot:
+    """
+    Immutable snapshot of resolved settings, for reading them on hot paths.
+
+    Values that `.ExternalConfigLoader` computes on each access (ie.
+    `.ExternalConfigLoader.instance_tmp_dir_path`) are computed once, when
+    snapshot is taken, and all values of ``app_config`` are indexed by their
+    dotted keys (which is the fastest way to read them):
+
+    .. code-block:: python
+
+        snapshot = settings.snapshot()
+        snapshot.instance_tmp_dir_path
+        snapshot["redis.client.host"]
+        snapshot.app_config.redis.client.host
+        snapshot.typed_app_config.redis.client.port
+
+    Current snapshot is returned by `.settings.snapshot`. It is replaced by new
+    one whenever settings change (config reload, worker fork), so it shouldn't
+    be stored for long.
+
+    Arguments:
+        settings: loaded config
+    """
+
+    __slots__ = (
+        "instance_name",
+        "application_instance_uuid",
+        "instance_tmp_dir_path",
+        "filelog_abspath",
+        "is_dry_run",
+        "workers_count",
+        "worker_index",
+        "app_config",
+        "typed_app_config",
+        "_index",
+    )
+
+    def __init__(self, settings):
+        app_config = ConfigSection(settings.app_config or {})
+        index = {}
+        _index(app_config, "", index)
+
+        for name, value in (
+            ("instance_name", settings.instance_name),
+            ("application_instance_uuid", settings.APPLICATION_INSTANCE_UUID),
+            ("instance_tmp_dir_path", settings.instance_tmp_dir_path),
+            ("filelog_abspath", settings.filelog_abspath),
+            ("is_dry_run", settings.is_dry_run),
+            ("workers_count", settings.workers_count),
+            ("worker_index", settings.worker_index),
+            ("app_config", app_config),
+            ("typed_app_config", settings.typed_app_config),
+            ("_index", index),
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read-only".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is read-only".format(type(self).__name__))
+
+    def __getitem__(self, dotted_key: str):
+        """Value of ``app_config`` by its dotted key (ie. ``redis.client.host``)."""
+        return self._index[dotted_key]
+
+    def __contains__(self, dotted_key: str) -> bool:
+        return dotted_key in self._index
+
+    def get(self, dotted_key: str, default=None):
+        return self._index.get(dotted_key, default)
+
+    def __repr__(self):
+        return "<{} of {}>".format(type(self).__name__, self.instance_name)
@@ -1,8 +1,8 @@
 import os
 
-from pkg_resources import Requirement, resource_filename
 from seveno_pyutil import is_blank
 
+from .. import resources
 from .external_config_loader import ExternalConfigLoader, ImproperlyConfiguredError
 
 
@@ -44,6 +44,7 @@ class TestConfigLoader(ExternalConfigLoader):
 
     _FORCE_SINGLE_LINE_LOGS = False
     _FORCE_DISABLE_SYSLOG = True
+    _USE_CONFIG_SNAPSHOT = False
 
     @property
     def filelog_abspath(self):
@@ -79,12 +80,7 @@ class TestConfigLoader(ExternalConfigLoader):
         if self._IS_RUNNING_FROM_SOURCE:
             return [os.path.join(self._REPO_ROOT, "config", "logging_config.json")]
         else:
-            return [
-                resource_filename(
-                    Requirement.parse("{{cookiecutter.project_slug}}"),
-                    "{{cookiecutter.project_slug}}/resources/logging_config.json",
-                )
-            ]
+            return [resources.resource_path("logging_config.json")]
 
     @property
     def config_file_abspaths(self):
@@ -101,9 +97,4 @@ class TestConfigLoader(ExternalConfigLoader):
         if self._IS_RUNNING_FROM_SOURCE:
             return [os.path.join(self._REPO_ROOT, "config", "test.yaml")]
         else:
-            return [
-                resource_filename(
-                    Requirement.parse("{{cookiecutter.project_slug}}"),
-                    "{{cookiecutter.project_slug}}/resources/test.yaml",
-                )
-            ]
+            return [resources.resource_path("test.yaml")]
@@ -0,0 +1,214 @@
+"""
+Redis Streams consumer group engine.
+"""
+
+import asyncio
+import logging
+import time
+
+import redis
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+
+def default_consumer_name() -> str:
+    """
+    Consumer name unique to this app instance (and worker process, if running
+    prefork workers).
+    """
+    snapshot = settings.snapshot()
+    retv = "{}-{}".format(
+        snapshot.instance_name, snapshot.application_instance_uuid.hex
+    )
+    if snapshot.worker_index is not None:
+        retv += "-{}".format(snapshot.worker_index)
+    return retv
+
+
+def _decode(message_id) -> str:
+    return message_id.decode() if isinstance(message_id, bytes) else message_id
+
+
+class StreamConsumer:
+    """
+    Consumes messages from Redis Stream as member of consumer group.
+
+    Messages are read in batches of up to ``batch_size`` (``XREADGROUP``),
+    blocking for up to ``block_ms`` when stream is empty. Each batch is handed to
+    ``handler`` in one call and acknowledged with single ``XACK`` command for all
+    of its IDs, so Redis round trips are per batch, not per message.
+
+    ``handler`` is coroutine function receiving list of ``(message_id, fields)``
+    tuples. If it returns ``None``, whole batch is acknowledged. Otherwise it
+    should return IDs of messages that were processed and only those are
+    acknowledged. If it raises, nothing is acknowledged.
+
+    Messages that stay unacknowledged (ie. consumer that read them had crashed)
+    for longer than ``claim_min_idle_ms`` are periodically reclaimed by this
+    consumer (``XAUTOCLAIM``) and processed again.
+
+    Consumer is run as task in application server loop:
+
+    .. code-block:: python
+
+        def before_startup(self):
+            consumer = StreamConsumer(
+                REDIS_ASYNC, "jobs", "workers", self.handle_jobs,
+                **SETTINGS["redis"].get("streams", {})
+            )
+            self.reactor.spawn(consumer.run())
+
+    Arguments:
+        client: `redis.asyncio.Redis` client
+        stream: stream key
+        group: consumer group name, created if it doesn't exist
+        handler: coroutine function processing batches of messages
+        consumer_name: defaults to `default_consumer_name`
+        batch_size: max number of messages read at once
+        block_ms: max milliseconds to block waiting for new messages
+        claim_min_idle_ms: pending messages idle for longer than this are
+            reclaimed, ``0`` disables reclaiming
+        claim_interval: seconds between two reclaims
+    """
+
+    #: Max number of ``XAUTOCLAIM`` calls done by single `.reclaim`
+    MAX_RECLAIM_ROUNDS = 100
+
+    def __init__(
+        self,
+        client,
+        stream: str,
+        group: str,
+        handler,
+        consumer_name: str = None,
+        batch_size: int = 100,
+        block_ms: int = 5000,
+        claim_min_idle_ms: int = 60000,
+        claim_interval: float = 30,
+    ):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.handler = handler
+        self.consumer_name = consumer_name or default_consumer_name()
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_min_idle_ms = claim_min_idle_ms
+        self.claim_interval = claim_interval
+
+        self.stats = {"read": 0, "acked": 0, "failed": 0, "reclaimed": 0, "batches": 0}
+        self._next_claim_at = 0
+
+    async def run(self):
+        """Consumes stream until cancelled."""
+        await self.ensure_group()
+
+        logger.info(
+            "Consuming stream '%s' as '%s' in group '%s'...",
+            self.stream,
+            self.consumer_name,
+            self.group,
+        )
+
+        while True:
+            try:
+                if self.claim_min_idle_ms and time.monotonic() >= self._next_claim_at:
+                    await self.reclaim()
+                    self._next_claim_at = time.monotonic() + self.claim_interval
+
+                await self.consume_batch()
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError:
+                logger.exception("Failed reading from stream '%s'!", self.stream)
+                await asyncio.sleep(1)
+
+    async def ensure_group(self):
+        """Creates consumer group (and stream) if they don't exist."""
+        try:
+            await self.client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except redis.ResponseError as exception:
+            if "BUSYGROUP" not in str(exception):
+                raise
+
+    async def consume_batch(self) -> int:
+        """Reads, handles and acknowledges single batch of new messages."""
+        response = await self.client.xreadgroup(
+            self.group,
+            self.consumer_name,
+            {self.stream: ">"},
+            count=self.batch_size,
+            block=self.block_ms,
+        )
+        if not response:
+            return 0
+
+        messages = response[0][1]
+        self.stats["read"] += len(messages)
+        return await self._process(messages)
+
+    async def reclaim(self) -> int:
+        """Claims and processes messages abandoned by other consumers."""
+        retv = 0
+        start_id = "0-0"
+
+        for _ in range(self.MAX_RECLAIM_ROUNDS):
+            response = await self.client.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer_name,
+                min_idle_time=self.claim_min_idle_ms,
+                start_id=start_id,
+                count=self.batch_size,
+            )
+            previous_id = start_id
+            start_id, claimed = response[0], response[1]
+            # Deleted messages are returned as ``(id, None)``
+            messages = [message for message in claimed if message[1] is not None]
+
+            if messages:
+                self.stats["reclaimed"] += len(messages)
+                retv += await self._process(messages)
+
+            # Cursor that doesn't move forward would make us loop forever
+            if (
+                not claimed
+                or start_id in (b"0-0", "0-0")
+                or _decode(start_id) == _decode(previous_id)
+            ):
+                break
+
+        return retv
+
+    async def _process(self, messages) -> int:
+        self.stats["batches"] += 1
+
+        try:
+            processed = await self.handler(messages)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["failed"] += len(messages)
+            logger.exception(
+                "Failed handling batch of %d messages from '%s'!",
+                len(messages),
+                self.stream,
+            )
+            return 0
+
+        ids = (
+            [message_id for message_id, _ in messages]
+            if processed is None
+            else list(processed)
+        )
+        self.stats["failed"] += len(messages) - len(ids)
+
+        if ids:
+            await self.client.xack(self.stream, self.group, *ids)
+            self.stats["acked"] += len(ids)
+
+        return len(ids)
@@ -0,0 +1,281 @@
+"""
+Prefork worker processes supervisor.
+"""
+
+import logging
+import os
+import signal
+import time
+
+import prctl
+
+from . import logging_utilities, metrics
+
+logger = logging.getLogger(__name__)
+
+_WORKERS_RUNNING = metrics.gauge("workers_running", "Running worker processes")
+_WORKER_RESPAWNS = metrics.counter(
+    "worker_respawns_total", "Worker processes that exited and were respawned"
+)
+
+
+class Supervisor:
+    """
+    Forks and supervises application server worker processes.
+
+    Supervisor process doesn't run any application code. It forks
+    ``workers_count`` workers, each of which runs full application server
+    (`.Server.startup_worker`), respawns workers that exit unexpectedly and fans
+    out shutdown, reload, reopen logs, profiler and stack dump signals to all of
+    them.
+
+    Supervisor blocks in `signal.sigwaitinfo` for as long as nothing happens,
+    so it doesn't wake up when idle.
+
+    If worker dies sooner than `MIN_UPTIME` seconds after it was started, it
+    is considered crashing and its respawn is delayed by exponential backoff
+    (starting at `RESPAWN_BACKOFF_MIN` and capped at `RESPAWN_BACKOFF_MAX`
+    seconds).
+
+    Arguments:
+        server: application server instance
+        workers_count: number of worker processes to keep running
+        shared_metrics: shared memory workers publish their metrics into, its
+            slots of exited workers are retired
+    """
+
+    #: Signals that make supervisor shut down all workers and then itself
+    SHUTDOWN_SIGNALS = {signal.SIGINT, signal.SIGTERM, signal.SIGQUIT}
+
+    #: Signal that makes supervisor and all workers reload changed config files
+    RELOAD_SIGNAL = signal.SIGHUP
+
+    #: Signal that makes supervisor and all workers reopen their log files
+    REOPEN_LOGS_SIGNAL = signal.SIGUSR1
+
+    #: Signal that starts or stops sampling profiler in all workers
+    PROFILE_SIGNAL = signal.SIGUSR2
+
+    #: Signal that makes all workers dump stacks of their threads
+    DUMP_STACKS_SIGNAL = signal.SIGPWR
+
+    #: Seconds worker must be running to be considered successfully started
+    MIN_UPTIME = 5
+
+    #: Initial respawn delay for crashing worker, in seconds
+    RESPAWN_BACKOFF_MIN = 1
+
+    #: Maximal respawn delay for crashing worker, in seconds
+    RESPAWN_BACKOFF_MAX = 60
+
+    #: Seconds to wait for workers to drain after SIGTERM before they are killed
+    GRACEFUL_TIMEOUT = 30
+
+    def __init__(
+        self, server, workers_count: int, shared_metrics: metrics.SharedMetrics = None
+    ):
+        self.server = server
+        self.workers_count = workers_count
+        self.shared_metrics = shared_metrics
+        self.workers = {}  #: pid -> worker index
+        self._started_at = {}  # worker index -> monotonic time of last fork
+        self._backoff = {}  # worker index -> current respawn delay
+        self._respawn_at = {}  # worker index -> monotonic time of next respawn
+        self._signal_mask = None
+
+    def run(self) -> str:
+        """
+        Starts all workers and supervises them until one of `SHUTDOWN_SIGNALS`
+        is received.
+
+        Returns:
+            name of signal that caused shutdown
+        """
+        watched = self.SHUTDOWN_SIGNALS | {
+            signal.SIGCHLD,
+            self.RELOAD_SIGNAL,
+            self.REOPEN_LOGS_SIGNAL,
+            self.PROFILE_SIGNAL,
+            self.DUMP_STACKS_SIGNAL,
+        }
+        self._signal_mask = signal.pthread_sigmask(signal.SIG_BLOCK, watched)
+
+        try:
+            for index in range(self.workers_count):
+                self._spawn(index)
+
+            while True:
+                info = self._wait_for_signal(watched)
+
+                if info is None:
+                    self._respawn_due()
+
+                elif info.si_signo == signal.SIGCHLD:
+                    self._reap()
+
+                elif info.si_signo == self.RELOAD_SIGNAL:
+                    # Reloaded in supervisor too, so respawned workers start with
+                    # new config
+                    self.server.reload_config()
+                    for pid in list(self.workers):
+                        self._kill(pid, self.RELOAD_SIGNAL)
+
+                elif info.si_signo == self.REOPEN_LOGS_SIGNAL:
+                    logging_utilities.reopen_log_files()
+                    for pid in list(self.workers):
+                        self._kill(pid, self.REOPEN_LOGS_SIGNAL)
+
+                elif info.si_signo in (self.PROFILE_SIGNAL, self.DUMP_STACKS_SIGNAL):
+                    # Only workers run application code worth looking into
+                    for pid in list(self.workers):
+                        self._kill(pid, info.si_signo)
+
+                else:
+                    signame = signal.Signals(info.si_signo).name
+                    self._stop_workers(signame)
+                    return signame
+
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, self._signal_mask)
+
+    def _wait_for_signal(self, watched):
+        if not self._respawn_at:
+            return signal.sigwaitinfo(watched)
+
+        timeout = max(0, min(self._respawn_at.values()) - time.monotonic())
+        return signal.sigtimedwait(watched, timeout)
+
+    def _spawn(self, index: int):
+        self._respawn_at.pop(index, None)
+
+        supervisor_pid = os.getpid()
+        pid = os.fork()
+
+        if pid == 0:
+            exit_code = 1
+            try:
+                # Workers must not outlive supervisor that was killed or crashed
+                prctl.set_pdeathsig(signal.SIGKILL)
+                if os.getppid() != supervisor_pid:
+                    return
+
+                # Relayed signals must not kill worker before it installs its own
+                # handlers for them
+                for signum in (
+                    self.RELOAD_SIGNAL,
+                    self.REOPEN_LOGS_SIGNAL,
+                    self.PROFILE_SIGNAL,
+                    self.DUMP_STACKS_SIGNAL,
+                ):
+                    signal.signal(signum, signal.SIG_IGN)
+                signal.pthread_sigmask(signal.SIG_SETMASK, self._signal_mask)
+                self.server.startup_worker(index)
+                exit_code = 0
+            except SystemExit as exception:
+                exit_code = exception.code if isinstance(exception.code, int) else 1
+            except BaseException:
+                logger.exception("Worker %d crashed!", index)
+            finally:
+                os._exit(exit_code)
+
+        self.workers[pid] = index
+        self._started_at[index] = time.monotonic()
+        _WORKERS_RUNNING.set(len(self.workers))
+        logger.info("Started worker %d (pid: %d)", index, pid)
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+
+            if pid == 0:
+                return
+
+            index = self.workers.pop(pid, None)
+            if index is None:
+                continue
+
+            _WORKERS_RUNNING.set(len(self.workers))
+            _WORKER_RESPAWNS.inc()
+            if self.shared_metrics is not None:
+                self.shared_metrics.retire(index)
+
+            if time.monotonic() - self._started_at[index] < self.MIN_UPTIME:
+                delay = min(
+                    self._backoff.get(index, 0) * 2 or self.RESPAWN_BACKOFF_MIN,
+                    self.RESPAWN_BACKOFF_MAX,
+                )
+            else:
+                delay = 0
+            self._backoff[index] = delay
+
+            logger.warning(
+                "Worker %d (pid: %d) exited with status %d, respawning in %.1fs...",
+                index,
+                pid,
+                status,
+                delay,
+            )
+            self._respawn_at[index] = time.monotonic() + delay
+
+        self._respawn_due()
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        for index, respawn_at in list(self._respawn_at.items()):
+            if respawn_at <= now:
+                self._spawn(index)
+
+    def _stop_workers(self, signame: str):
+        logger.info(
+            "Received %s, stopping %d worker(s)...", signame, len(self.workers)
+        )
+        self._respawn_at.clear()
+
+        for pid in self.workers:
+            self._kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.GRACEFUL_TIMEOUT
+        while self.workers:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            if signal.sigtimedwait({signal.SIGCHLD}, timeout) is not None:
+                self._reap_stopped()
+
+        for pid, index in self.workers.items():
+            logger.warning(
+                "Worker %d (pid: %d) didn't stop in %ds, killing it...",
+                index,
+                pid,
+                self.GRACEFUL_TIMEOUT,
+            )
+            self._kill(pid, signal.SIGKILL)
+
+        while self.workers:
+            self._reap_stopped(block=True)
+
+    def _reap_stopped(self, block: bool = False):
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+
+            if pid == 0:
+                return
+
+            self.workers.pop(pid, None)
+
+            if block:
+                return
+
+    def _kill(self, pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
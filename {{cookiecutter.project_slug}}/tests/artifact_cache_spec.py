@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from {{cookiecutter.project_slug}}.artifact_cache import ArtifactCache, file_digest, source_key
+from {{cookiecutter.project_slug}}.settings import APP_CONFIG_SCHEMA
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtifactCache(str(tmp_path / "cache"), max_bytes=1000, low_watermark=0.6)
+
+
+class DescribeArtifactCache:
+    def it_stores_files_under_content_digest(self, cache, tmp_path):
+        source = tmp_path / "source.bin"
+        source.write_bytes(b"foo")
+
+        key = cache.put_file(str(source))
+
+        assert key == file_digest(str(source))
+        assert key in cache
+        with cache.open(key) as f:
+            assert f.read() == b"foo"
+        assert source.exists()
+
+    def it_stores_files_under_source_key(self, cache, tmp_path):
+        source = tmp_path / "download.bin"
+        source.write_bytes(b"bar")
+        key = source_key("https://example.com/download.bin")
+
+        assert cache.get(key) is None
+        cache.put_file(str(source), key=key, move=True)
+
+        assert not source.exists()
+        with open(cache.get(key), "rb") as f:
+            assert f.read() == b"bar"
+
+    def it_tracks_hits_and_misses(self, cache):
+        key = cache.put_bytes(b"foo")
+
+        cache.get(key)
+        cache.get(source_key("missing"))
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+        assert stats["size_bytes"] == 3
+
+    def it_evicts_least_recently_used_files(self, cache):
+        keys = []
+        for index in range(3):
+            keys.append(cache.put_bytes(bytes([index]) * 300))
+            os.utime(cache.path(keys[-1]), (index, index))
+
+        # Hit makes first file the most recently used one
+        cache.get(keys[0])
+        cache.put_bytes(b"x" * 300)
+
+        assert keys[0] in cache
+        assert keys[1] not in cache
+        assert keys[2] not in cache
+        assert cache.stats()["evictions"] == 2
+        assert cache.stats()["size_bytes"] == 600
+
+    def it_leaves_no_temporary_files_behind(self, cache, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            cache.put_file(str(tmp_path / "missing"), key=source_key("missing"))
+
+        assert os.listdir(os.path.join(cache.root_path, "tmp")) == []
+
+    def it_rejects_invalid_keys(self, cache):
+        with pytest.raises(ValueError):
+            cache.get("../../etc/passwd")
+
+    def it_is_shared_with_other_processes(self, cache):
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                textwrap.dedent(
+                    """
+                    import sys
+                    from {{cookiecutter.project_slug}}.artifact_cache import ArtifactCache
+                    ArtifactCache(sys.argv[1]).put_bytes(b"shared")
+                    """
+                ),
+                cache.root_path,
+            ],
+            check=True,
+        )
+
+        assert ArtifactCache(cache.root_path).stats()["size_bytes"] == 6
+
+    def it_limits_size_of_cache_written_by_many_processes(self, cache):
+        other = ArtifactCache(cache.root_path, max_bytes=1000, low_watermark=0.6)
+
+        for index, writer in enumerate([cache, other, cache, other]):
+            writer.put_bytes(bytes([index]) * 300)
+
+        assert cache.stats()["evictions"] + other.stats()["evictions"] == 2
+        assert cache.stats()["size_bytes"] == other.stats()["size_bytes"] == 600
+
+    def it_is_created_from_config(self, tmp_path):
+        typed, _, _ = APP_CONFIG_SCHEMA.validate({"cache": {"max_bytes": "100"}})
+
+        cache = ArtifactCache.from_config(typed.cache, str(tmp_path))
+
+        assert cache.root_path == str(tmp_path)
+        assert cache.max_bytes == 100
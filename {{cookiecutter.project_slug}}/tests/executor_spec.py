@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from {{cookiecutter.project_slug}}.executor import ExecutorFullError, JobExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor(pool_size=2, queue_size=2)
+    yield executor
+    executor.shutdown(wait=True, timeout=5)
+
+
+class DescribeJobExecutor:
+    def it_runs_submitted_jobs(self, executor):
+        futures = [executor.submit(pow, 2, i) for i in range(5)]
+
+        assert [future.result(timeout=5) for future in futures] == [1, 2, 4, 8, 16]
+
+        stats = executor.stats()
+        assert stats["submitted"] == 5
+        assert stats["completed"] == 5
+        assert stats["queue_depth"] == 0
+
+    def it_propagates_job_exceptions(self, executor):
+        future = executor.submit(int, "not a number")
+
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+
+        assert executor.stats()["failed"] == 1
+
+    def it_rejects_jobs_when_queue_is_full(self, executor):
+        release = threading.Event()
+
+        # Two jobs occupy both threads and two more fill the queue
+        for _ in range(4):
+            executor.submit(release.wait)
+
+        try:
+            with pytest.raises(ExecutorFullError):
+                executor.submit_with(release.wait, block=False)
+
+            with pytest.raises(ExecutorFullError):
+                executor.submit_with(release.wait, queue_timeout=0.01)
+
+            assert executor.stats()["rejected"] == 2
+            assert executor.stats()["queue_depth"] == 2
+
+        finally:
+            release.set()
+
+    def it_times_out_jobs(self, executor):
+        release = threading.Event()
+
+        future = executor.submit_with(release.wait, task_timeout=0.05)
+
+        try:
+            with pytest.raises(TimeoutError):
+                future.result(timeout=5)
+            assert executor.stats()["timed_out"] == 1
+        finally:
+            release.set()
+
+        executor.shutdown(wait=True, timeout=5)
+        stats = executor.stats()
+        assert (stats["timed_out"], stats["completed"], stats["running"]) == (1, 0, 0)
+
+    def it_passes_all_keyword_arguments_to_jobs(self, executor):
+        def job(block, timeout, task_timeout):
+            return block, timeout, task_timeout
+
+        future = executor.submit(job, block=False, timeout=5, task_timeout=0.01)
+
+        assert future.result(timeout=5) == (False, 5, 0.01)
+
+    def it_lets_done_callbacks_of_timed_out_jobs_submit_jobs(self):
+        executor = JobExecutor(pool_size=1, queue_size=10, task_timeout=0.2)
+        release = threading.Event()
+        submitted = []
+        resubmitted = threading.Event()
+
+        def resubmit(future):
+            submitted.append(executor.submit_with(pow, (2, 3), task_timeout=0))
+            resubmitted.set()
+
+        try:
+            future = executor.submit(release.wait)
+            future.add_done_callback(resubmit)
+
+            with pytest.raises(TimeoutError):
+                future.result(timeout=5)
+            assert resubmitted.wait(timeout=5)
+            release.set()
+
+            assert submitted[0].result(timeout=5) == 8
+            assert executor.stats()["timed_out"] == 1
+        finally:
+            release.set()
+            executor.shutdown(wait=True, timeout=5)
+
+    def it_drains_queue_on_shutdown(self):
+        executor = JobExecutor(pool_size=1, queue_size=10)
+        results = []
+
+        for i in range(5):
+            executor.submit(results.append, i)
+        executor.shutdown(wait=True, timeout=5)
+
+        assert results == [0, 1, 2, 3, 4]
+
+        with pytest.raises(RuntimeError):
+            executor.submit(results.append, 5)
+
+    def it_cancels_queued_jobs_when_drain_times_out(self):
+        executor = JobExecutor(pool_size=1, queue_size=1)
+        release = threading.Event()
+
+        try:
+            hung = executor.submit(release.wait)
+            queued = executor.submit(pow, 2, 3)
+            with pytest.raises(ExecutorFullError):
+                executor.submit_with(pow, (2, 4), block=False)
+
+            started_at = time.monotonic()
+            executor.shutdown(wait=True, timeout=0.2)
+
+            assert time.monotonic() - started_at < 5
+            assert queued.cancelled()
+            assert not hung.done()
+            assert executor.stats()["cancelled"] == 1
+        finally:
+            release.set()
+
+        assert hung.result(timeout=5) is True
@@ -0,0 +1,641 @@
+import array
+import gc
+import gzip
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+import pytest
+
+from {{cookiecutter.project_slug}}.logging_utilities import (CompressingRotatingFileHandler, JournaldHandler,
+                                       QueueHandler, QueueListener,
+                                       ReopeningFileHandler, RepeatFilter,
+                                       SamplingFilter, SingleLineColoredFormatter,
+                                       SingleLineFormatter, StandardMetadataFilter,
+                                       filters, flush_repeat_filters, handlers,
+                                       log_compressor, reopen_log_files,
+                                       resolve_queue_handlers_targets, rotating)
+from {{cookiecutter.project_slug}}.settings import ExternalConfigLoader
+
+
+class _BlockingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.started.set()
+        self.release.wait(5)
+        self.records.append(record.getMessage())
+
+
+def _record(message, level=logging.INFO):
+    return logging.LogRecord("foo", level, __file__, 1, message, None, None)
+
+
+class DescribeQueueListener:
+    def it_passes_records_to_handlers_from_background_thread(self):
+        handler = _BlockingHandler()
+        handler.release.set()
+        listener = QueueListener()
+        listener.start()
+
+        listener.put([handler], _record("foo"))
+        listener.put([handler], _record("bar"))
+        listener.stop()
+
+        assert handler.records == ["foo", "bar"]
+        assert listener.stats()["enqueued"] == 2
+
+    def it_respects_handlers_levels(self):
+        handler = _BlockingHandler()
+        handler.release.set()
+        handler.setLevel(logging.WARNING)
+        listener = QueueListener()
+
+        listener.put([handler], _record("foo", logging.INFO))
+        listener.put([handler], _record("bar", logging.ERROR))
+
+        assert handler.records == ["bar"]
+
+    def it_drops_records_when_queue_is_full(self):
+        handler = _BlockingHandler()
+        listener = QueueListener(maxsize=1, overflow="drop")
+        listener.start()
+
+        listener.put([handler], _record("taken by listener thread"))
+        handler.started.wait(5)
+        listener.put([handler], _record("waits in queue"))
+        listener.put([handler], _record("dropped"))
+
+        handler.release.set()
+        listener.stop()
+
+        assert handler.records == ["taken by listener thread", "waits in queue"]
+        assert listener.stats()["dropped"] == 1
+
+    def it_handles_records_synchronously_after_it_was_stopped(self):
+        handler = _BlockingHandler()
+        handler.release.set()
+        listener = QueueListener()
+        listener.start()
+        listener.stop()
+
+        listener.put([handler], _record("foo"))
+
+        assert handler.records == ["foo"]
+
+
+class DescribeQueueHandler:
+    def it_keeps_resolved_targets_alive(self):
+        target = _BlockingHandler()
+        target.set_name("queue_spec_target")
+        queue_handler = QueueHandler(["queue_spec_target"])
+        queue_handler.set_name("queue_spec")
+
+        # Like dictConfig, which keeps configured handlers in reference cycle
+        cycle = {"target": target}
+        cycle["cycle"] = cycle
+        del target, cycle
+
+        resolve_queue_handlers_targets()
+        gc.collect()
+
+        try:
+            assert [handler.name for handler in queue_handler.targets] == [
+                "queue_spec_target"
+            ]
+        finally:
+            for handler in queue_handler.targets + [queue_handler]:
+                handler.close()
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class DescribeReopeningFileHandler:
+    def it_reopens_file_moved_away_by_logrotate(self, tmp_path):
+        path = tmp_path / "app.log"
+        handler = ReopeningFileHandler(str(path))
+        assert not handler.is_polling
+
+        handler.handle(_record("foo"))
+        os.rename(str(path), str(tmp_path / "app.log.1"))
+        assert _wait_for(lambda: handler._reopen_needed)
+        handler.handle(_record("bar"))
+        handler.close()
+
+        assert (tmp_path / "app.log.1").read_text() == "foo\n"
+        assert path.read_text() == "bar\n"
+
+    def it_reopens_deleted_file(self, tmp_path):
+        path = tmp_path / "app.log"
+        handler = ReopeningFileHandler(str(path))
+
+        handler.handle(_record("foo"))
+        os.unlink(str(path))
+        assert _wait_for(lambda: handler._reopen_needed)
+        handler.handle(_record("bar"))
+        handler.close()
+
+        assert path.read_text() == "bar\n"
+
+    def it_polls_file_when_inotify_is_not_available(self, tmp_path, mocker):
+        mocker.patch.object(handlers, "_WATCHER", False)
+        path = tmp_path / "app.log"
+        handler = ReopeningFileHandler(str(path), poll_interval=0.01)
+        assert handler.is_polling
+
+        handler.handle(_record("foo"))
+        os.rename(str(path), str(tmp_path / "app.log.1"))
+        handler.handle(_record("not noticed yet"))
+        time.sleep(0.02)
+        handler.handle(_record("bar"))
+        handler.close()
+
+        assert (tmp_path / "app.log.1").read_text() == "foo\nnot noticed yet\n"
+        assert path.read_text() == "bar\n"
+
+    def it_reopens_all_files_on_request(self, tmp_path, mocker):
+        mocker.patch.object(handlers, "_WATCHER", False)
+        path = tmp_path / "app.log"
+        handler = ReopeningFileHandler(str(path), poll_interval=0)
+
+        handler.handle(_record("foo"))
+        os.rename(str(path), str(tmp_path / "app.log.1"))
+        reopen_log_files()
+        handler.handle(_record("bar"))
+        handler.close()
+
+        assert path.read_text() == "bar\n"
+
+
+class DescribeCompressingRotatingFileHandler:
+    def it_rotates_by_size_and_keeps_last_segments(self, tmp_path):
+        path = tmp_path / "app.log"
+        handler = CompressingRotatingFileHandler(
+            str(path), max_bytes=100, backup_count=2
+        )
+
+        for i in range(20):
+            handler.handle(_record("message {:02d} padded to some length".format(i)))
+        log_compressor().join()
+        handler.close()
+
+        segments = handler.segments()
+        assert len(segments) == 2
+        assert all(segment.endswith(".gz") for segment in segments)
+        with gzip.open(segments[-1], "rt") as f:
+            last_segment = f.read()
+        assert last_segment.startswith("message ")
+        assert "message 19" in path.read_text()
+
+    def it_rotates_by_time(self, tmp_path):
+        path = tmp_path / "app.log"
+        handler = CompressingRotatingFileHandler(
+            str(path), interval=3600, compression=None
+        )
+
+        handler.handle(_record("foo"))
+        record = _record("bar")
+        record.created += 3600
+        handler.handle(record)
+        log_compressor().join()
+        handler.close()
+
+        segments = handler.segments()
+        assert len(segments) == 1
+        assert open(segments[0]).read() == "foo\n"
+        assert path.read_text() == "bar\n"
+
+    def it_reopens_file_rotated_by_another_process(self, tmp_path, mocker):
+        mocker.patch.object(handlers, "_WATCHER", False)
+        path = tmp_path / "app.log"
+        first, second = [
+            CompressingRotatingFileHandler(
+                str(path), max_bytes=1, poll_interval=0, compression=None
+            )
+            for _ in range(2)
+        ]
+
+        first.handle(_record("foo"))
+        second.handle(_record("bar"))
+        first.handle(_record("baz"))
+        second.handle(_record("qux"))
+        log_compressor().join()
+        first.close()
+        second.close()
+
+        segments = first.segments()
+        assert len(segments) == 1
+        assert open(segments[0]).read() == "foo\nbar\n"
+        assert path.read_text() == "baz\nqux\n"
+
+    def it_compresses_segments_left_uncompressed(self, tmp_path):
+        path = tmp_path / "app.log"
+        (tmp_path / "app.log.20200101-000000").write_text("foo\n")
+
+        handler = CompressingRotatingFileHandler(str(path))
+        log_compressor().join()
+        handler.close()
+
+        assert handler.segments() == [str(tmp_path / "app.log.20200101-000000.gz")]
+
+    def it_finds_native_thread_id_without_threading_support(self, monkeypatch):
+        expected = threading.get_native_id()
+        monkeypatch.delattr(threading, "get_native_id")
+
+        assert rotating._native_thread_id() == expected
+
+
+class DescribeStandardMetadataFilter:
+    def it_enriches_record_once(self, mocker):
+        record = _record("foo")
+        metadata_filter = StandardMetadataFilter()
+
+        assert metadata_filter.filter(record)
+        assert record.hostname == StandardMetadataFilter.HOSTNAME
+        assert record.isotime_utc.endswith("+00:00")
+
+        datetime = mocker.patch.object(filters, "datetime")
+        assert StandardMetadataFilter().filter(record)
+        assert not datetime.fromtimestamp.called
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+
+class DescribeSamplingFilter:
+    def it_samples_one_in_n_records_of_each_call_site(self):
+        sampling = SamplingFilter(every=3)
+        other_site = _record("bar")
+        other_site.lineno = 2
+
+        passed = [sampling.filter(_record("foo")) for _ in range(7)]
+
+        assert passed == [True, False, False, True, False, False, True]
+        assert sampling.filter(other_site)
+        assert sampling.stats()["suppressed"] == 4
+        assert sampling.stats()["suppressed_by_site"] == {
+            "{}:1".format(__file__): 4
+        }
+
+    def it_rate_limits_message_templates(self, mocker):
+        now = mocker.patch.object(filters.time, "monotonic", return_value=100.0)
+        sampling = SamplingFilter(rate=2)
+
+        assert [sampling.filter(_record("foo")) for _ in range(3)] == [
+            True,
+            True,
+            False,
+        ]
+        assert sampling.filter(_record("bar"))
+
+        now.return_value = 100.5
+        assert sampling.filter(_record("foo"))
+        assert not sampling.filter(_record("foo"))
+
+    def it_never_suppresses_records_above_max_level(self):
+        sampling = SamplingFilter(every=100, max_level="INFO")
+
+        assert all(
+            sampling.filter(_record("foo", logging.WARNING)) for _ in range(10)
+        )
+
+
+class DescribeRepeatFilter:
+    def it_collapses_repeated_messages(self):
+        logger = logging.getLogger("repeat_filter_spec")
+        logger.propagate = False
+        handler = _ListHandler()
+        repeats = RepeatFilter()
+        handler.addFilter(repeats)
+        logger.addHandler(handler)
+
+        for message in ["foo", "bar", "bar", "bar", "bar", "baz", "baz"]:
+            logger.warning(message)
+
+        assert handler.records == [
+            "foo",
+            "bar",
+            "Last message repeated 3 times",
+            "baz",
+        ]
+        assert repeats.stats() == {
+            "suppressed": 4,
+            "summaries": 1,
+            "pending_repeats": 1,
+        }
+
+    def it_flushes_summary_while_message_keeps_repeating(self):
+        logger = logging.getLogger("repeat_filter_spec.flush")
+        logger.propagate = False
+        handler = _ListHandler()
+        handler.addFilter(RepeatFilter(flush_interval=0))
+        logger.addHandler(handler)
+
+        for _ in range(3):
+            logger.warning("foo")
+
+        assert handler.records == [
+            "foo",
+            "Last message repeated 1 times",
+            "Last message repeated 1 times",
+        ]
+
+    def it_flushes_summary_after_burst_stops(self):
+        logger = logging.getLogger("repeat_filter_spec.burst")
+        logger.propagate = False
+        handler = _ListHandler()
+        handler.addFilter(RepeatFilter(flush_interval=0.05))
+        logger.addHandler(handler)
+
+        for _ in range(3):
+            logger.warning("foo")
+        time.sleep(0.2)
+
+        assert handler.records == ["foo", "Last message repeated 2 times"]
+
+    def it_flushes_pending_summaries_of_configured_handlers(self):
+        logger = logging.getLogger("repeat_filter_spec.shutdown")
+        logger.propagate = False
+        handler = _ListHandler()
+        handler.set_name("repeat_filter_spec")
+        handler.addFilter(RepeatFilter())
+        logger.addHandler(handler)
+
+        try:
+            for _ in range(3):
+                logger.warning("foo")
+            flush_repeat_filters()
+            flush_repeat_filters()
+        finally:
+            handler.close()
+
+        assert handler.records == ["foo", "Last message repeated 2 times"]
+
+
+class DescribeFiltersSharedByHandlers:
+    def it_decides_about_each_record_once(self):
+        logger = logging.getLogger("shared_filters_spec")
+        logger.propagate = False
+        sampling = SamplingFilter(every=2)
+        repeats = RepeatFilter()
+        handlers = [_ListHandler(), _ListHandler()]
+        for handler in handlers:
+            handler.addFilter(sampling)
+            handler.addFilter(repeats)
+            logger.addHandler(handler)
+
+        for message in ["foo", "bar", "bar", "bar", "baz"]:
+            logger.info(message)
+
+        for handler in handlers:
+            assert handler.records == ["foo", "bar", "baz"]
+        assert sampling.stats()["passed"] == 3
+        assert sampling.stats()["suppressed"] == 2
+        assert repeats.stats()["suppressed"] == 0
+
+
+class DescribeSingleLineFormatter:
+    FORMAT = (
+        "%(isotime)s %(hostname)s foo[%(process)d] [%(levelname)-8s] "
+        "%(name)s: %(message)s 100%%"
+    )
+
+    def it_formats_records_like_stdlib_formatter(self):
+        record = logging.LogRecord(
+            "foo", logging.INFO, __file__, 1, "%s is %d%%", ("bar", 42), None
+        )
+        StandardMetadataFilter().filter(record)
+        expected = logging.Formatter(self.FORMAT).format(record)
+
+        assert SingleLineFormatter(self.FORMAT).format(record) == expected
+
+    def it_escapes_new_lines_in_messages_and_exceptions(self):
+        try:
+            raise ValueError("bar\nbaz")
+        except ValueError:
+            record = logging.LogRecord(
+                "foo", logging.ERROR, __file__, 1, "foo\nbar", None, sys.exc_info()
+            )
+
+        line = SingleLineFormatter("%(message)s").format(record)
+
+        assert "\n" not in line
+        assert line.startswith("foo\\nbar\\nTraceback")
+        assert line.endswith("ValueError: bar\\nbaz")
+
+    def it_renders_static_fields_again_in_forked_process(self):
+        formatter = SingleLineFormatter("[%(process)d] %(message)s")
+        record = _record("foo")
+        assert formatter.format(record) == "[{}] foo".format(os.getpid())
+
+        record.process = 42
+        assert formatter.format(record) == "[42] foo"
+
+    def it_colors_levels(self):
+        formatter = SingleLineColoredFormatter(
+            "[%(log_color)s%(levelname)s%(reset)s] %(message)s"
+        )
+
+        assert formatter.format(_record("foo")) == (
+            "[\033[32mINFO\033[0m] foo\033[0m"
+        )
+
+
+def _parse_journal_entry(data):
+    retv = {}
+    while data:
+        line, data = data.split(b"\n", 1)
+        if b"=" in line:
+            name, value = line.split(b"=", 1)
+        else:
+            name = line
+            (size,) = struct.unpack("<Q", data[:8])
+            value, data = data[8 : 8 + size], data[8 + size + 1 :]
+        retv[name.decode()] = value.decode()
+    return retv
+
+
+class DescribeJournaldHandler:
+    @pytest.fixture
+    def journal(self, tmp_path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(tmp_path / "journal.sock"))
+        sock.settimeout(5)
+        yield sock
+        sock.close()
+
+    def it_sends_structured_entries(self, journal):
+        handler = JournaldHandler("foo", address=journal.getsockname())
+        record = _record("bar")
+        record.JOB_ID = 42
+
+        handler.handle(record)
+        handler.close()
+        entry = _parse_journal_entry(journal.recv(65536))
+
+        assert entry["MESSAGE"] == "bar"
+        assert entry["PRIORITY"] == "6"
+        assert entry["SYSLOG_IDENTIFIER"] == "foo"
+        assert entry["SYSLOG_PID"] == str(os.getpid())
+        assert entry["LOGGER"] == "foo"
+        assert entry["CODE_FILE"] == __file__
+        assert entry["CODE_LINE"] == "1"
+        assert entry["JOB_ID"] == "42"
+
+    def it_sends_multiline_values_in_binary_form(self, journal):
+        handler = JournaldHandler("foo", address=journal.getsockname())
+
+        handler.handle(_record("bar\nbaz", logging.ERROR))
+        handler.close()
+        entry = _parse_journal_entry(journal.recv(65536))
+
+        assert entry["MESSAGE"] == "bar\nbaz"
+        assert entry["PRIORITY"] == "3"
+
+    def it_passes_large_entries_in_memfd(self, journal):
+        handler = JournaldHandler("foo", address=journal.getsockname())
+        handler._socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+        handler.handle(_record("x" * 256 * 1024))
+        handler.close()
+        data, ancdata, _, _ = journal.recvmsg(1024, socket.CMSG_SPACE(4))
+        fds = array.array("i")
+        fds.frombytes(ancdata[0][2])
+        with os.fdopen(fds[0], "rb") as f:
+            f.seek(0)
+            entry = _parse_journal_entry(f.read())
+
+        assert data == b""
+        assert entry["MESSAGE"] == "x" * 256 * 1024
+
+
+class DescribeLoggingConfigJournaldSelection:
+    def _logging_json(self, enabled, address="/run/systemd/journal/socket"):
+        return {
+            "journald": {"enabled": enabled},
+            "handlers": {
+                "console": {},
+                "syslog": {},
+                "journald": {"address": address},
+            },
+            "root": {"handlers": ["console", "syslog"]},
+            "loggers": {"foo": {"handlers": ["syslog"]}},
+        }
+
+    def it_replaces_syslog_handler_with_journald_one(self):
+        logging_json = self._logging_json(True)
+
+        ExternalConfigLoader._select_journald(logging_json)
+
+        assert "journald" not in logging_json
+        assert "syslog" not in logging_json["handlers"]
+        assert logging_json["root"]["handlers"] == ["console", "journald"]
+        assert logging_json["loggers"]["foo"]["handlers"] == ["journald"]
+
+    def it_keeps_syslog_when_journald_socket_does_not_exist(self, tmp_path):
+        logging_json = self._logging_json("auto", str(tmp_path / "nope.sock"))
+
+        ExternalConfigLoader._select_journald(logging_json)
+
+        assert "syslog" in logging_json["handlers"]
+        assert logging_json["root"]["handlers"] == ["console", "syslog"]
+
+
+class DescribeLoggingConfigHandlersTopology:
+    def it_removes_handlers_inherited_through_propagation(self):
+        logging_json = {
+            "root": {"handlers": ["console", "file", "syslog"]},
+            "loggers": {
+                "foo": {"handlers": ["file", "syslog", "console"]},
+                "foo.bar": {"handlers": ["file", "extra"]},
+                "baz": {"handlers": ["file"], "propagate": False},
+            },
+        }
+
+        fanout = ExternalConfigLoader._compile_handlers_topology(logging_json)
+
+        assert logging_json["root"]["handlers"] == ["console", "file", "syslog"]
+        assert logging_json["loggers"]["foo"]["handlers"] == []
+        assert logging_json["loggers"]["foo.bar"]["handlers"] == ["extra"]
+        assert logging_json["loggers"]["baz"]["handlers"] == ["file"]
+        assert fanout == {
+            "root": ["console", "file", "syslog"],
+            "foo": ["console", "file", "syslog"],
+            "foo.bar": ["extra", "console", "file", "syslog"],
+            "baz": ["file"],
+        }
+
+    def it_stops_at_ancestor_that_does_not_propagate(self):
+        logging_json = {
+            "root": {"handlers": ["console"]},
+            "loggers": {
+                "foo": {"handlers": ["file"], "propagate": False},
+                "foo.bar": {"handlers": ["console"]},
+            },
+        }
+
+        fanout = ExternalConfigLoader._compile_handlers_topology(logging_json)
+
+        assert logging_json["loggers"]["foo.bar"]["handlers"] == ["console"]
+        assert fanout["foo.bar"] == ["console", "file"]
+
+
+class DescribeLoggingConfigQueueRewrite:
+    def it_routes_loggers_through_queue_handlers(self):
+        logging_json = {
+            "queue": {"enabled": True, "maxsize": 42, "overflow": "block"},
+            "handlers": {"console": {}, "file": {}},
+            "root": {"handlers": ["console", "file"]},
+            "loggers": {
+                "foo": {"handlers": ["console", "file"]},
+                "bar": {"handlers": ["file"]},
+            },
+        }
+
+        ExternalConfigLoader._route_through_queue(logging_json)
+
+        assert "queue" not in logging_json
+        assert logging_json["root"]["handlers"] == ["queue_console_file"]
+        assert logging_json["loggers"]["foo"]["handlers"] == ["queue_console_file"]
+        assert logging_json["loggers"]["bar"]["handlers"] == ["queue_file"]
+        assert logging_json["handlers"]["queue_console_file"]["handlers"] == [
+            "console",
+            "file",
+        ]
+        assert logging_json["handlers"]["queue_file"]["maxsize"] == 42
+        assert logging_json["handlers"]["queue_file"]["overflow"] == "block"
+
+    def it_leaves_config_alone_when_queue_is_disabled(self):
+        logging_json = {
+            "queue": {"enabled": False},
+            "handlers": {"console": {}},
+            "root": {"handlers": ["console"]},
+            "loggers": {},
+        }
+
+        ExternalConfigLoader._route_through_queue(logging_json)
+
+        assert logging_json == {
+            "handlers": {"console": {}},
+            "root": {"handlers": ["console"]},
+            "loggers": {},
+        }
@@ -0,0 +1,87 @@
+import pytest
+
+from {{cookiecutter.project_slug}} import mapped_files
+from {{cookiecutter.project_slug}}.mapped_files import MappedFile
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_bytes(b"first\nsecond\n\nlast")
+    return str(path)
+
+
+class DescribeMappedFile:
+    def it_gives_views_without_copying(self, path):
+        with MappedFile(path) as mapped:
+            view = mapped.view(6, 12)
+
+            assert isinstance(view, memoryview)
+            assert view == b"second"
+            assert len(mapped) == 18
+            view.release()
+
+    def it_iterates_lines(self, path):
+        with MappedFile(path) as mapped:
+            assert [bytes(line) for line in mapped.lines()] == [
+                b"first",
+                b"second",
+                b"",
+                b"last",
+            ]
+            assert [bytes(line) for line in mapped.lines(keepends=True)][:2] == [
+                b"first\n",
+                b"second\n",
+            ]
+
+    def it_iterates_chunks_and_records(self, path):
+        with MappedFile(path) as mapped:
+            assert [bytes(chunk) for chunk in mapped.chunks(8)] == [
+                b"first\nse",
+                b"cond\n\nla",
+                b"st",
+            ]
+            assert b"".join(mapped.records(5)) == b"first\nsecond\n\nlast"
+
+    def it_keeps_views_valid_after_dropping_read_pages(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(mapped_files, "_DROP_BEHIND_BYTES", 1)
+        path = tmp_path / "big.bin"
+        path.write_bytes(b"".join(bytes([i]) * 4096 for i in range(16)))
+
+        with MappedFile(str(path)) as mapped:
+            chunks = list(mapped.chunks(4096))
+            assert mapped._dropped > 0
+            assert [chunk[0] for chunk in chunks] == list(range(16))
+            for chunk in chunks:
+                chunk.release()
+
+    def it_handles_empty_files(self, tmp_path):
+        path = tmp_path / "empty"
+        path.write_bytes(b"")
+
+        with MappedFile(str(path)) as mapped:
+            assert list(mapped.lines()) == []
+            assert list(mapped.chunks()) == []
+            assert mapped.view() == b""
+
+    def it_leaves_mapping_in_use_to_garbage_collector(self, path):
+        mapped = MappedFile(path)
+        view = mapped.view()
+
+        mapped.close()
+
+        assert mapped.closed
+        assert view[:5] == b"first"
+
+    def it_can_be_closed_for_whole_directory(self, tmp_path):
+        (tmp_path / "inside").mkdir()
+        (tmp_path / "inside" / "data").write_bytes(b"data")
+        (tmp_path / "outside").write_bytes(b"data")
+        inside = MappedFile(str(tmp_path / "inside" / "data"))
+        outside = MappedFile(str(tmp_path / "outside"))
+
+        assert mapped_files.close_all(str(tmp_path / "inside")) == 1
+
+        assert inside.closed
+        assert not outside.closed
+        outside.close()
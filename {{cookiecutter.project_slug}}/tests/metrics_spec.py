@@ -0,0 +1,208 @@
+import os
+import socket
+import threading
+import urllib.request
+
+import pytest
+
+from {{cookiecutter.project_slug}}.metrics import (MetricsServer, Registry, SharedMetrics, merge_families,
+                             parse_listen, render_text)
+from {{cookiecutter.project_slug}}.metrics.shared import _HEADER
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def _samples(family):
+    return dict(family.samples)
+
+
+class DescribeRegistry:
+    def it_sums_counter_increments_from_all_threads(self, registry):
+        counter = registry.counter("jobs_total", "Jobs", labels=["result"])
+
+        def work():
+            for _ in range(1000):
+                counter.labels("ok").inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.labels("failed").inc(2)
+
+        (family,) = registry.collect()
+        assert _samples(family) == {("ok",): 4000, ("failed",): 2}
+
+    def it_tracks_gauges(self, registry):
+        gauge = registry.gauge("queue_depth", "Depth")
+        gauge.set(10)
+        gauge.inc(3)
+        gauge.dec()
+        assert gauge._child.value == 12
+
+        gauge.set_function(lambda: 42)
+        assert _samples(registry.collect()[0]) == {(): 42}
+
+    def it_counts_observations_in_buckets(self, registry):
+        histogram = registry.histogram("latency", "Latency", buckets=[1, 5])
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+
+        (family,) = registry.collect()
+        assert family.buckets == (1, 5)
+        assert _samples(family) == {(): ((2, 1, 1), 14.5)}
+
+    def it_returns_existing_metric_and_rejects_type_conflicts(self, registry):
+        counter = registry.counter("things", "Things")
+        assert registry.counter("things", "Things") is counter
+        with pytest.raises(ValueError):
+            registry.gauge("things", "Things")
+
+    def it_resets_values_but_keeps_metrics(self, registry):
+        counter = registry.counter("things", "Things")
+        child = counter._child
+        counter.inc(5)
+
+        registry.reset()
+        counter.inc()
+
+        assert counter._child is child
+        assert _samples(registry.collect()[0]) == {(): 1}
+
+    def it_collects_from_collectors_and_survives_their_failures(self, registry):
+        family = registry.counter("things", "Things").collect()._replace(name="other")
+        registry.register_collector(lambda: [family])
+        registry.register_collector(lambda: 1 / 0)
+
+        assert [family.name for family in registry.collect()] == ["things", "other"]
+
+
+class DescribeExposition:
+    def it_merges_families_by_their_policy(self, registry):
+        registry.counter("jobs_total", "Jobs").inc(2)
+        registry.gauge("started_at", "Start", merge="min").set(20)
+        registry.histogram("latency", "Latency", buckets=[1]).observe(0.5)
+        first = registry.collect()
+
+        registry.reset()
+        registry.counter("jobs_total", "Jobs").inc(3)
+        registry.gauge("started_at", "Start", merge="min").set(10)
+        registry.histogram("latency", "Latency", buckets=[1]).observe(2)
+        merged = {
+            family.name: _samples(family)
+            for family in merge_families(first + registry.collect())
+        }
+
+        assert merged == {
+            "jobs_total": {(): 5},
+            "started_at": {(): 10},
+            "latency": {(): ((1, 1), 2.5)},
+        }
+
+    def it_renders_prometheus_text_format(self, registry):
+        registry.counter("jobs_total", "Processed jobs", labels=["result"]).labels(
+            'so "bad"'
+        ).inc()
+        registry.histogram("latency", "Latency", buckets=[1]).observe(2)
+
+        assert render_text(registry.collect(), namespace="app") == (
+            "# HELP app_jobs_total Processed jobs\n"
+            "# TYPE app_jobs_total counter\n"
+            'app_jobs_total{result="so \\"bad\\""} 1\n'
+            "# HELP app_latency Latency\n"
+            "# TYPE app_latency histogram\n"
+            'app_latency_bucket{le="1.0"} 0\n'
+            'app_latency_bucket{le="+Inf"} 1\n'
+            "app_latency_sum 2\n"
+            "app_latency_count 1\n"
+        )
+
+
+class DescribeSharedMetrics:
+    def it_passes_metrics_from_forked_workers(self, registry):
+        shared = SharedMetrics(2, slot_size=4096)
+        counter = registry.counter("jobs_total", "Jobs")
+
+        for slot in range(2):
+            pid = os.fork()
+            if pid == 0:
+                counter.inc(slot + 1)
+                os._exit(0 if shared.publish(slot, registry.collect()) else 1)
+            assert os.WEXITSTATUS(os.waitpid(pid, 0)[1]) == 0
+
+        (family,) = merge_families(shared.collect())
+        assert _samples(family) == {(): 3}
+
+    def it_keeps_counters_of_retired_workers(self, registry):
+        shared = SharedMetrics(1, slot_size=4096)
+        registry.counter("jobs_total", "Jobs").inc(2)
+        registry.gauge("busy", "Busy").set(1)
+        shared.publish(0, registry.collect())
+
+        shared.retire(0)
+
+        assert shared.read(0) == []
+        assert [(family.name, _samples(family)) for family in shared.collect()] == [
+            ("jobs_total", {(): 2})
+        ]
+
+    def it_keeps_last_read_metrics_of_slot_being_written(self, registry):
+        shared = SharedMetrics(1, slot_size=4096)
+        registry.counter("jobs_total", "Jobs").inc(2)
+        shared.publish(0, registry.collect())
+        assert [family.name for family in shared.read(0)] == ["jobs_total"]
+
+        # Worker killed in the middle of publishing leaves odd sequence behind
+        sequence, length = _HEADER.unpack_from(shared._buffer, 0)
+        _HEADER.pack_into(shared._buffer, 0, sequence + 1, length)
+
+        assert [_samples(family) for family in shared.read(0)] == [{(): 2}]
+        shared.retire(0)
+        assert [_samples(family) for family in shared.collect()] == [{(): 2}]
+
+    def it_refuses_metrics_bigger_than_slot(self, registry):
+        shared = SharedMetrics(1, slot_size=64)
+        registry.counter("jobs_total", "Jobs" * 100).inc()
+
+        assert not shared.publish(0, registry.collect())
+        assert shared.collect() == []
+
+
+class DescribeMetricsServer:
+    def it_parses_listen_addresses(self):
+        assert parse_listen(":9100") == ("127.0.0.1", 9100)
+        assert parse_listen("0.0.0.0:80") == ("0.0.0.0", 80)
+        assert parse_listen("unix:/run/app.sock") == "/run/app.sock"
+        with pytest.raises(ValueError):
+            parse_listen("localhost")
+
+    def it_serves_metrics_over_tcp(self):
+        server = MetricsServer("127.0.0.1:0", lambda: "metric 1\n")
+        server.start()
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+            with urllib.request.urlopen(url) as response:
+                assert response.read() == b"metric 1\n"
+                assert response.headers["Content-Type"].startswith("text/plain")
+        finally:
+            server.stop()
+
+    def it_serves_metrics_over_unix_socket(self, tmp_path):
+        path = str(tmp_path / "metrics.sock")
+        server = MetricsServer("unix:" + path, lambda: "metric 1\n")
+        server.start()
+        try:
+            with socket.socket(socket.AF_UNIX) as client:
+                client.connect(path)
+                client.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+                response = b"".join(iter(lambda: client.recv(4096), b""))
+            assert response.startswith(b"HTTP/1.0 200")
+            assert response.endswith(b"\r\n\r\nmetric 1\n")
+        finally:
+            server.stop()
+
+        assert not os.path.exists(path)
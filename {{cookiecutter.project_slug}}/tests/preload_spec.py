@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from {{cookiecutter.project_slug}} import preload
+
+_SUPERVISOR_SCRIPT = textwrap.dedent(
+    """
+    import gc, os, sys, time
+    from {{cookiecutter.project_slug}} import preload
+    from {{cookiecutter.project_slug}}.workers import Supervisor
+
+    # ~100 MiB of small container objects, the worst case for copy-on-write
+    BALLAST = [{"index": i, "values": [i, str(i)]} for i in range(400000)]
+
+    class DummyServer:
+        def startup_worker(self, worker_index):
+            preload.run_after_fork_hooks()
+            gc.collect()
+            with open(os.path.join(sys.argv[1], str(os.getpid())), "w"):
+                pass
+            while True:
+                time.sleep(1)
+
+    if sys.argv[2] == "freeze":
+        preload.preload()
+
+    Supervisor(DummyServer(), 2).run()
+    """
+)
+
+
+def _smaps_rollup(pid):
+    retv = {}
+    with open("/proc/{}/smaps_rollup".format(pid)) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                retv[parts[0].rstrip(":")] = int(parts[1])
+    return retv
+
+
+def _workers_memory(tmp_path, mode):
+    process = subprocess.Popen(
+        [sys.executable, "-c", _SUPERVISOR_SCRIPT, str(tmp_path), mode]
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while len(os.listdir(str(tmp_path))) < 2 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        # Give workers' gc.collect time to finish
+        time.sleep(0.5)
+
+        retv = []
+        for pid in os.listdir(str(tmp_path)):
+            smaps = _smaps_rollup(pid)
+            retv.append(
+                (
+                    smaps["Shared_Clean"] + smaps["Shared_Dirty"],
+                    smaps["Private_Clean"] + smaps["Private_Dirty"],
+                )
+            )
+        return retv
+
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/smaps_rollup"), reason="requires /proc smaps_rollup"
+)
+class DescribePreload:
+    def it_keeps_preloaded_memory_shared_between_workers(self, tmp_path):
+        frozen_dir = tmp_path / "frozen"
+        frozen_dir.mkdir()
+        unfrozen_dir = tmp_path / "unfrozen"
+        unfrozen_dir.mkdir()
+
+        frozen = _workers_memory(frozen_dir, "freeze")
+        unfrozen = _workers_memory(unfrozen_dir, "no-freeze")
+
+        for shared, private in frozen:
+            assert shared > private
+
+        frozen_private = sum(private for _, private in frozen)
+        unfrozen_private = sum(private for _, private in unfrozen)
+        assert frozen_private * 2 < unfrozen_private
+
+
+class DescribeAfterForkHooks:
+    def it_calls_registered_hooks_in_order(self, mocker):
+        mocker.patch.object(preload, "_AFTER_FORK_HOOKS", [])
+        calls = []
+
+        @preload.after_fork
+        def first():
+            calls.append("first")
+
+        preload.after_fork(lambda: calls.append("second"))
+        preload.run_after_fork_hooks()
+
+        assert calls == ["first", "second"]
@@ -0,0 +1,70 @@
+import os
+import signal
+import threading
+import time
+
+from {{cookiecutter.project_slug}}.profiling import SamplingProfiler, StackDumper, stack_dump_path
+
+
+def _busy_loop(stopping):
+    while not stopping.is_set():
+        sum(range(1000))
+
+
+class DescribeSamplingProfiler:
+    def it_writes_collapsed_stacks_of_all_threads(self, tmp_path):
+        stopping = threading.Event()
+        busy = threading.Thread(target=_busy_loop, args=(stopping,), name="busy")
+        busy.start()
+
+        profiler = SamplingProfiler(str(tmp_path), interval=0.001)
+        try:
+            assert profiler.toggle()
+            time.sleep(0.2)
+            assert not profiler.toggle()
+            profiler.stop(wait=True)
+        finally:
+            stopping.set()
+            busy.join()
+
+        assert not profiler.is_running
+        assert profiler.samples_count > 0
+        assert os.path.dirname(profiler.output_file_path) == str(tmp_path)
+
+        with open(profiler.output_file_path) as f:
+            lines = f.read().splitlines()
+        stacks = dict(line.rsplit(" ", 1) for line in lines)
+        busy_stacks = [stack for stack in stacks if stack.startswith("busy;")]
+        assert busy_stacks
+        assert all("_busy_loop (profiling_spec.py:" in stack for stack in busy_stacks)
+        assert not any("sampling-profiler" in stack for stack in stacks)
+        assert all(int(count) > 0 for count in stacks.values())
+
+    def it_stops_by_itself_after_max_duration(self, tmp_path):
+        profiler = SamplingProfiler(str(tmp_path), interval=0.001, max_duration=0.05)
+        profiler.start()
+        profiler._thread.join(5)
+
+        assert not profiler.is_running
+        assert os.path.exists(profiler.output_file_path)
+
+    def it_keeps_only_innermost_frames(self, tmp_path):
+        profiler = SamplingProfiler(str(tmp_path), max_depth=2)
+        profiler._sample(own_id=None)
+
+        assert all(len(stack) <= 2 for _, stack in profiler._stacks)
+
+
+class DescribeStackDumper:
+    def it_dumps_stacks_of_all_threads_on_signal(self, tmp_path):
+        path = stack_dump_path(str(tmp_path / "dumps"))
+        dumper = StackDumper(signal.SIGPWR, path)
+        dumper.install()
+        try:
+            os.kill(os.getpid(), signal.SIGPWR)
+        finally:
+            dumper.uninstall()
+
+        with open(path) as f:
+            dump = f.read()
+        assert "it_dumps_stacks_of_all_threads_on_signal" in dump
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import signal
+import threading
+
+import pytest
+
+from {{cookiecutter.project_slug}}.reactor import Reactor
+
+
+@pytest.fixture
+def reactor():
+    reactor = Reactor()
+    yield reactor
+    reactor.close()
+
+
+class DescribeReactor:
+    def it_runs_spawned_coroutines(self, reactor):
+        results = []
+
+        async def job():
+            await asyncio.sleep(0)
+            results.append("done")
+            reactor.stop()
+
+        reactor.spawn(job())
+        reactor.run_forever()
+
+        assert results == ["done"]
+
+    def it_dispatches_callbacks_from_other_threads(self, reactor):
+        results = []
+
+        def callback(value):
+            results.append(value)
+            reactor.stop()
+
+        threading.Timer(0.01, reactor.call_soon, (callback, 42)).start()
+        reactor.run_forever()
+
+        assert results == [42]
+
+    def it_dispatches_signals_inside_of_loop(self, reactor):
+        results = []
+
+        def on_signal(signame):
+            results.append(signame)
+            reactor.stop()
+
+        reactor.add_signal_handler(signal.SIGUSR2, on_signal, "SIGUSR2")
+        reactor.call_soon(os.kill, os.getpid(), signal.SIGUSR2)
+        reactor.run_forever()
+
+        assert results == ["SIGUSR2"]
+
+    def it_watches_file_descriptors(self, reactor):
+        read_fd, write_fd = os.pipe()
+        results = []
+
+        def on_readable():
+            results.append(os.read(read_fd, 10))
+            reactor.remove_reader(read_fd)
+            reactor.stop()
+
+        try:
+            reactor.add_reader(read_fd, on_readable)
+            reactor.call_soon(os.write, write_fd, b"foo")
+            reactor.run_forever()
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        assert results == [b"foo"]
+
+    def it_cancels_pending_tasks_on_close(self, reactor):
+        cancelled = []
+
+        async def forever():
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        reactor.spawn(forever())
+        reactor.call_soon(reactor.stop)
+        reactor.run_forever()
+        reactor.close()
+
+        assert cancelled == [True]
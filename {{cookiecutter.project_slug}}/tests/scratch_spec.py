@@ -0,0 +1,192 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from {{cookiecutter.project_slug}} import scratch, settings
+from {{cookiecutter.project_slug}}.scratch import ScratchQuotaError, ScratchSpace
+
+
+def write(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+
+
+@pytest.fixture
+def space(tmp_path):
+    return ScratchSpace(
+        str(tmp_path / "disk"),
+        quota_bytes=1000,
+        tmpfs_root_path=str(tmp_path / "memory"),
+        tmpfs_quota_bytes=100,
+        tmpfs_max_file_size=50,
+    )
+
+
+class DescribeScratchSpace:
+    def it_gives_each_job_its_own_directory(self, space):
+        with space.job("first") as first, space.job("second") as second:
+            assert os.path.isdir(first.path)
+            assert first.path != second.path
+
+        with pytest.raises(ValueError):
+            space.job("../escape")
+
+    def it_places_small_files_in_tmpfs(self, space):
+        with space.job() as job:
+            small = job.file_path("small", size=10)
+            big = job.file_path("big", size=500)
+
+        assert small.startswith(space.tmpfs_root_path)
+        assert big.startswith(space.root_path)
+
+    def it_replaces_reservations_with_actual_sizes(self, space):
+        with space.job() as job:
+            write(job.file_path("data", size=800), 300)
+            assert space.stats()["disk_bytes"] == 800
+
+        assert space.stats()["disk_bytes"] == 300
+
+    def it_evicts_least_recently_used_finished_jobs(self, space):
+        for job_id in ("a", "b", "c"):
+            with space.job(job_id) as job:
+                write(job.file_path("data", size=300), 300)
+
+        # Reusing job moves it to the end of eviction queue
+        with space.job("a") as job:
+            assert os.path.getsize(job.file_path("data", size=300)) == 300
+
+        with space.job("d") as job:
+            write(job.file_path("data", size=300), 300)
+
+        stats = space.stats()
+        assert stats["evicted"] == 1
+        assert stats["reused"] == 1
+        assert stats["disk_bytes"] == 900
+        assert not os.path.exists(os.path.join(space.root_path, "jobs", "b"))
+
+    def it_uses_disk_instead_of_evicting_for_tmpfs(self, tmp_path):
+        space = ScratchSpace(
+            str(tmp_path / "disk"),
+            tmpfs_root_path=str(tmp_path / "memory"),
+            tmpfs_quota_bytes=100,
+            tmpfs_max_file_size=100,
+        )
+        active = space.job("a")
+        write(active.file_path("data", size=100), 100)
+        for index in range(5):
+            with space.job("finished-{}".format(index)) as job:
+                write(job.file_path("data", size=1000), 1000)
+
+        small = space.job("b").file_path("small", size=10)
+
+        assert small.startswith(space.root_path)
+        assert space.stats()["evicted"] == 0
+
+    def it_evicts_only_jobs_with_files_in_tmpfs_to_make_room_there(self, space):
+        with space.job("disk") as job:
+            write(job.file_path("data", size=1000), 1000)
+        for job_id in ("memory-1", "memory-2"):
+            with space.job(job_id) as job:
+                write(job.file_path("data", size=50), 50)
+
+        small = space.job().file_path("small", size=10)
+
+        assert small.startswith(space.tmpfs_root_path)
+        assert space.stats()["evicted"] == 1
+        assert space.stats()["disk_bytes"] == 1000
+        assert os.path.exists(os.path.join(space.root_path, "jobs", "disk"))
+
+    def it_rejects_reservations_over_quota(self, space):
+        with space.job() as job:
+            job.reserve(600)
+            with pytest.raises(ScratchQuotaError):
+                job.reserve(600)
+
+        assert space.stats()["rejected"] == 1
+
+    def it_keeps_free_space_on_file_system(self, tmp_path):
+        space = ScratchSpace(str(tmp_path), min_free_bytes=2 ** 62)
+
+        with pytest.raises(ScratchQuotaError):
+            space.job().reserve(1)
+
+    def it_discards_files_of_failed_jobs(self, space):
+        with pytest.raises(ZeroDivisionError):
+            with space.job() as job:
+                write(job.file_path("data", size=100), 100)
+                1 / 0
+
+        assert not os.path.exists(job.path)
+        assert space.stats()["disk_bytes"] == 0
+        assert space.stats()["finished_jobs"] == 0
+
+
+class DescribeRemoveAbandonedDirs:
+    def it_removes_only_directories_of_dead_instances(self, tmp_path):
+        instances_dir = tmp_path / "instances"
+        fd = scratch.lock_dir(str(instances_dir / "current"))
+        alive_fd = scratch.lock_dir(str(instances_dir / "alive_in_this_process"))
+        (instances_dir / "recent").mkdir()
+        (instances_dir / "old").mkdir()
+        os.utime(str(instances_dir / "old"), (0, 0))
+
+        # Lock is released when process that held it exits
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                textwrap.dedent(
+                    """
+                    import sys
+                    from {{cookiecutter.project_slug}} import scratch
+                    scratch.lock_dir(sys.argv[1])
+                    """
+                ),
+                str(instances_dir / "crashed"),
+            ],
+            check=True,
+        )
+
+        removed = scratch.remove_abandoned_dirs(str(instances_dir), "current", 60)
+
+        assert sorted(os.path.basename(path) for path in removed) == [
+            "crashed",
+            "old",
+        ]
+        assert sorted(os.listdir(str(instances_dir))) == [
+            "alive_in_this_process",
+            "current",
+            "recent",
+        ]
+        os.close(fd)
+        os.close(alive_fd)
+
+    def it_removes_tmpfs_directories_of_dead_instances(self, tmp_path):
+        instances_dir = tmp_path / "instances"
+        tmpfs_dir = tmp_path / "tmpfs"
+        fd = scratch.lock_dir(str(instances_dir / "alive"))
+        (tmpfs_dir / "alive").mkdir(parents=True)
+        (tmpfs_dir / "crashed").mkdir()
+        os.utime(str(tmpfs_dir / "crashed"), (0, 0))
+
+        removed = scratch.remove_abandoned_dirs(
+            str(tmpfs_dir), "current", 60, locks_dir=str(instances_dir)
+        )
+
+        assert removed == [str(tmpfs_dir / "crashed")]
+        os.close(fd)
+
+
+class DescribeSettingsScratchSpace:
+    def it_lives_in_instance_tmp_dir(self, app):
+        space = settings.scratch_space()
+
+        assert space is settings.scratch_space()
+        assert space.root_path.startswith(settings.SETTINGS.instance_tmp_dir_path)
+        lock_path = os.path.join(
+            settings.SETTINGS.instance_tmp_dir_path, scratch.LOCK_FILE_NAME
+        )
+        assert os.path.isfile(lock_path)
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from click.testing import CliRunner
+
+from {{cookiecutter.project_slug}}.scripts import cli
+
+#: Max cumulative time (in microseconds, as reported by ``python -X importtime``)
+#: of importing command line scripts package. Can be overridden by
+#: ``IMPORT_TIME_BUDGET_US`` environment variable for slow machines.
+IMPORT_TIME_BUDGET_US = int(os.environ.get("IMPORT_TIME_BUDGET_US", 1000000))
+
+_IMPORTED_MODULES_SCRIPT = textwrap.dedent(
+    """
+    import sys
+    from click.testing import CliRunner
+    from {{cookiecutter.project_slug}}.scripts import cli
+
+    result = CliRunner().invoke(cli, sys.argv[1:])
+    assert result.exit_code == 0, result.output
+
+    # Resolves command the same way it is resolved when running it
+    with cli.make_context("cli", ["runserver"]) as ctx:
+        cli.get_command(ctx, "runserver")
+
+    print("\\n".join(sys.modules))
+    """
+)
+
+
+def _imported_modules(*args):
+    output = subprocess.check_output(
+        [sys.executable, "-c", _IMPORTED_MODULES_SCRIPT] + list(args)
+    )
+    return set(output.decode("utf-8").split())
+
+
+def _import_time_us(module_name):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module_name],
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    for line in result.stderr.decode("utf-8").splitlines():
+        # import time: self [us] | cumulative | imported package
+        columns = line.split("|")
+        if len(columns) == 3 and columns[2].strip() == module_name:
+            return int(columns[1])
+
+    raise AssertionError("{} not found in -X importtime output".format(module_name))
+
+
+class DescribeCli:
+    def it_lists_lazily_loaded_commands(self):
+        result = CliRunner().invoke(cli, ["--help"])
+
+        assert result.exit_code == 0
+        assert "runserver" in result.output
+        assert "shell" in result.output
+
+    def it_doesnt_import_ipython_or_server_for_help(self):
+        modules = _imported_modules("--help")
+
+        assert "IPython" not in modules
+        assert "{{cookiecutter.project_slug}}.server" not in modules
+
+    def it_doesnt_import_ipython_for_runserver(self):
+        modules = _imported_modules("runserver", "--help")
+
+        assert "{{cookiecutter.project_slug}}.scripts.runserver" in modules
+        assert "IPython" not in modules
+
+    def it_imports_within_time_budget(self):
+        # Best of few runs, so that cold disk cache doesn't make it fail
+        import_time = min(
+            _import_time_us("{{cookiecutter.project_slug}}.scripts") for _ in range(3)
+        )
+
+        assert import_time < IMPORT_TIME_BUDGET_US, (
+            "Importing command line scripts took {}us, budget is {}us".format(
+                import_time, IMPORT_TIME_BUDGET_US
+            )
+        )
@@ -1,10 +1,26 @@
+import asyncio
+import logging
 import os
-
+import subprocess
+import sys
+import textwrap
+import zipfile
+from collections import namedtuple
+
+import fakeredis
+import fakeredis.aioredis
 import pytest
 import simplejson as json
-from pkg_resources import Requirement, resource_filename
+import yaml
+
+from {{cookiecutter.project_slug}} import resources, settings
+from {{cookiecutter.project_slug}}.settings import (APP_CONFIG_SCHEMA, ENVIRONMENTS, SETTINGS, ConfigSection,
+                              Field, ImproperlyConfiguredError, RedisManager, Section,
+                              SettingsSnapshot, diff_config, external_config_loader)
 
-from {{cookiecutter.project_slug}}.settings import ENVIRONMENTS, ImproperlyConfiguredError
+CmdArguments = namedtuple(
+    "CmdArguments", ["config_file_path", "log_file_path", "logging_config_path"]
+)
 
 
 class DescribeDevelopmentConfigLoader:
@@ -26,19 +42,13 @@ class DescribeDevelopmentConfigLoader:
 
         cfg._IS_RUNNING_FROM_SOURCE = False
         assert cfg.config_file_abspaths == [
-            resource_filename(
-                Requirement.parse("{{cookiecutter.project_slug}}"),
-                "{{cookiecutter.project_slug}}/resources/development.yaml",
-            )
+            resources.resource_path("development.yaml")
         ]
         assert cfg.filelog_abspath == os.path.join(
             cfg.DEFAULT_TEMP_DIR, "development.log"
         )
         assert cfg.logging_config_abspaths == [
-            resource_filename(
-                Requirement.parse("{{cookiecutter.project_slug}}"),
-                "{{cookiecutter.project_slug}}/resources/logging_config.json",
-            )
+            resources.resource_path("logging_config.json")
         ]
 
     def it_accepts_absolute_paths_for_cmdline_arguments(self, mocker):
@@ -109,16 +119,11 @@ class DescribeTestConfigLoader:
 
         cfg._IS_RUNNING_FROM_SOURCE = False
         assert cfg.config_file_abspaths == [
-            resource_filename(
-                Requirement.parse("{{cookiecutter.project_slug}}"), "{{cookiecutter.project_slug}}/resources/test.yaml"
-            )
+            resources.resource_path("test.yaml")
         ]
         assert cfg.filelog_abspath == os.path.join(cfg.DEFAULT_TEMP_DIR, "test.log")
         assert cfg.logging_config_abspaths == [
-            resource_filename(
-                Requirement.parse("{{cookiecutter.project_slug}}"),
-                "{{cookiecutter.project_slug}}/resources/logging_config.json",
-            )
+            resources.resource_path("logging_config.json")
         ]
 
     def it_accepts_absolute_paths_for_cmdline_arguments(self, mocker):
@@ -296,15 +301,496 @@ class DescribeProductionConfigLoader:
         )
         cfg = ENVIRONMENTS["production"]()
 
-        with open(
-            resource_filename(
-                Requirement("{{cookiecutter.project_slug}}"),
-                "{{cookiecutter.project_slug}}/resources/logging_config.json",
-            ),
-            "r",
-        ) as f:
+        with open(resources.resource_path("logging_config.json"), "r") as f:
             expected = json.load(f)
 
         assert cfg.logging_config_abspaths == ["/foo"]
         cfg._load_logging_config()
         assert cfg._logging_json == expected
+
+
+_ZIPAPP_SCRIPT = textwrap.dedent(
+    """
+    import sys
+
+    sys.path.insert(0, sys.argv[1])
+
+    from {{cookiecutter.project_slug}} import resources
+    from {{cookiecutter.project_slug}}.settings import external_config_loader
+
+    assert resources.RESOURCES_DIR.startswith(sys.argv[1])
+    config_file = external_config_loader._read_config_file(
+        resources.resource_path("test.yaml"), external_config_loader._parse_yaml_config
+    )
+    print(sorted(config_file.data))
+    """
+)
+
+
+class DescribeResources:
+    def it_reads_bundled_resources(self):
+        path = resources.resource_path("test.yaml")
+
+        assert resources.bundled_resource_name(path) == "test.yaml"
+        assert resources.bundled_resource_name("/etc/test.yaml") is None
+        with open(path, "rb") as f:
+            assert resources.read_resource(path) == f.read()
+        assert resources.read_resource("test.yaml") == resources.read_resource(path)
+
+    def it_reads_bundled_config_from_zip_archive(self, tmp_path):
+        package_dir = os.path.dirname(os.path.dirname(resources.RESOURCES_DIR))
+        archive_path = str(tmp_path / "app.pyz")
+
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            for root, _, file_names in os.walk(
+                os.path.join(package_dir, "{{cookiecutter.project_slug}}")
+            ):
+                for file_name in file_names:
+                    if not file_name.endswith(".pyc"):
+                        path = os.path.join(root, file_name)
+                        archive.write(path, os.path.relpath(path, package_dir))
+
+        output = subprocess.check_output(
+            [sys.executable, "-c", _ZIPAPP_SCRIPT, archive_path]
+        )
+
+        with open(resources.resource_path("test.yaml"), "r") as f:
+            expected = sorted(yaml.safe_load(f))
+        assert output.decode("utf-8").strip() == str(expected)
+
+
+class DescribeAppConfigSchema:
+    @pytest.fixture
+    def make_cfg(self, tmp_path, mocker):
+        mocker.patch.object(external_config_loader, "dictConfig")
+
+        def make_cfg(config_yaml):
+            (tmp_path / "test.yaml").write_text(config_yaml)
+            (tmp_path / "logging_config.json").write_text(
+                json.dumps(DescribeConfigReload.LOGGING_JSON)
+            )
+            cfg = ENVIRONMENTS["test"](
+                CmdArguments(
+                    config_file_path=str(tmp_path / "test.yaml"),
+                    log_file_path=str(tmp_path / "test.log"),
+                    logging_config_path=str(tmp_path / "logging_config.json"),
+                )
+            )
+            cfg.DEFAULT_TEMP_DIR = str(tmp_path)
+            cfg.load_and_validate()
+            return cfg
+
+        return make_cfg
+
+    def it_coerces_values_and_fills_in_defaults(self, make_cfg):
+        cfg = make_cfg(
+            textwrap.dedent(
+                """
+                redis:
+                  client:
+                    port: "6380"
+                    socket_keepalive: "no"
+                    retry_on_timeout: true
+                executor:
+                  task_timeout: 2
+                """
+            )
+        )
+
+        typed = cfg.typed_app_config
+        assert typed.redis.client.port == 6380
+        assert typed.redis.client.socket_keepalive is False
+        assert typed.redis.client.host == "127.0.0.1"
+        assert typed.redis.streams.batch_size == 100
+        assert typed.executor.task_timeout == 2.0
+        assert typed.executor.pool_size == 4
+
+        # Defaults are not added to plain app config, undeclared keys are kept
+        assert cfg.app_config["redis"] == {
+            "client": {
+                "port": 6380,
+                "socket_keepalive": False,
+                "retry_on_timeout": True,
+            }
+        }
+        assert "streams" not in cfg.app_config["redis"]
+
+    def it_reports_all_errors_together(self, make_cfg):
+        with pytest.raises(ImproperlyConfiguredError) as exception_info:
+            make_cfg(
+                textwrap.dedent(
+                    """
+                    redis:
+                      client:
+                        port: 70000
+                        socket_keepalive: maybe
+                      streams:
+                        batch_sise: 10
+                    executor:
+                      pool_size: many
+                    """
+                )
+            )
+
+        assert set(exception_info.value.args[0]) == {
+            "redis.client.port",
+            "redis.client.socket_keepalive",
+            "redis.streams.batch_sise",
+            "executor.pool_size",
+        }
+
+    def it_rejects_invalid_config_on_reload(self, make_cfg, tmp_path):
+        cfg = make_cfg("executor:\n  pool_size: 2\n")
+        typed_app_config = cfg.typed_app_config
+
+        (tmp_path / "test.yaml").write_text("executor:\n  pool_size: 0\n")
+        with pytest.raises(ImproperlyConfiguredError):
+            cfg.reload()
+        assert cfg.typed_app_config is typed_app_config
+
+        (tmp_path / "test.yaml").write_text("executor:\n  pool_size: '8'\n")
+        assert cfg.reload() == ["executor.pool_size"]
+        assert cfg.typed_app_config.executor.pool_size == 8
+
+    def it_produces_immutable_section_objects(self):
+        typed, _, errors = APP_CONFIG_SCHEMA.validate({})
+
+        assert errors == {}
+        with pytest.raises(AttributeError):
+            typed.executor.pool_size = 1
+
+    def it_supports_required_fields_and_choices(self):
+        schema = Section(
+            "Spec",
+            {
+                "name": Field(str),
+                "mode": Field(str, default="fast", choices=["fast", "slow"]),
+                "ratio": Field(float, default=None, nullable=True),
+            },
+        )
+
+        typed, normalized, errors = schema.validate({"mode": "medium", "ratio": None})
+
+        assert set(errors) == {"name", "mode"}
+        assert typed.ratio is None
+
+        typed, normalized, errors = schema.validate({"name": 42})
+        assert errors == {}
+        assert typed == ("42", "fast", None)
+        assert normalized == {"name": "42"}
+
+    def it_rejects_sections_that_are_not_mappings(self):
+        _, _, errors = APP_CONFIG_SCHEMA.validate({"redis": ["localhost"]})
+
+        assert set(errors) == {"redis"}
+
+
+class DescribeConfigReload:
+    LOGGING_JSON = {
+        "version": 1,
+        "formatters": {},
+        "handlers": {},
+        "loggers": {"reload_spec": {"level": "INFO", "handlers": []}},
+    }
+
+    @pytest.fixture
+    def cfg(self, tmp_path, mocker):
+        mocker.patch.object(external_config_loader, "dictConfig")
+
+        cmdline_args = CmdArguments(
+            config_file_path=str(tmp_path / "test.yaml"),
+            log_file_path=str(tmp_path / "test.log"),
+            logging_config_path=str(tmp_path / "logging_config.json"),
+        )
+
+        (tmp_path / "test.yaml").write_text("foo:\n  bar: 1\n  baz: 2\n")
+        (tmp_path / "logging_config.json").write_text(json.dumps(self.LOGGING_JSON))
+
+        cfg = ENVIRONMENTS["test"](cmdline_args)
+        cfg.DEFAULT_TEMP_DIR = str(tmp_path)
+        cfg.load_and_validate()
+        return cfg
+
+    def it_diffs_nested_configs(self):
+        assert diff_config(
+            {"a": 1, "b": {"c": 1, "d": 2}, "e": 3},
+            {"a": 1, "b": {"c": 2, "d": 2}, "f": 4},
+        ) == ["b.c", "e", "f"]
+
+    def it_returns_changed_keys(self, cfg, tmp_path):
+        (tmp_path / "test.yaml").write_text("foo:\n  bar: 42\n  baz: 2\nqux: 1\n")
+
+        assert cfg.reload() == ["foo.bar", "qux"]
+        assert cfg.app_config == {"foo": {"bar": 42, "baz": 2}, "qux": 1}
+
+    def it_rejects_unreadable_config_on_reload(self, cfg, tmp_path):
+        old_app_config = cfg.app_config
+        (tmp_path / "test.yaml").unlink()
+        (tmp_path / "test.yaml").mkdir()
+
+        with pytest.raises(ImproperlyConfiguredError):
+            cfg.reload()
+        assert cfg.app_config is old_app_config
+
+    def it_keeps_server_running_if_reload_fails(self, mocker):
+        reload = mocker.patch.object(SETTINGS, "reload", side_effect=MemoryError)
+
+        assert settings.reload_module() is None
+        assert reload.called
+
+    def it_keeps_tmp_dir_path_until_restart(self, cfg, tmp_path, caplog):
+        instance_tmp_dir_path = cfg.instance_tmp_dir_path
+        (tmp_path / "test.yaml").write_text(
+            "foo:\n  bar: 42\n  baz: 2\ntmp_dir_path: {}\n".format(tmp_path / "new")
+        )
+
+        with caplog.at_level(logging.WARNING):
+            assert cfg.reload() == ["foo.bar"]
+
+        assert "tmp_dir_path" not in cfg.app_config
+        assert cfg.instance_tmp_dir_path == instance_tmp_dir_path
+        assert "Changing tmp_dir_path" in caplog.text
+
+    def it_parses_only_changed_files(self, cfg, tmp_path, mocker):
+        parse = mocker.spy(external_config_loader, "_parse_yaml_config")
+
+        assert cfg.reload() == []
+        assert parse.call_count == 0
+
+        # Touched, but contents are the same
+        os.utime(str(tmp_path / "test.yaml"), ns=(0, 0))
+        assert cfg.reload() == []
+        assert parse.call_count == 0
+
+    def it_applies_logging_levels(self, cfg, tmp_path):
+        logging_json = dict(
+            self.LOGGING_JSON,
+            loggers={"reload_spec": {"level": "DEBUG", "handlers": []}},
+        )
+        (tmp_path / "logging_config.json").write_text(json.dumps(logging_json))
+
+        cfg.reload()
+
+        assert logging.getLogger("reload_spec").level == logging.DEBUG
+
+    def it_keeps_old_config_if_new_one_is_invalid(self, cfg, tmp_path):
+        old_app_config = cfg.app_config
+        logging.getLogger("reload_spec").setLevel(logging.INFO)
+
+        logging_json = dict(
+            self.LOGGING_JSON,
+            loggers={"reload_spec": {"level": "DEBUG", "handlers": []}},
+        )
+        (tmp_path / "logging_config.json").write_text(json.dumps(logging_json))
+        (tmp_path / "test.yaml").write_text("foo: [\n")
+
+        with pytest.raises(ImproperlyConfiguredError):
+            cfg.reload()
+
+        assert cfg.app_config is old_app_config
+        assert logging.getLogger("reload_spec").level == logging.INFO
+
+        (tmp_path / "test.yaml").write_text("foo:\n  bar: 1\n  baz: 2\n")
+        logging_json["loggers"]["reload_spec"]["level"] = "NOT_A_LEVEL"
+        (tmp_path / "logging_config.json").write_text(json.dumps(logging_json))
+
+        with pytest.raises(ImproperlyConfiguredError):
+            cfg.reload()
+
+        assert cfg.app_config is old_app_config
+        assert logging.getLogger("reload_spec").level == logging.INFO
+
+
+class DescribeConfigSnapshot:
+    @pytest.fixture
+    def make_cfg(self, tmp_path, mocker):
+        mocker.patch.object(external_config_loader, "dictConfig")
+
+        cmdline_args = CmdArguments(
+            config_file_path=str(tmp_path / "test.yaml"),
+            log_file_path=str(tmp_path / "test.log"),
+            logging_config_path=str(tmp_path / "logging_config.json"),
+        )
+        (tmp_path / "test.yaml").write_text("foo: 1\n")
+        (tmp_path / "logging_config.json").write_text(
+            json.dumps(DescribeConfigReload.LOGGING_JSON)
+        )
+
+        def make_cfg():
+            cfg = ENVIRONMENTS["test"](cmdline_args)
+            cfg._USE_CONFIG_SNAPSHOT = True
+            cfg.XDG_DATA_HOME = str(tmp_path / "data")
+            cfg.DEFAULT_TEMP_DIR = str(tmp_path)
+            cfg.load_and_validate()
+            return cfg
+
+        return make_cfg
+
+    def it_reuses_snapshot_if_config_files_didnt_change(self, make_cfg, mocker):
+        cfg = make_cfg()
+        assert os.path.isfile(cfg.config_snapshot_abspath)
+
+        parse = mocker.spy(external_config_loader, "_parse_yaml_config")
+        snapshot_cfg = make_cfg()
+
+        assert parse.call_count == 0
+        assert snapshot_cfg.app_config == cfg.app_config == {"foo": 1}
+        assert snapshot_cfg.logging_json == cfg.logging_json
+        assert snapshot_cfg.logging_fanout == cfg.logging_fanout
+
+    def it_ignores_stale_snapshot(self, make_cfg, tmp_path):
+        make_cfg()
+        (tmp_path / "test.yaml").write_text("foo: 42\n")
+
+        assert make_cfg().app_config == {"foo": 42}
+
+    def it_ignores_snapshot_made_with_other_tmp_dir(self, make_cfg, monkeypatch):
+        key = make_cfg()._config_snapshot_key()
+        monkeypatch.setenv("TMPDIR", "/snapshot_spec")
+
+        assert make_cfg()._config_snapshot_key() != key
+
+    def it_stores_snapshot_as_json(self, make_cfg):
+        cfg = make_cfg()
+
+        with open(cfg.config_snapshot_abspath) as f:
+            snapshot = json.load(f)
+        assert snapshot["app_config"] == {"foo": 1}
+        assert make_cfg()._config_files == cfg._config_files
+
+    def it_doesnt_store_config_json_cant_represent(self, make_cfg, tmp_path):
+        (tmp_path / "test.yaml").write_text("foo:\n  1: one\n")
+        cfg = make_cfg()
+
+        assert not os.path.exists(cfg.config_snapshot_abspath)
+        assert make_cfg().app_config == {"foo": {1: "one"}}
+
+    def it_ignores_corrupted_snapshot(self, make_cfg):
+        cfg = make_cfg()
+        with open(cfg.config_snapshot_abspath, "wb") as f:
+            f.write(b"garbage")
+
+        assert make_cfg().app_config == {"foo": 1}
+
+
+class DescribeSettingsSnapshot:
+    @pytest.fixture
+    def snapshot(self):
+        cfg = ENVIRONMENTS["test"]()
+        cfg._logging_json = {"handlers": {}, "loggers": {}}
+        cfg.app_config = {
+            "tmp_dir_path": "/tmp/snapshot_spec",
+            "redis": {"client": {"host": "localhost", "port": 6379}},
+            "hosts": ["a", {"b": 1, "items": 2}],
+        }
+        return SettingsSnapshot(cfg)
+
+    def it_precomputes_derived_values(self, snapshot):
+        assert snapshot.instance_name == "{{cookiecutter.project_slug}}"
+        assert snapshot.instance_tmp_dir_path.startswith(
+            "/tmp/snapshot_spec/{{cookiecutter.project_slug}}/"
+        )
+        assert snapshot.is_dry_run is False
+        assert snapshot.worker_index is None
+
+    def it_indexes_app_config_by_dotted_keys(self, snapshot):
+        assert snapshot["redis.client.host"] == "localhost"
+        assert snapshot["redis.client"] == {"host": "localhost", "port": 6379}
+        assert "redis.client.port" in snapshot
+        assert snapshot.get("redis.client.password") is None
+
+    def it_gives_attribute_access_to_app_config_sections(self, snapshot):
+        assert snapshot.app_config.redis.client.port == 6379
+        assert isinstance(snapshot.app_config.redis, ConfigSection)
+        assert snapshot.app_config.hosts[1].b == 1
+        assert snapshot.app_config.hosts[1]["items"] == 2
+        assert dict(snapshot.app_config.hosts[1].items()) == {"b": 1, "items": 2}
+        with pytest.raises(AttributeError):
+            snapshot.app_config.redis.password
+
+    def it_is_immutable(self, snapshot):
+        with pytest.raises(AttributeError):
+            snapshot.instance_name = "foo"
+        with pytest.raises(AttributeError):
+            snapshot.app_config.redis.client.host = "foo"
+        with pytest.raises(TypeError):
+            snapshot.app_config.redis["client"] = {}
+        assert isinstance(snapshot.app_config.hosts, tuple)
+
+    def it_is_taken_when_settings_are_initialized(self, app):
+        assert settings.snapshot().instance_name == SETTINGS.instance_name
+        assert (
+            settings.snapshot().instance_tmp_dir_path == SETTINGS.instance_tmp_dir_path
+        )
+
+    def it_serves_precomputed_values_through_settings_proxy(self, app):
+        snapshot = settings.snapshot()
+        assert SETTINGS.instance_tmp_dir_path is snapshot.instance_tmp_dir_path
+        assert SETTINGS.typed_app_config is snapshot.typed_app_config
+
+        worker_index = SETTINGS.worker_index
+        SETTINGS.worker_index = 3
+        try:
+            assert settings.snapshot().worker_index == SETTINGS.worker_index == 3
+            assert settings.snapshot().instance_tmp_dir_path.endswith("worker-3")
+        finally:
+            SETTINGS.worker_index = worker_index
+
+
+class DescribeRedisManager:
+    @pytest.fixture
+    def manager(self):
+        manager = RedisManager(
+            {
+                "connection_class": fakeredis.FakeConnection,
+                "server": fakeredis.FakeServer(),
+                "max_connections": 2,
+            }
+        )
+        yield manager
+        manager.close()
+
+    def it_creates_connection_pool_lazily(self, manager):
+        assert manager.stats() == {}
+
+        manager.client.set("foo", "bar")
+
+        assert manager.client.get("foo") == b"bar"
+        assert manager.stats()["max_connections"] == 2
+        assert manager.stats()["wait_count"] == 2
+
+    def it_creates_new_pool_in_forked_process(self, manager, mocker):
+        parent_pool = manager.pool
+
+        mocker.patch("os.getpid", return_value=os.getpid() + 1)
+
+        assert manager.pool is not parent_pool
+        assert manager.client.connection_pool is manager.pool
+
+    def it_uses_keepalive_and_health_checks_by_default(self, manager):
+        assert manager.pool.connection_kwargs["socket_keepalive"] is True
+        assert manager.pool.connection_kwargs["health_check_interval"] == 30
+
+    def it_creates_async_client_bound_to_running_loop(self):
+        manager = RedisManager(
+            {
+                "connection_class": fakeredis.aioredis.FakeConnection,
+                "server": fakeredis.FakeServer(),
+            }
+        )
+
+        async def use_client():
+            async with manager.async_client.pipeline(transaction=False) as pipe:
+                pipe.set("foo", "bar")
+                pipe.get("foo")
+                return await pipe.execute()
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(use_client()) == [True, b"bar"]
+            assert manager.has_async_pool
+
+            loop.run_until_complete(manager.aclose())
+            assert not manager.has_async_pool
+        finally:
+            loop.close()
@@ -0,0 +1,130 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from {{cookiecutter.project_slug}}.streams import StreamConsumer, default_consumer_name
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def client():
+    return fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+def _consumer(client, handler, **kwargs):
+    return StreamConsumer(client, "jobs", "workers", handler, **kwargs)
+
+
+class DescribeStreamConsumer:
+    def it_builds_consumer_name_from_instance_name_and_uuid(self, app):
+        from {{cookiecutter.project_slug}}.settings import SETTINGS
+
+        assert default_consumer_name() == "{}-{}".format(
+            SETTINGS.instance_name, SETTINGS.APPLICATION_INSTANCE_UUID.hex
+        )
+
+    def it_reads_and_acknowledges_messages_in_batches(self, loop, client):
+        batches = []
+
+        async def handler(messages):
+            batches.append([fields[b"i"] for _, fields in messages])
+
+        consumer = _consumer(client, handler, consumer_name="c1", batch_size=3)
+
+        async def scenario():
+            await consumer.ensure_group()
+            for i in range(5):
+                await client.xadd("jobs", {"i": i})
+            await consumer.consume_batch()
+            await consumer.consume_batch()
+            return await client.xpending("jobs", "workers")
+
+        pending = loop.run_until_complete(scenario())
+
+        assert batches == [[b"0", b"1", b"2"], [b"3", b"4"]]
+        assert pending["pending"] == 0
+        assert consumer.stats["acked"] == 5
+        assert consumer.stats["batches"] == 2
+
+    def it_acknowledges_only_messages_handler_processed(self, loop, client):
+        async def handler(messages):
+            return [
+                message_id for message_id, fields in messages if fields[b"ok"] == b"1"
+            ]
+
+        consumer = _consumer(client, handler, consumer_name="c1")
+
+        async def scenario():
+            await consumer.ensure_group()
+            await client.xadd("jobs", {"ok": 1})
+            await client.xadd("jobs", {"ok": 0})
+            await consumer.consume_batch()
+            return await client.xpending("jobs", "workers")
+
+        pending = loop.run_until_complete(scenario())
+
+        assert pending["pending"] == 1
+        assert consumer.stats["failed"] == 1
+
+    def it_reclaims_messages_abandoned_by_other_consumers(self, loop, client):
+        async def crashing(messages):
+            raise RuntimeError("Crash!")
+
+        handled = []
+
+        async def handler(messages):
+            handled.extend(fields[b"i"] for _, fields in messages)
+
+        crashed = _consumer(client, crashing, consumer_name="crashed")
+        healthy = _consumer(
+            client, handler, consumer_name="healthy", claim_min_idle_ms=1
+        )
+
+        async def scenario():
+            await crashed.ensure_group()
+            await client.xadd("jobs", {"i": 42})
+            await crashed.consume_batch()
+            await asyncio.sleep(0.01)
+            await healthy.reclaim()
+            return await client.xpending("jobs", "workers")
+
+        pending = loop.run_until_complete(scenario())
+
+        assert handled == [b"42"]
+        assert pending["pending"] == 0
+        assert healthy.stats["reclaimed"] == 1
+
+    def it_stops_reclaiming_when_cursor_does_not_move(self, loop):
+        calls = []
+
+        class StuckClient:
+            async def xautoclaim(self, *args, start_id, **kwargs):
+                calls.append(start_id)
+                return [b"5-0", [(b"1-0", None)]]
+
+        consumer = _consumer(StuckClient(), None, claim_min_idle_ms=1)
+
+        assert loop.run_until_complete(consumer.reclaim()) == 0
+        assert calls == ["0-0", b"5-0"]
+
+    def it_caps_number_of_reclaim_rounds(self, loop):
+        calls = []
+
+        class EndlessClient:
+            async def xautoclaim(self, *args, start_id, **kwargs):
+                calls.append(start_id)
+                return ["{}-0".format(len(calls)), [(b"1-0", None)]]
+
+        consumer = _consumer(EndlessClient(), None, claim_min_idle_ms=1)
+        consumer.MAX_RECLAIM_ROUNDS = 3
+
+        loop.run_until_complete(consumer.reclaim())
+        assert len(calls) == 3
@@ -0,0 +1,123 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+_SUPERVISOR_SCRIPT = textwrap.dedent(
+    """
+    import os, signal, sys, time
+    from {{cookiecutter.project_slug}}.workers import Supervisor
+
+    class DummyServer:
+        def startup_worker(self, worker_index):
+            path = os.path.join(sys.argv[1], str(os.getpid()))
+            with open(path, "w") as f:
+                f.write(str(worker_index))
+            signal.signal(
+                signal.SIGUSR2, lambda *_: open(path + ".profile", "w").close()
+            )
+            while True:
+                time.sleep(1)
+
+    class FastSupervisor(Supervisor):
+        MIN_UPTIME = 0
+        GRACEFUL_TIMEOUT = 5
+
+    FastSupervisor(DummyServer(), 2).run()
+    """
+)
+
+
+def _wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    process = subprocess.Popen(
+        [sys.executable, "-c", _SUPERVISOR_SCRIPT, str(tmp_path)]
+    )
+    yield process, tmp_path
+    if process.poll() is None:
+        # Lets supervisor stop its workers, SIGKILL would orphan them
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class DescribeSupervisor:
+    def it_forks_workers_and_respawns_the_ones_that_died(self, supervisor):
+        process, tmp_path = supervisor
+
+        assert _wait_for(lambda: len(os.listdir(str(tmp_path))) == 2)
+        workers = {int(pid) for pid in os.listdir(str(tmp_path))}
+
+        victim = workers.pop()
+        os.kill(victim, signal.SIGKILL)
+
+        assert _wait_for(lambda: len(os.listdir(str(tmp_path))) == 3)
+        respawned = {int(pid) for pid in os.listdir(str(tmp_path))} - workers
+        respawned.discard(victim)
+        assert len(respawned) == 1
+
+        with open(os.path.join(str(tmp_path), str(victim))) as f:
+            victim_index = f.read()
+        with open(os.path.join(str(tmp_path), str(respawned.pop()))) as f:
+            assert f.read() == victim_index
+
+    def it_stops_all_workers_on_sigterm(self, supervisor):
+        process, tmp_path = supervisor
+
+        assert _wait_for(lambda: len(os.listdir(str(tmp_path))) == 2)
+        workers = [int(pid) for pid in os.listdir(str(tmp_path))]
+
+        process.send_signal(signal.SIGTERM)
+
+        assert process.wait(timeout=10) == 0
+        assert not any(_is_alive(pid) for pid in workers)
+
+    def it_relays_profiler_signal_to_workers(self, supervisor):
+        process, tmp_path = supervisor
+
+        assert _wait_for(lambda: len(os.listdir(str(tmp_path))) == 2)
+        workers = os.listdir(str(tmp_path))
+
+        process.send_signal(signal.SIGUSR2)
+
+        assert _wait_for(
+            lambda: all(
+                os.path.exists(os.path.join(str(tmp_path), pid + ".profile"))
+                for pid in workers
+            )
+        )
+
+    def it_takes_workers_down_with_killed_supervisor(self, supervisor):
+        process, tmp_path = supervisor
+
+        assert _wait_for(lambda: len(os.listdir(str(tmp_path))) == 2)
+        workers = [int(pid) for pid in os.listdir(str(tmp_path))]
+
+        process.kill()
+        process.wait()
+
+        assert _wait_for(lambda: not any(_is_alive(pid) for pid in workers))